@@ -1,8 +1,9 @@
 from flask import (
     Flask,
+    Response,
     jsonify,
     request,
-    send_from_directory,
+    send_file,
     session,
     redirect,
     url_for,
@@ -13,17 +14,54 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 from datetime import date, timedelta
+import csv
 import hashlib
+import io
+import json
 import secrets
-from config import DATABASE_CONFIG
+from config import DATABASE_CONFIG, EXPORT_CONFIG, LIVE_CONFIG, REPORT_STORE_CONFIG
 from common import (
-    get_db_connection,
-    get_gender_count,
-    get_camera_stats,
+    TIME_RANGE_SQL,
+    db_connection,
+    parse_timestamp,
+    to_time_range,
+    get_pool_metrics,
+    build_camera_stats,
+    get_gender_counts_from_rows,
+    get_range_camera_periods,
+    get_range_camera_sums,
+    merge_range_camera_rows,
+    run_queries,
     calculate_percentage_change,
-    get_peak_and_low_periods,
-    get_total_visitors,
-    get_reference_visitors,
+)
+from build_assets import get_dist_dir, load_manifest
+from http_cache import conditional, init_http_cache, send_static
+from hourly_store import (
+    get_footfall_totals,
+    get_hourly_store_metrics,
+    init_hourly_store,
+)
+from ingest import ingest_video_analysis, validate_ingest_rows
+from last_login import flush_last_logins, get_pending_login, record_login
+from live import get_live_metrics, stream_events
+from report_store import get_report, parse_report_date
+from tracing import init_tracing
+from zones import (
+    HEATMAP_WEEKDAYS,
+    ZONES,
+    apply_caps,
+    compute_zone_totals,
+    get_zone_heatmap,
+    resolve_zones,
+    zone_cameras,
+)
+from cache import (
+    cache_get,
+    cache_set,
+    get_cache_metrics,
+    get_range_ttl,
+    invalidate_cache,
+    normalize_range,
 )
 
 # 加载环境变量
@@ -33,15 +71,70 @@ load_dotenv()
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 frontend_path = os.path.join(project_root, "frontend")
 
+# 已运行build_assets.py构建时使用构建目录（带内容哈希的文件名及预压缩文件）
+asset_manifest = load_manifest()
+if asset_manifest is not None:
+    frontend_path = get_dist_dir()
+
 #  创建Flask应用
 app = Flask(__name__, static_folder=frontend_path, static_url_path="")
 
+# 响应压缩及静态文件的预压缩文件（需在其他修改响应内容的钩子之前注册，使压缩最后执行）
+init_http_cache(app, (asset_manifest or {}).values())
+
+# 按请求汇总SQL，输出Server-Timing响应头
+init_tracing(app)
+
+# 启用时加载每小时人数的内存存储（gunicorn预加载应用时在主进程中加载，工作进程共享）
+init_hourly_store()
+
 # 设置安全密钥（在生产环境中，建议在 .env 文件中设置 SECRET_KEY 环境变量，以确保密钥在服务器重启后保持一致。如果每次服务器重启都生成新的密钥，那么所有用户的会话都会失效。）
 app.secret_key = os.getenv("SECRET_KEY", secrets.token_hex(32))
 
+# 分析流程调用导入接口时使用的令牌（请求头 Authorization: Bearer <令牌>），未设置时只允许管理员会话调用
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+
 # 数据库配置
 DB_CONFIG = DATABASE_CONFIG
 
+# 仪表板 Part 7-10 的区域（定义见zones.ZONES）
+DASHBOARD_ZONES = {
+    "part7": "cold_storage",
+    "part8": "A8",
+    "part9": "canteen",
+    "part10": "second_floor",
+}
+
+# 仪表板涉及的全部摄像头（Part 3-6 的单个摄像头及各区域的成员摄像头）
+DASHBOARD_CAMERAS = sorted(
+    {"A2", "A3", "A4", "A6"}
+    | set(zone_cameras(resolve_zones(DASHBOARD_ZONES.values())))
+)
+
+
+# 导出的video_analysis列：与(camera_name, start_time)覆盖索引的列一致，
+# 指定摄像头时按(camera_name, start_time)顺序走Index Only Scan，无需在数据库中排序即可边查边传
+EXPORT_COLUMNS = [
+    "camera_name",
+    "start_time",
+    "end_time",
+    "total_people",
+    "in_count",
+    "out_count",
+    "male_count",
+    "female_count",
+    "unknown_gender_count",
+    "adult_count",
+    "minor_count",
+    "unknown_age_count",
+]
+
+# 导出格式：格式 -> (MIME类型, 文件扩展名)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
 
 # 登录保护装饰器
 def login_required(f):
@@ -64,12 +157,12 @@ def index():
 
 @app.route("/login", methods=["GET"])
 def login_page():
-    return send_from_directory(app.static_folder, "login.html")
+    return send_static("login.html")
 
 
 @app.route("/register", methods=["GET"])
 def register_page():
-    return send_from_directory(app.static_folder, "register.html")
+    return send_static("register.html")
 
 
 @app.route("/api/login", methods=["POST"])
@@ -81,51 +174,51 @@ def login():
     if not username or not password:
         return jsonify({"error": "Username and password required"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    try:
-        cur.execute(
-            "SELECT id, password_hash, role, last_login FROM users WHERE username = %s",
-            (username,),
-        )
-        user = cur.fetchone()
+        try:
+            cur.execute(
+                "SELECT id, password_hash, role, last_login FROM users WHERE username = %s",
+                (username,),
+            )
+            user = cur.fetchone()
 
-        if not user:
-            return jsonify({"error": "Username does not exist."}), 401
+            if not user:
+                return jsonify({"error": "Username does not exist."}), 401
 
-        user_id, password_hash, role, last_login = user
+            user_id, password_hash, role, last_login = user
 
-        # 使用SHA-256哈希验证密码
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        if hashed_password != password_hash:
-            return jsonify({"error": "Incorrect password."}), 401
+            # 使用SHA-256哈希验证密码
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            if hashed_password != password_hash:
+                return jsonify({"error": "Incorrect password."}), 401
 
-        # 更新最后登录时间
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cur.execute(
-            """
-            UPDATE users 
-            SET last_login = %s 
-            WHERE id = %s
-        """,
-            (current_time, user_id),
-        )
-        conn.commit()
+            # 上次登录时间可能还在本进程的待写入记录中
+            pending_login = get_pending_login(user_id)
+            if pending_login is not None and (
+                last_login is None or pending_login > last_login
+            ):
+                last_login = pending_login
 
-        # 创建会话
-        session["user_id"] = user_id
-        session["username"] = username
-        session["role"] = role
-        session["last_login"] = last_login
-        session["logged_in"] = True
+            # 更新最后登录时间（批量写入数据库）
+            record_login(user_id)
 
-        return jsonify({"message": "Login successful", "last_login": last_login}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+            # 创建会话
+            session["user_id"] = user_id
+            session["username"] = username
+            session["role"] = role
+            session["last_login"] = last_login
+            session["logged_in"] = True
+
+            return (
+                jsonify({"message": "Login successful", "last_login": last_login}),
+                200,
+            )
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            cur.close()
 
 
 @app.route("/logout")
@@ -138,7 +231,7 @@ def logout():
 def dashboard():
     if not session.get("logged_in"):
         return redirect(url_for("login_page"))
-    return send_from_directory(app.static_folder, "dashboard.html")
+    return send_static("dashboard.html")
 
 
 @app.route("/api/check-session")
@@ -166,40 +259,9 @@ def update_last_login():
     if not session.get("logged_in") or "user_id" not in session:
         return jsonify({"error": "Authentication required"}), 401
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        # 获取当前时间作为新的最后登录时间
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # 更新数据库中的最后登录时间
-        cur.execute(
-            """
-            UPDATE users 
-            SET last_login = %s 
-            WHERE id = %s
-            RETURNING last_login
-        """,
-            (current_time, session["user_id"]),
-        )
-
-        conn.commit()
-
-        return (
-            jsonify(
-                {
-                    "success": True,
-                }
-            ),
-            200,
-        )
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    # 更新最后登录时间（合并同一用户的多次更新，由后台线程定期批量写入数据库）
+    record_login(session["user_id"])
+    return jsonify({"success": True}), 200
 
 
 @app.route("/api/alltime", methods=["GET"])
@@ -216,7 +278,7 @@ def get_all_time():
     # try:
     #     # 构建基础查询
     #     base_query = """
-    #         SELECT DISTINCT 
+    #         SELECT DISTINCT
     #             TO_CHAR(start_time, 'HH24:MI:SS') AS start_time_str,
     #             TO_CHAR(end_time, 'HH24:MI:SS') AS end_time_str
     #         FROM video_analysis
@@ -253,10 +315,222 @@ def get_all_time():
         time_slots.append({"start": start_time, "end": end_time})
 
     return jsonify(time_slots)
-    
+
+
+def build_dashboard_data(date_start, date_end, ref_date_start, ref_date_end, conn=None):
+    """
+    计算仪表板 Part 1-11 的数据
+    :param date_start: 开始时间
+    :param date_end: 结束时间
+    :param ref_date_start: 对比开始时间
+    :param ref_date_end: 对比结束时间
+    :param conn: 数据库连接，为None时各查询并发使用连接池中的连接
+    :return: 仪表板数据字典
+    """
+    # 每个时间范围的汇总值和高峰/低峰时段各一次分组查询，四个查询互相独立，并发执行；
+    # 以下各部分均在内存中组装
+    rows = run_queries(
+        {
+            "sums": (get_range_camera_sums, date_start, date_end),
+            "periods": (get_range_camera_periods, date_start, date_end),
+            "ref_sums": (get_range_camera_sums, ref_date_start, ref_date_end),
+            "ref_periods": (get_range_camera_periods, ref_date_start, ref_date_end),
+        },
+        conn,
+    )
+    range_rows = merge_range_camera_rows(
+        rows["sums"], rows["periods"], DASHBOARD_CAMERAS
+    )
+    ref_range_rows = merge_range_camera_rows(
+        rows["ref_sums"], rows["ref_periods"], DASHBOARD_CAMERAS
+    )
+    range_stats = {cam: build_camera_stats(*data) for cam, data in range_rows.items()}
+    ref_range_stats = {
+        cam: build_camera_stats(*data) for cam, data in ref_range_rows.items()
+    }
+
+    # 整体进入人数按比例拆分的整数性别分布（本期与对比期一次批量计算）
+    total_gender_counts = get_gender_counts_from_rows(
+        [range_stats[None]["total_in"], ref_range_stats[None]["total_in"]],
+        [range_rows[None][0], ref_range_rows[None][0]],
+    )
+    genders = {
+        key: {
+            "male": int(total_gender_counts["male"][i]),
+            "female": int(total_gender_counts["female"][i]),
+            "unknown": int(total_gender_counts["unknown"][i]),
+        }
+        for i, key in enumerate(["total_in", "ref_total_in"])
+    }
+
+    # Part 1: Total visitors and comparison
+    total_visitors_in = range_stats[None]["total_in"]
+    total_visitors_out = range_stats[None]["total_out"]
+    reference_visitors_in = ref_range_stats[None]["total_in"]
+
+    # 确保流量不为负数
+    if total_visitors_in < 0:
+        total_visitors_in = 0
+    # 确保ref流量不为负数
+    if reference_visitors_in < 0:
+        reference_visitors_in = 0
+
+    total_percent_change = calculate_percentage_change(
+        total_visitors_in, reference_visitors_in
+    )
+
+    # Part 2: Peak and Low periods(by in_count)
+    peak_period = range_stats[None]["peak_period"]
+    low_period = range_stats[None]["low_period"]
+
+    # Parts 3-6: Camera specific stats
+    a6_stats = range_stats["A6"]
+    a2_stats = range_stats["A2"]
+    a3_stats = range_stats["A3"]
+    a4_stats = range_stats["A4"]
+
+    # Parts 7-10: 冷库、A8、餐厅、二楼，按区域定义由各摄像头汇总行统一计算
+    # （进入人数不为负数，餐厅进入人数不超过二楼）
+    zones = resolve_zones(DASHBOARD_ZONES.values())
+    zone_totals = apply_caps(
+        compute_zone_totals({cam: data[0] for cam, data in range_rows.items()}, zones),
+        zones,
+    )
+    ref_zone_totals = apply_caps(
+        compute_zone_totals(
+            {cam: data[0] for cam, data in ref_range_rows.items()}, zones
+        ),
+        zones,
+    )
+    zone_parts = {}
+    for part, zone_name in DASHBOARD_ZONES.items():
+        current = zone_totals[zone_name]
+        ref_value_in = ref_zone_totals[zone_name]["in"]
+        zone_parts[part] = {
+            "value_in": current["in"],
+            "value_out": current["out"],
+            "comparison": ref_value_in,
+            "percent_change": calculate_percentage_change(current["in"], ref_value_in),
+            "male": current["gender"]["male"],
+            "female": current["gender"]["female"],
+            "unknown": current["gender"]["unknown"],
+        }
+
+    # Part 11: Gender breakdown
+    total_stats = range_stats[None]
+    total_value_in = total_stats["total_in"]
+
+    total_ref_stats = ref_range_stats[None]
+    total_ref_value_in = total_ref_stats["total_in"]
+
+    # 确保流量不为负数
+    if total_value_in < 0:
+        total_value_in = 0
+    # 确保ref流量不为负数
+    if total_ref_value_in < 0:
+        total_ref_value_in = 0
+
+    if total_value_in == 0:
+        total_gender = {"male": 0, "female": 0, "unknown": 0}
+        total_minor_in = 0
+    else:
+        total_minor_percent = total_stats["minor_percent"]
+        total_gender = genders["total_in"]
+        # 计算儿童流量
+        total_minor_in = int(float(total_minor_percent) / 100.0 * total_value_in)
+
+    if total_ref_value_in == 0:
+        total_ref_gender = {"male": 0, "female": 0, "unknown": 0}
+        total_ref_minor_in = 0
+    else:
+        total_ref_minor_percent = total_ref_stats["minor_percent"]
+        total_ref_gender = genders["ref_total_in"]
+        # 计算儿童流量
+        total_ref_minor_in = int(
+            float(total_ref_minor_percent) / 100.0 * total_ref_value_in
+        )
+
+    # 计算百分比变化
+    male_percent_change = calculate_percentage_change(
+        total_gender["male"], total_ref_gender["male"]
+    )
+    female_percent_change = calculate_percentage_change(
+        total_gender["female"], total_ref_gender["female"]
+    )
+    unknown_percent_change = calculate_percentage_change(
+        total_gender["unknown"], total_ref_gender["unknown"]
+    )
+
+    # 单独计算儿童百分比变化
+    minor_percent_change = calculate_percentage_change(
+        total_minor_in, total_ref_minor_in
+    )
+
+    # 返回结果
+    return {
+        "part1": {
+            "total_in": total_visitors_in,
+            "total_out": total_visitors_out,
+            "compare": reference_visitors_in,
+            "percent_change": total_percent_change,
+        },
+        "part2": {"peak_period": peak_period, "low_period": low_period},
+        "part3": a6_stats,
+        "part4": a2_stats,
+        "part5": a3_stats,
+        "part6": a4_stats,
+        "part7": zone_parts["part7"],
+        "part8": zone_parts["part8"],
+        "part9": zone_parts["part9"],
+        "part10": zone_parts["part10"],
+        "part11": {
+            "male": {
+                "current": total_gender["male"],
+                "ref": total_ref_gender["male"],
+                "percent_change": male_percent_change,
+            },
+            "female": {
+                "current": total_gender["female"],
+                "ref": total_ref_gender["female"],
+                "percent_change": female_percent_change,
+            },
+            "children": {
+                "current": total_minor_in,
+                "ref": total_ref_minor_in,
+                "percent_change": minor_percent_change,
+            },
+            "unknown": {
+                "current": total_gender["unknown"],
+                "ref": total_ref_gender["unknown"],
+                "percent_change": unknown_percent_change,
+            },
+        },
+    }
+
+
+def get_dashboard_cache_key(date_start, date_end, ref_date_start, ref_date_end):
+    """仪表板结果的缓存键（同时用作实时更新的订阅键）"""
+    return (
+        ("dashboard",)
+        + normalize_range(date_start, date_end)
+        + normalize_range(ref_date_start, ref_date_end)
+    )
+
+
+def _dashboard_request_key():
+    """决定/api/dashboard响应内容的请求参数（用于ETag）"""
+    data = request.get_json(silent=True) or {}
+    return get_dashboard_cache_key(
+        data.get("date_start"),
+        data.get("date_end"),
+        data.get("ref_date_start"),
+        data.get("ref_date_end"),
+    )
+
 
 @app.route("/api/dashboard", methods=["POST"])
 @login_required
+@conditional(_dashboard_request_key)
 def get_dashboard_data():
     data = request.json
     date_start = data.get("date_start")
@@ -264,506 +538,210 @@ def get_dashboard_data():
     ref_date_start = data.get("ref_date_start")
     ref_date_end = data.get("ref_date_end")
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     try:
-        # Part 1: Total visitors and comparison
-        total_visitors_in, total_visitors_out = get_total_visitors(
-            conn, date_start, date_end
-        )
-        reference_visitors_in = get_reference_visitors(
-            conn, ref_date_start, ref_date_end
-        )
-
-        # 确保流量不为负数
-        if total_visitors_in < 0:
-            total_visitors_in = 0
-        # 确保ref流量不为负数
-        if reference_visitors_in < 0:
-            reference_visitors_in = 0
-
-        total_percent_change = calculate_percentage_change(
-            total_visitors_in, reference_visitors_in
-        )
-
-        # Part 2: Peak and Low periods(by in_count)
-        peak_period, low_period = get_peak_and_low_periods(conn, date_start, date_end)
-
-        # Parts 3-6: Camera specific stats
-        a6_stats = get_camera_stats(conn, "A6", date_start, date_end)
-        a2_stats = get_camera_stats(conn, "A2", date_start, date_end)
-        a3_stats = get_camera_stats(conn, "A3", date_start, date_end)
-        a4_stats = get_camera_stats(conn, "A4", date_start, date_end)
-
-        # Part 7: Cold Storage (A7 and A6, 专用方法)
-        cold_storage_a7_stats = get_camera_stats(conn, "A7", date_start, date_end)
-        cold_storage_a6_stats = get_camera_stats(conn, "A6", date_start, date_end)
-        cold_storage_in = (
-            cold_storage_a7_stats["total_in"] + cold_storage_a6_stats["total_out"]
-        )
-        cold_storage_out = (
-            cold_storage_a7_stats["total_out"] + cold_storage_a6_stats["total_in"]
-        )
-
-        cold_storage_a7_ref_stats = get_camera_stats(
-            conn, "A7", ref_date_start, ref_date_end
-        )
-        cold_storage_a6_ref_stats = get_camera_stats(
-            conn, "A6", ref_date_start, ref_date_end
-        )
-        cold_storage_ref_in = (
-            cold_storage_a7_ref_stats["total_in"]
-            + cold_storage_a6_ref_stats["total_out"]
-        )
-
-        # 确保流量不为负数
-        if cold_storage_in < 0:
-            cold_storage_in = 0
-        # 确保ref流量不为负数
-        if cold_storage_ref_in < 0:
-            cold_storage_ref_in = 0
-
-        cold_storage_percent = calculate_percentage_change(
-            cold_storage_in, cold_storage_ref_in
-        )
-
-        if cold_storage_in == 0:
-            cold_storage_gender = {"male": 0, "female": 0, "unknown": 0}
-        else:
-            cold_storage_a7_gender = get_gender_count(
-                cold_storage_a7_stats["total_in"],
-                cold_storage_a7_stats["male_percent"],
-                cold_storage_a7_stats["female_percent"],
-                cold_storage_a7_stats["unknown_percent"],
-            )
-            cold_storage_a6_gender = get_gender_count(
-                cold_storage_a6_stats["total_out"],
-                cold_storage_a6_stats["male_percent"],
-                cold_storage_a6_stats["female_percent"],
-                cold_storage_a6_stats["unknown_percent"],
-            )
-
-            cold_storage_gender = {
-                "male": cold_storage_a7_gender["male"] + cold_storage_a6_gender["male"],
-                "female": cold_storage_a7_gender["female"]
-                + cold_storage_a6_gender["female"],
-                "unknown": cold_storage_a7_gender["unknown"]
-                + cold_storage_a6_gender["unknown"],
-            }
-
-        # part 8:A8
-        a8_stats = get_camera_stats(conn, "A8", date_start, date_end)
-        a8_value_in = a8_stats["total_in"]
-        a8_value_out = a8_stats["total_out"]
-
-        a8_ref_stats = get_camera_stats(conn, "A8", ref_date_start, ref_date_end)
-        a8_ref_in = a8_ref_stats["total_in"]
-
-        # 确保流量不为负数
-        if a8_value_in < 0:
-            a8_value_in = 0
-        # 确保ref流量不为负数
-        if a8_ref_in < 0:
-            a8_ref_in = 0
-
-        a8_percent = calculate_percentage_change(a8_value_in, a8_ref_in)
-
-        if a8_value_in == 0:
-            a8_gender = {"male": 0, "female": 0, "unknown": 0}
-        else:
-            a8_male_percent = a8_stats["male_percent"]
-            a8_female_percent = a8_stats["female_percent"]
-            a8_unknown_percent = a8_stats["unknown_percent"]
-            a8_gender = get_gender_count(
-                a8_value_in, a8_male_percent, a8_female_percent, a8_unknown_percent
-            )
-
-        # Part 10: 2nd Floor (A2, A3, A1, A6)
-        a1_stats = get_camera_stats(conn, "A1", date_start, date_end)
-        second_floor_in = (
-            a1_stats["total_in"]
-            + a2_stats["total_in"]
-            + a3_stats["total_in"]
-            + a6_stats["total_in"]
-        )
-        second_floor_out = (
-            a1_stats["total_out"]
-            + a2_stats["total_out"]
-            + a3_stats["total_out"]
-            + a6_stats["total_out"]
-        )
-
-        a1_ref_stats = get_camera_stats(conn, "A1", ref_date_start, ref_date_end)
-        a2_ref_stats = get_camera_stats(conn, "A2", ref_date_start, ref_date_end)
-        a3_ref_stats = get_camera_stats(conn, "A3", ref_date_start, ref_date_end)
-        a6_ref_stats = get_camera_stats(conn, "A6", ref_date_start, ref_date_end)
-
-        second_floor_ref_in = (
-            a1_ref_stats["total_in"]
-            + a2_ref_stats["total_in"]
-            + a3_ref_stats["total_in"]
-            + a6_ref_stats["total_in"]
-        )
-
-        # 确保流量不为负数
-        if second_floor_in < 0:
-            second_floor_in = 0
-        # 确保ref流量不为负数
-        if second_floor_ref_in < 0:
-            second_floor_ref_in = 0
-
-        second_floor_percent = calculate_percentage_change(
-            second_floor_in, second_floor_ref_in
-        )
-
-        if second_floor_in == 0:
-            second_floor_gender = {"male": 0, "female": 0, "unknown": 0}
-        else:
-            a1_gender = get_gender_count(
-                a1_stats["total_in"],
-                a1_stats["male_percent"],
-                a1_stats["female_percent"],
-                a1_stats["unknown_percent"],
-            )
-            a2_gender = get_gender_count(
-                a2_stats["total_in"],
-                a2_stats["male_percent"],
-                a2_stats["female_percent"],
-                a2_stats["unknown_percent"],
-            )
-            a3_gender = get_gender_count(
-                a3_stats["total_in"],
-                a3_stats["male_percent"],
-                a3_stats["female_percent"],
-                a3_stats["unknown_percent"],
-            )
-            a6_gender = get_gender_count(
-                a6_stats["total_in"],
-                a6_stats["male_percent"],
-                a6_stats["female_percent"],
-                a6_stats["unknown_percent"],
-            )
-
-            second_floor_gender = {
-                "male": a1_gender["male"]
-                + a2_gender["male"]
-                + a3_gender["male"]
-                + a6_gender["male"],
-                "female": a1_gender["female"]
-                + a2_gender["female"]
-                + a3_gender["female"]
-                + a6_gender["female"],
-                "unknown": a1_gender["unknown"]
-                + a2_gender["unknown"]
-                + a3_gender["unknown"]
-                + a6_gender["unknown"],
-            }
-
-        # Part 9: Canteen (A4 and A5)
-        a5_stats = get_camera_stats(conn, "A5", date_start, date_end)
-        canteen_value_in = a4_stats["total_in"] + a5_stats["total_in"]
-        canteen_value_out = a4_stats["total_out"] + a5_stats["total_out"]
-
-        a4_ref_stats = get_camera_stats(conn, "A4", ref_date_start, ref_date_end)
-        a5_ref_stats = get_camera_stats(conn, "A5", ref_date_start, ref_date_end)
-
-        canteen_value_ref_in = a4_ref_stats["total_in"] + a5_ref_stats["total_in"]
-
-        # 确保流量不为负数
-        if canteen_value_in < 0:
-            canteen_value_in = 0
-        # 确保ref流量不为负数
-        if canteen_value_ref_in < 0:
-            canteen_value_ref_in = 0
-        # 确保canteen区域人数不超过2nd Floor区域人数，防止数据错误
-        if canteen_value_in > second_floor_in:
-            canteen_value_in = second_floor_in
-
-        if canteen_value_ref_in > second_floor_ref_in:
-            canteen_value_ref_in = second_floor_ref_in
-
-        canteen_percent = calculate_percentage_change(
-            canteen_value_in, canteen_value_ref_in
+        # 纯历史时间范围的结果不过期，包含最新数据的范围只短时间缓存
+        ttl = get_range_ttl(date_end, ref_date_end)
+        cache_key = get_dashboard_cache_key(
+            date_start, date_end, ref_date_start, ref_date_end
         )
-
-        if canteen_value_in == 0:
-            canteen_gender = {"male": 0, "female": 0, "unknown": 0}
-        else:
-            a4_gender = get_gender_count(
-                a4_stats["total_in"],
-                a4_stats["male_percent"],
-                a4_stats["female_percent"],
-                a4_stats["unknown_percent"],
-            )
-            a5_gender = get_gender_count(
-                a5_stats["total_in"],
-                a5_stats["male_percent"],
-                a5_stats["female_percent"],
-                a5_stats["unknown_percent"],
-            )
-
-            canteen_gender = {
-                "male": a4_gender["male"] + a5_gender["male"],
-                "female": a4_gender["female"] + a5_gender["female"],
-                "unknown": a4_gender["unknown"] + a5_gender["unknown"],
-            }
-
-        # Part 11: Gender breakdown
-        total_stats = get_camera_stats(conn, None, date_start, date_end)
-        total_value_in = total_stats["total_in"]
-
-        total_ref_stats = get_camera_stats(conn, None, ref_date_start, ref_date_end)
-        total_ref_value_in = total_ref_stats["total_in"]
-
-        # 确保流量不为负数
-        if total_value_in < 0:
-            total_value_in = 0
-        # 确保ref流量不为负数
-        if total_ref_value_in < 0:
-            total_ref_value_in = 0
-
-        if total_value_in == 0:
-            total_gender = {"male": 0, "female": 0, "unknown": 0}
-            total_minor_in = 0
-        else:
-            total_male_percent = total_stats["male_percent"]
-            total_female_percent = total_stats["female_percent"]
-            total_unknown_percent = total_stats["unknown_percent"]
-            total_minor_percent = total_stats["minor_percent"]
-            total_gender = get_gender_count(
-                total_value_in,
-                total_male_percent,
-                total_female_percent,
-                total_unknown_percent,
+        hit, payload, generation = cache_get(cache_key)
+        if not hit:
+            payload = build_dashboard_data(
+                date_start, date_end, ref_date_start, ref_date_end
             )
-            # 计算儿童流量
-            total_minor_in = int(float(total_minor_percent) / 100.0 * total_value_in)
-
-        if total_ref_value_in == 0:
-            total_ref_gender = {"male": 0, "female": 0, "unknown": 0}
-            total_ref_minor_in = 0
-        else:
-            total_ref_male_percent = total_ref_stats["male_percent"]
-            total_ref_female_percent = total_ref_stats["female_percent"]
-            total_ref_unknown_percent = total_ref_stats["unknown_percent"]
-            total_ref_minor_percent = total_ref_stats["minor_percent"]
-            total_ref_gender = get_gender_count(
-                total_ref_value_in,
-                total_ref_male_percent,
-                total_ref_female_percent,
-                total_ref_unknown_percent,
-            )
-            # 计算儿童流量
-            total_ref_minor_in = int(
-                float(total_ref_minor_percent) / 100.0 * total_ref_value_in
-            )
-
-        # 计算百分比变化
-        male_percent_change = calculate_percentage_change(
-            total_gender["male"], total_ref_gender["male"]
-        )
-        female_percent_change = calculate_percentage_change(
-            total_gender["female"], total_ref_gender["female"]
-        )
-        unknown_percent_change = calculate_percentage_change(
-            total_gender["unknown"], total_ref_gender["unknown"]
-        )
-
-        # 单独计算儿童百分比变化
-        minor_percent_change = calculate_percentage_change(
-            total_minor_in, total_ref_minor_in
-        )
-
-        # 返回结果
-        return jsonify(
-            {
-                "part1": {
-                    "total_in": total_visitors_in,
-                    "total_out": total_visitors_out,
-                    "compare": reference_visitors_in,
-                    "percent_change": total_percent_change,
-                },
-                "part2": {"peak_period": peak_period, "low_period": low_period},
-                "part3": a6_stats,
-                "part4": a2_stats,
-                "part5": a3_stats,
-                "part6": a4_stats,
-                "part7": {
-                    "value_in": cold_storage_in,
-                    "value_out": cold_storage_out,
-                    "comparison": cold_storage_ref_in,
-                    "percent_change": cold_storage_percent,
-                    "male": cold_storage_gender["male"],
-                    "female": cold_storage_gender["female"],
-                    "unknown": cold_storage_gender["unknown"],
-                },
-                "part8": {
-                    "value_in": a8_value_in,
-                    "value_out": a8_value_out,
-                    "comparison": a8_ref_in,
-                    "percent_change": a8_percent,
-                    "male": a8_gender["male"],
-                    "female": a8_gender["female"],
-                    "unknown": a8_gender["unknown"],
-                },
-                "part9": {
-                    "value_in": canteen_value_in,
-                    "value_out": canteen_value_out,
-                    "comparison": canteen_value_ref_in,
-                    "percent_change": canteen_percent,
-                    "male": canteen_gender["male"],
-                    "female": canteen_gender["female"],
-                    "unknown": canteen_gender["unknown"],
-                },
-                "part10": {
-                    "value_in": second_floor_in,
-                    "value_out": second_floor_out,
-                    "comparison": second_floor_ref_in,
-                    "percent_change": second_floor_percent,
-                    "male": second_floor_gender["male"],
-                    "female": second_floor_gender["female"],
-                    "unknown": second_floor_gender["unknown"],
-                },
-                "part11": {
-                    "male": {
-                        "current": total_gender["male"],
-                        "ref": total_ref_gender["male"],
-                        "percent_change": male_percent_change,
-                    },
-                    "female": {
-                        "current": total_gender["female"],
-                        "ref": total_ref_gender["female"],
-                        "percent_change": female_percent_change,
-                    },
-                    "children": {
-                        "current": total_minor_in,
-                        "ref": total_ref_minor_in,
-                        "percent_change": minor_percent_change,
-                    },
-                    "unknown": {
-                        "current": total_gender["unknown"],
-                        "ref": total_ref_gender["unknown"],
-                        "percent_change": unknown_percent_change,
-                    },
-                },
-            }
-        )
+            cache_set(cache_key, payload, ttl, generation)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
 
 
-@app.route("/api/footfall-distribution", methods=["GET"])
+@app.route("/api/live", methods=["GET"])
 @login_required
-def get_footfall_distribution():
-    conn = get_db_connection()
+def live_dashboard_updates():
+    """
+    仪表板实时更新（Server-Sent Events）：导入新数据后推送结果有变化的部分（dashboard事件），
+    相同查询条件的浏览器共用一次计算
+    请求参数：date_start、date_end、ref_date_start、ref_date_end（与/api/dashboard相同）
+    """
+    ranges = tuple(
+        request.args.get(name)
+        for name in ("date_start", "date_end", "ref_date_start", "ref_date_end")
+    )
+    if any(parse_timestamp(value) is None for value in ranges):
+        return jsonify({"error": "Valid date ranges are required."}), 400
+    if get_live_metrics()["connections"] >= LIVE_CONFIG["max_subscribers"]:
+        return jsonify({"error": "Too many live connections."}), 503
+
+    # 浏览器刚通过/api/dashboard取得的结果通常仍在缓存中，作为计算变化部分的基准
+    cache_key = get_dashboard_cache_key(*ranges)
+    _, payload, _ = cache_get(cache_key)
+    return Response(
+        stream_events(cache_key, ranges, build_dashboard_data, payload),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def get_footfall_buckets(today):
+    """
+    计算 Part 12 各统计序列的时间分组
+    :param today: 当天日期
+    :return: {序列名: (分组粒度, [分组开始日期, ...])}，分组粒度为 day/week/month/quarter
+    """
+    # 1. weekly_current: 本周（含今天）前7天
+    weekly_current = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
+
+    # 2. weekly_historical: 上一周（不含本周），周一到周日
+    last_week_start = today - timedelta(days=today.weekday() + 7)
+    weekly_historical = [(last_week_start + timedelta(days=i)) for i in range(7)]
+
+    # 3. monthly_current: 包含本周在内的前4周
+    monthly_current = [
+        today - timedelta(days=today.weekday() + (7 * i)) for i in range(3, -1, -1)
+    ]
+
+    # 4. monthly_historical: 不含本周的前4周
+    monthly_historical = [
+        today - timedelta(days=today.weekday() + (7 * i)) for i in range(4, 0, -1)
+    ]
+
+    # 5. quarterly_current: 包含本月在内的前3个月
+    quarterly_current = [
+        (today.replace(day=1) - timedelta(days=30 * i)).replace(day=1)
+        for i in range(2, -1, -1)
+    ]
+
+    # 6. quarterly_historical: 不含本月的前3个月
+    quarterly_historical = [
+        (today.replace(day=1) - timedelta(days=30 * i)).replace(day=1)
+        for i in range(3, 0, -1)
+    ]
+
+    # 7. yearly_current: 包含本季度在内的前4季度
+    # 8. yearly_historical: 不含本季度的前4季度
+    def quarter_start(i):
+        q_year = today.year - ((today.month - 1) // 3 < i)
+        q_num = ((today.month - 1) // 3 - i) % 4 + 1
+        return date(q_year, (q_num - 1) * 3 + 1, 1)
+
+    yearly_current = [quarter_start(i) for i in range(3, -1, -1)]
+    yearly_historical = [quarter_start(i) for i in range(4, 0, -1)]
+
+    return {
+        "weekly_current": ("day", weekly_current),
+        "weekly_historical": ("day", weekly_historical),
+        "monthly_current": ("week", monthly_current),
+        "monthly_historical": ("week", monthly_historical),
+        "quarterly_current": ("month", quarterly_current),
+        "quarterly_historical": ("month", quarterly_historical),
+        "yearly_current": ("quarter", yearly_current),
+        "yearly_historical": ("quarter", yearly_historical),
+    }
+
+
+def get_bucket_end(granularity, bucket_start):
+    """
+    计算分组的结束日期（不含）
+    :param granularity: 分组粒度 day/week/month/quarter
+    :param bucket_start: 分组开始日期
+    :return: 下一个分组的开始日期
+    """
+    if granularity == "day":
+        return bucket_start + timedelta(days=1)
+    if granularity == "week":
+        return bucket_start + timedelta(days=7)
+
+    months = 1 if granularity == "month" else 3
+    month_index = bucket_start.month - 1 + months
+    return date(bucket_start.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_footfall_range(buckets):
+    """
+    计算覆盖全部分组的时间范围
+    :param buckets: get_footfall_buckets 的返回值
+    :return: (最早分组的开始日期, 最晚分组的结束日期（不含）)
+    """
+    range_start = min(bucket for _, starts in buckets.values() for bucket in starts)
+    range_end = max(
+        get_bucket_end(granularity, bucket)
+        for granularity, starts in buckets.values()
+        for bucket in starts
+    )
+    return range_start, range_end
+
+
+def query_footfall_totals(conn, range_start, range_end):
+    """
+    查询 [range_start, range_end) 内按日/周/月/季度汇总的人数
+    :param conn: 数据库连接
+    :param range_start: 开始日期
+    :param range_end: 结束日期（不含）
+    :return: {(粒度, 分组开始日期): (total_people, total_in, male, female, minor, unknown_gender)}
+    """
     cur = conn.cursor()
     try:
-        # part 12
-        # ----------- Part 12 统计 -----------
-        today = date.today()
-
-        # 1. weekly_current: 本周（含今天）前7天
-        weekly_current_days = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
-        weekly_current = {"male": [], "female": [], "children": [], "unknown": []}
-        for d in weekly_current_days:
-            cur.execute(
-                """
-                SELECT
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE start_time::date = %s
-                """,
-                (d,),
-            )
-            row = cur.fetchone()
-
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
-
-            weekly_current["male"].append(int(total_in * male_percent))
-            weekly_current["female"].append(int(total_in * female_percent))
-            weekly_current["children"].append(int(total_in * children_percent))
-            weekly_current["unknown"].append(int(total_in * unknown_percent))
-
-        # 2. weekly_historical: 上一周（不含本周），周一到周日
-        last_week_start = today - timedelta(days=today.weekday() + 7)
-        last_week_days = [(last_week_start + timedelta(days=i)) for i in range(7)]
-        weekly_historical = {"male": [], "female": [], "children": [], "unknown": []}
-        for d in last_week_days:
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE start_time::date = %s
-                """,
-                (d,),
+        # 按日/周/月/季度分别汇总（GROUPING SETS，每行只有一个分组键非空）
+        cur.execute(
+            """
+            SELECT
+                CASE WHEN GROUPING(bucket) = 0 THEN bucket::date END,
+                CASE WHEN GROUPING(date_trunc('week', bucket)) = 0
+                    THEN date_trunc('week', bucket)::date END,
+                CASE WHEN GROUPING(date_trunc('month', bucket)) = 0
+                    THEN date_trunc('month', bucket)::date END,
+                CASE WHEN GROUPING(date_trunc('quarter', bucket)) = 0
+                    THEN date_trunc('quarter', bucket)::date END,
+                COALESCE(SUM(total_people),0),
+                COALESCE(SUM(in_count), 0),
+                COALESCE(SUM(male_count),0),
+                COALESCE(SUM(female_count),0),
+                COALESCE(SUM(minor_count),0),
+                COALESCE(SUM(unknown_gender_count),0)
+            FROM video_analysis_daily
+            WHERE bucket >= %s AND bucket < %s
+            GROUP BY GROUPING SETS (
+                (bucket),
+                (date_trunc('week', bucket)),
+                (date_trunc('month', bucket)),
+                (date_trunc('quarter', bucket))
             )
-            row = cur.fetchone()
-
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
-
-            weekly_historical["male"].append(int(total_in * male_percent))
-            weekly_historical["female"].append(int(total_in * female_percent))
-            weekly_historical["children"].append(int(total_in * children_percent))
-            weekly_historical["unknown"].append(int(total_in * unknown_percent))
+            """,
+            (range_start, range_end),
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
 
-        # 3. monthly_current: 包含本周在内的前4周
-        monthly_current = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(3, -1, -1):
-            week_start = today - timedelta(days=today.weekday() + (7 * i))
-            week_end = week_start + timedelta(days=6)
-
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE start_time::date BETWEEN %s AND %s
-                """,
-                (week_start, week_end),
-            )
-            row = cur.fetchone()
+    totals = {}
+    for row in rows:
+        for granularity, key in zip(("day", "week", "month", "quarter"), row):
+            if key is not None:
+                totals[(granularity, key)] = row[4:]
+    return totals
+
+
+def build_footfall_distribution(conn, buckets):
+    """
+    计算 Part 12 各统计序列的性别/儿童人数分布
+    :param conn: 数据库连接
+    :param buckets: get_footfall_buckets 的返回值
+    :return: {序列名: {"male": [...], "female": [...], "children": [...], "unknown": [...]}}
+    """
+    # 一次范围扫描覆盖最早的分组到最晚的分组
+    range_start, range_end = get_footfall_range(buckets)
+
+    # 启用每小时人数的内存存储时直接由内存计算
+    totals = get_footfall_totals(range_start, range_end)
+    if totals is None:
+        totals = query_footfall_totals(conn, range_start, range_end)
+
+    # 整理 Part 12 的数据
+    part12 = {}
+    for series_name, (granularity, starts) in buckets.items():
+        series = {"male": [], "female": [], "children": [], "unknown": []}
+        for bucket in starts:
+            row = totals.get((granularity, bucket), (0, 0, 0, 0, 0, 0))
 
             total_people = row[0]
             total_in = row[1]
@@ -778,230 +756,277 @@ def get_footfall_distribution():
                 children_percent = 0
                 unknown_percent = 0
 
-            monthly_current["male"].append(int(total_in * male_percent))
-            monthly_current["female"].append(int(total_in * female_percent))
-            monthly_current["children"].append(int(total_in * children_percent))
-            monthly_current["unknown"].append(int(total_in * unknown_percent))
+            series["male"].append(int(total_in * male_percent))
+            series["female"].append(int(total_in * female_percent))
+            series["children"].append(int(total_in * children_percent))
+            series["unknown"].append(int(total_in * unknown_percent))
 
-        # 4. monthly_historical: 不含本周的前4周
-        monthly_historical = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(4, 0, -1):
-            week_start = today - timedelta(days=today.weekday() + (7 * i))
-            week_end = week_start + timedelta(days=6)
+        part12[series_name] = series
+    return part12
 
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE start_time::date BETWEEN %s AND %s
-                """,
-                (week_start, week_end),
-            )
-            row = cur.fetchone()
 
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
-
-            monthly_historical["male"].append(int(total_in * male_percent))
-            monthly_historical["female"].append(int(total_in * female_percent))
-            monthly_historical["children"].append(int(total_in * children_percent))
-            monthly_historical["unknown"].append(int(total_in * unknown_percent))
-
-        # 5. quarterly_current: 包含本月在内的前3个月
-        quarterly_current = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(2, -1, -1):
-            month_date = today.replace(day=1) - timedelta(days=30 * i)
-            year = month_date.year
-            mon = month_date.month
+@app.route("/api/footfall-distribution", methods=["GET"])
+@login_required
+@conditional(lambda: ("footfall", date.today().isoformat()))
+def get_footfall_distribution():
+    try:
+        # part 12
+        # ----------- Part 12 统计 -----------
+        today = date.today()
+        buckets = get_footfall_buckets(today)
+
+        # 各序列均包含当前周期，结果只短时间缓存
+        ttl = get_range_ttl(get_footfall_range(buckets)[1])
+        cache_key = ("footfall", today.isoformat())
+        hit, part12, generation = cache_get(cache_key)
+        if not hit:
+            with db_connection() as conn:
+                part12 = build_footfall_distribution(conn, buckets)
+            cache_set(cache_key, part12, ttl, generation)
+        return jsonify(part12)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE EXTRACT(YEAR FROM start_time) = %s AND EXTRACT(MONTH FROM start_time) = %s
-                """,
-                (year, mon),
-            )
-            row = cur.fetchone()
 
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
+@app.route("/api/heatmap", methods=["POST"])
+@login_required
+def get_heatmap():
+    """
+    星期×小时的平均进入人数热力图
+    请求参数：date_start、date_end，以及 zone（区域键，见zones.ZONES）或 cameras（摄像头列表）
+    """
+    data = request.json or {}
+    date_start = data.get("date_start")
+    date_end = data.get("date_end")
+    zone_name = data.get("zone")
+    cameras = data.get("cameras")
+
+    if not date_start or not date_end:
+        return jsonify({"error": "date_start and date_end are required."}), 400
+    if zone_name:
+        if zone_name not in ZONES:
+            return jsonify({"error": f"Unknown zone: {zone_name}"}), 400
+        zone = ZONES[zone_name]
+    elif cameras and isinstance(cameras, list):
+        if not all(isinstance(cam, str) and cam for cam in cameras):
+            return jsonify({"error": "cameras must be non-empty strings."}), 400
+        zone = {"name": ", ".join(cameras), "members": [(cam, 1) for cam in cameras]}
+    else:
+        return jsonify({"error": "zone or cameras is required."}), 400
 
-            quarterly_current["male"].append(int(total_in * male_percent))
-            quarterly_current["female"].append(int(total_in * female_percent))
-            quarterly_current["children"].append(int(total_in * children_percent))
-            quarterly_current["unknown"].append(int(total_in * unknown_percent))
+    try:
+        ttl = get_range_ttl(date_end)
+        cache_key = ("heatmap", tuple(sorted(set(zone["members"])))) + normalize_range(
+            date_start, date_end
+        )
+        # 只缓存热力图数据：成员相同的区域和摄像头列表共用缓存，名称按各自的请求返回
+        hit, matrix, generation = cache_get(cache_key)
+        if not hit:
+            with db_connection() as conn:
+                matrix = get_zone_heatmap(conn, date_start, date_end, zone)
+            cache_set(cache_key, matrix, ttl, generation)
+        return jsonify(
+            {
+                "name": zone["name"],
+                "weekdays": HEATMAP_WEEKDAYS,
+                "hours": list(range(24)),
+                "matrix": matrix,
+            }
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # 6. quarterly_historical: 不含本月的前3个月
-        quarterly_historical = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(3, 0, -1):
-            month_date = today.replace(day=1) - timedelta(days=30 * i)
-            year = month_date.year
-            mon = month_date.month
 
+def _format_export_value(value):
+    """导出时的值格式（时间使用与仪表板一致的 "YYYY-MM-DD HH:MM:SS"）"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def stream_video_analysis(date_start, date_end, cameras, export_format):
+    """
+    使用服务器端（命名）游标分批读取video_analysis并逐批生成CSV/NDJSON文本，
+    内存占用与时间范围大小无关；客户端断开时生成器被关闭，游标随之关闭并回滚事务
+    :param date_start: 开始时间
+    :param date_end: 结束时间
+    :param cameras: 摄像头列表，为空时导出全部摄像头
+    :param export_format: "csv" 或 "ndjson"
+    :return: 文本块生成器
+    """
+    conditions = [TIME_RANGE_SQL]
+    params = list(to_time_range(date_start, date_end))
+    if cameras:
+        conditions.insert(0, "camera_name = ANY(%s)")
+        params.insert(0, list(cameras))
+
+    with db_connection() as conn:
+        cur = conn.cursor(name="video_analysis_export")
+        cur.itersize = EXPORT_CONFIG["itersize"]
+        try:
             cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
+                f"""
+                SELECT {", ".join(EXPORT_COLUMNS)}
                 FROM video_analysis
-                WHERE EXTRACT(YEAR FROM start_time) = %s AND EXTRACT(MONTH FROM start_time) = %s
+                WHERE {" AND ".join(conditions)}
+                ORDER BY camera_name, start_time
                 """,
-                (year, mon),
+                params,
             )
-            row = cur.fetchone()
 
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
-
-            quarterly_historical["male"].append(int(total_in * male_percent))
-            quarterly_historical["female"].append(int(total_in * female_percent))
-            quarterly_historical["children"].append(int(total_in * children_percent))
-            quarterly_historical["unknown"].append(int(total_in * unknown_percent))
-
-        # 7. yearly_current: 包含本季度在内的前4季度
-        yearly_current = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(3, -1, -1):
-            q_year = today.year - ((today.month - 1) // 3 < i)
-            q_num = ((today.month - 1) // 3 - i) % 4 + 1
-
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE EXTRACT(YEAR FROM start_time) = %s AND EXTRACT(QUARTER FROM start_time) = %s
-                """,
-                (q_year, q_num),
-            )
-            row = cur.fetchone()
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator="\n")
+                writer.writerow(EXPORT_COLUMNS)
+                yield buffer.getvalue()
+
+            while True:
+                rows = cur.fetchmany(EXPORT_CONFIG["itersize"])
+                if not rows:
+                    break
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer, lineterminator="\n")
+                    writer.writerows(
+                        [_format_export_value(value) for value in row] for row in rows
+                    )
+                    yield buffer.getvalue()
+                else:
+                    records = (
+                        dict(zip(EXPORT_COLUMNS, map(_format_export_value, row)))
+                        for row in rows
+                    )
+                    yield "".join(json.dumps(record) + "\n" for record in records)
+        finally:
+            # 提前结束（客户端断开）时关闭服务器端游标，数据库停止读取剩余的行
+            cur.close()
+
+
+@app.route("/api/export", methods=["GET"])
+@login_required
+def export_video_analysis():
+    """
+    流式导出原始时段数据
+    请求参数：date_start、date_end、cameras（逗号分隔，可选）、format（csv/ndjson，默认csv）
+    """
+    date_start = request.args.get("date_start")
+    date_end = request.args.get("date_end")
+    cameras = [cam for cam in request.args.get("cameras", "").split(",") if cam]
+    export_format = request.args.get("format", "csv")
+
+    if parse_timestamp(date_start) is None or parse_timestamp(date_end) is None:
+        return jsonify({"error": "Valid date_start and date_end are required."}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format: {export_format}"}), 400
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = "video_analysis_{}_{}.{}".format(
+        parse_timestamp(date_start).strftime("%Y%m%d%H%M%S"),
+        parse_timestamp(date_end).strftime("%Y%m%d%H%M%S"),
+        extension,
+    )
+    return Response(
+        stream_video_analysis(date_start, date_end, cameras, export_format),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.route("/api/report/pdf", methods=["GET"])
+@login_required
+def download_report_pdf():
+    """
+    下载服务器端生成的PDF报告（日期范围和数据版本相同的报告只生成一次）
+    请求参数：date_start（YYYY-MM-DD）、date_end（可选，默认与date_start相同）
+    """
+    date_start = parse_report_date(request.args.get("date_start"))
+    date_end = parse_report_date(request.args.get("date_end", date_start))
+    if date_start is None or date_end is None:
+        return jsonify({"error": "Valid date_start (YYYY-MM-DD) is required."}), 400
+    days = (
+        datetime.strptime(date_end, "%Y-%m-%d")
+        - datetime.strptime(date_start, "%Y-%m-%d")
+    ).days + 1
+    if days < 1:
+        return jsonify({"error": "date_end must not be earlier than date_start."}), 400
+    if days > REPORT_STORE_CONFIG["max_days"]:
+        return (
+            jsonify(
+                {"error": f"At most {REPORT_STORE_CONFIG['max_days']} days per report."}
+            ),
+            400,
+        )
 
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
+    try:
+        path, key = get_report(date_start, date_end)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            yearly_current["male"].append(int(total_in * male_percent))
-            yearly_current["female"].append(int(total_in * female_percent))
-            yearly_current["children"].append(int(total_in * children_percent))
-            yearly_current["unknown"].append(int(total_in * unknown_percent))
+    label = date_start if date_start == date_end else f"{date_start} ~ {date_end}"
+    response = send_file(
+        path,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"Date of Report({label}).pdf",
+        etag=key,
+    )
+    # 同一URL在数据变化后内容不同，浏览器每次用ETag重新验证
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _ingest_authorized():
+    """导入接口的认证：管理员会话，或请求头中的令牌与INGEST_TOKEN一致"""
+    if session.get("logged_in") and session.get("role") == "admin":
+        return True
+    auth = request.headers.get("Authorization", "")
+    if INGEST_TOKEN and auth.startswith("Bearer "):
+        return secrets.compare_digest(auth[len("Bearer ") :], INGEST_TOKEN)
+    return False
+
+
+@app.route("/api/ingest", methods=["POST"])
+def ingest_analysis_results():
+    """
+    导入一个批次的分析结果（同一事务，按(camera_name, start_time) upsert，可重复发送）
+    请求参数：run_id、rows（数据行列表，字段见ingest.INGEST_COLUMNS），
+    folder_path、total_videos（可选，提供时写入run_records）
+    """
+    if not _ingest_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    run_id = data.get("run_id")
+    folder_path = data.get("folder_path")
+    total_videos = data.get("total_videos")
 
-        # 8. yearly_historical: 不含本季度的前4季度
-        yearly_historical = {"male": [], "female": [], "children": [], "unknown": []}
-        for i in range(4, 0, -1):
-            q_year = today.year - ((today.month - 1) // 3 < i)
-            q_num = ((today.month - 1) // 3 - i) % 4 + 1
+    try:
+        values = validate_ingest_rows(run_id, data.get("rows"))
+        if folder_path is not None and (
+            not isinstance(folder_path, str) or len(folder_path) > 255
+        ):
+            raise ValueError("folder_path must be a string of at most 255 characters")
+        if total_videos is not None and (
+            isinstance(total_videos, bool)
+            or not isinstance(total_videos, int)
+            or total_videos < 0
+        ):
+            raise ValueError("total_videos must be a non-negative integer")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-            cur.execute(
-                """
-                SELECT 
-                    COALESCE(SUM(total_people),0),
-                    COALESCE(SUM(in_count), 0),
-                    COALESCE(SUM(male_count),0),
-                    COALESCE(SUM(female_count),0),
-                    COALESCE(SUM(minor_count),0),
-                    COALESCE(SUM(unknown_gender_count),0)
-                FROM video_analysis
-                WHERE EXTRACT(YEAR FROM start_time) = %s AND EXTRACT(QUARTER FROM start_time) = %s
-                """,
-                (q_year, q_num),
+    try:
+        with db_connection() as conn:
+            result = ingest_video_analysis(
+                conn, run_id, values, folder_path, total_videos
             )
-            row = cur.fetchone()
-
-            total_people = row[0]
-            total_in = row[1]
-            if total_people > 0:
-                male_percent = float(row[2] / total_people)
-                female_percent = float(row[3] / total_people)
-                children_percent = float(row[4] / total_people)
-                unknown_percent = float(row[5] / total_people)
-            else:
-                male_percent = 0
-                female_percent = 0
-                children_percent = 0
-                unknown_percent = 0
-
-            yearly_historical["male"].append(int(total_in * male_percent))
-            yearly_historical["female"].append(int(total_in * female_percent))
-            yearly_historical["children"].append(int(total_in * children_percent))
-            yearly_historical["unknown"].append(int(total_in * unknown_percent))
-
-        # 整理 Part 12 的数据
-        part12 = {
-            "weekly_current": weekly_current,
-            "weekly_historical": weekly_historical,
-            "monthly_current": monthly_current,
-            "monthly_historical": monthly_historical,
-            "quarterly_current": quarterly_current,
-            "quarterly_historical": quarterly_historical,
-            "yearly_current": yearly_current,
-            "yearly_historical": yearly_historical,
-        }
-        return jsonify(part12)
+        # 本进程立即清空查询结果缓存，其他进程由数据版本检查发现新数据
+        invalidate_cache()
+        return jsonify({"run_id": run_id, "received": len(values), **result}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
 
 
 @app.route("/api/register", methods=["POST"])
@@ -1014,62 +1039,61 @@ def register():
     if not username or not password or not admin_password:
         return jsonify({"error": "All fields are required."}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        # 验证管理员密码
-        cur.execute("SELECT password_hash FROM users WHERE role = 'admin' LIMIT 1")
-        admin_password_hash = cur.fetchone()
-
-        if not admin_password_hash:
-            return jsonify({"error": "Admin password not found."}), 500
-
-        hashed_admin_password = hashlib.sha256(admin_password.encode()).hexdigest()
-        if hashed_admin_password != admin_password_hash[0]:
-            return jsonify({"error": "Invalid admin password."}), 403
-
-        # 检查用户名是否已存在
-        cur.execute("SELECT id FROM users WHERE username = %s", (username,))
-        if cur.fetchone():
-            return jsonify({"error": "User already exists."}), 409
-
-        # 校验用户名长度
-        if len(username) < 3 or len(username) > 20:
-            return (
-                jsonify(
-                    {"error": "Username must be between 3 and 20 characters long."}
-                ),
-                400,
-            )
-
-        # 校验密码长度
-        if len(password) < 6 or len(password) > 20:
-            return (
-                jsonify(
-                    {"error": "Password must be between 6 and 20 characters long."}
-                ),
-                400,
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        try:
+            # 验证管理员密码
+            cur.execute("SELECT password_hash FROM users WHERE role = 'admin' LIMIT 1")
+            admin_password_hash = cur.fetchone()
+
+            if not admin_password_hash:
+                return jsonify({"error": "Admin password not found."}), 500
+
+            hashed_admin_password = hashlib.sha256(admin_password.encode()).hexdigest()
+            if hashed_admin_password != admin_password_hash[0]:
+                return jsonify({"error": "Invalid admin password."}), 403
+
+            # 检查用户名是否已存在
+            cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+            if cur.fetchone():
+                return jsonify({"error": "User already exists."}), 409
+
+            # 校验用户名长度
+            if len(username) < 3 or len(username) > 20:
+                return (
+                    jsonify(
+                        {"error": "Username must be between 3 and 20 characters long."}
+                    ),
+                    400,
+                )
+
+            # 校验密码长度
+            if len(password) < 6 or len(password) > 20:
+                return (
+                    jsonify(
+                        {"error": "Password must be between 6 and 20 characters long."}
+                    ),
+                    400,
+                )
+
+            # 创建新用户
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            cur.execute(
+                """
+                INSERT INTO users (username, password_hash, role)
+                VALUES (%s, %s, 'user')
+                """,
+                (username, hashed_password),
             )
+            conn.commit()
 
-        # 创建新用户
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        cur.execute(
-            """
-            INSERT INTO users (username, password_hash, role)
-            VALUES (%s, %s, 'user')
-            """,
-            (username, hashed_password),
-        )
-        conn.commit()
-
-        return jsonify({"message": "User registered successfully."}), 201
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+            return jsonify({"message": "User registered successfully."}), 201
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            cur.close()
 
 
 @app.route("/api/admin-login", methods=["POST"])
@@ -1086,57 +1110,60 @@ def admin_login():
             400,
         )
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        # 查询用户信息
-        cur.execute(
-            "SELECT id, password_hash, role FROM users WHERE username = %s",
-            (username,),
-        )
-        user = cur.fetchone()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-        if not user:
-            return (
-                jsonify({"success": False, "message": "Invalid username or password."}),
-                401,
-            )
-
-        user_id, password_hash, role = user
-
-        # 验证密码
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        if hashed_password != password_hash:
-            return (
-                jsonify({"success": False, "message": "Invalid username or password."}),
-                401,
-            )
-
-        # 检查角色是否为管理员
-        if role != "admin":
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": "Access denied.",
-                    }
-                ),
-                403,
+        try:
+            # 查询用户信息
+            cur.execute(
+                "SELECT id, password_hash, role FROM users WHERE username = %s",
+                (username,),
             )
-
-        # 设置会话
-        session["user_id"] = user_id
-        session["username"] = username
-        session["role"] = role
-        session["logged_in"] = True
-
-        return jsonify({"success": True, "role": role})
-    except Exception as e:
-        return jsonify({"success": False, "message": "An error occurred."}), 500
-    finally:
-        cur.close()
-        conn.close()
+            user = cur.fetchone()
+
+            if not user:
+                return (
+                    jsonify(
+                        {"success": False, "message": "Invalid username or password."}
+                    ),
+                    401,
+                )
+
+            user_id, password_hash, role = user
+
+            # 验证密码
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            if hashed_password != password_hash:
+                return (
+                    jsonify(
+                        {"success": False, "message": "Invalid username or password."}
+                    ),
+                    401,
+                )
+
+            # 检查角色是否为管理员
+            if role != "admin":
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "message": "Access denied.",
+                        }
+                    ),
+                    403,
+                )
+
+            # 设置会话
+            session["user_id"] = user_id
+            session["username"] = username
+            session["role"] = role
+            session["logged_in"] = True
+
+            return jsonify({"success": True, "role": role})
+        except Exception as e:
+            return jsonify({"success": False, "message": "An error occurred."}), 500
+        finally:
+            cur.close()
 
 
 @app.route("/admin", methods=["GET"])
@@ -1144,7 +1171,7 @@ def admin_login():
 def admin_page():
     if session.get("role") != "admin":
         return jsonify({"error": "Access denied"}), 403
-    return send_from_directory(app.static_folder, "admin.html")
+    return send_static("admin.html")
 
 
 @app.route("/api/admin/users", methods=["GET"])
@@ -1153,28 +1180,30 @@ def get_users():
     if session.get("role") != "admin":
         return jsonify({"error": "Access denied"}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # 先写入本进程待写入的最后登录时间
+    flush_last_logins()
 
-    try:
-        cur.execute("SELECT id, username, role, last_login FROM users order by id")
-        users = [
-            {
-                "id": row[0],
-                "username": row[1],
-                "role": row[2],
-                "lastLogin": (
-                    row[3].strftime("%Y/%m/%d %H:%M:%S") if row[3] else "Never"
-                ),
-            }
-            for row in cur.fetchall()
-        ]
-        return jsonify({"users": users}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        try:
+            cur.execute("SELECT id, username, role, last_login FROM users order by id")
+            users = [
+                {
+                    "id": row[0],
+                    "username": row[1],
+                    "role": row[2],
+                    "lastLogin": (
+                        row[3].strftime("%Y/%m/%d %H:%M:%S") if row[3] else "Never"
+                    ),
+                }
+                for row in cur.fetchall()
+            ]
+            return jsonify({"users": users}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            cur.close()
 
 
 @app.route("/api/admin/users/<int:user_id>", methods=["PUT"])
@@ -1192,9 +1221,6 @@ def update_user(user_id):
     if new_role not in ["admin", "user"]:
         return jsonify({"error": "Invalid role."}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     # 校验用户名长度
     if new_username and (len(new_username) < 3 or len(new_username) > 20):
         return (
@@ -1209,42 +1235,44 @@ def update_user(user_id):
             400,
         )
 
-    try:
-        # 检查用户名是否已存在
-        cur.execute(
-            "SELECT id FROM users WHERE username = %s AND id != %s",
-            (new_username, user_id),
-        )
-        if cur.fetchone():
-            return jsonify({"error": "Username already exists."}), 400
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-        if new_username:
+        try:
+            # 检查用户名是否已存在
             cur.execute(
-                "UPDATE users SET username = %s WHERE id = %s",
+                "SELECT id FROM users WHERE username = %s AND id != %s",
                 (new_username, user_id),
             )
-
-        if new_password:
-            password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-            cur.execute(
-                "UPDATE users SET password_hash = %s WHERE id = %s",
-                (password_hash, user_id),
-            )
-
-        if new_role:
-            cur.execute(
-                "UPDATE users SET role = %s WHERE id = %s",
-                (new_role, user_id),
-            )
-
-        conn.commit()
-        return jsonify({"success": True})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+            if cur.fetchone():
+                return jsonify({"error": "Username already exists."}), 400
+
+            if new_username:
+                cur.execute(
+                    "UPDATE users SET username = %s WHERE id = %s",
+                    (new_username, user_id),
+                )
+
+            if new_password:
+                password_hash = hashlib.sha256(new_password.encode()).hexdigest()
+                cur.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s",
+                    (password_hash, user_id),
+                )
+
+            if new_role:
+                cur.execute(
+                    "UPDATE users SET role = %s WHERE id = %s",
+                    (new_role, user_id),
+                )
+
+            conn.commit()
+            return jsonify({"success": True})
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            cur.close()
 
 
 @app.route("/api/admin/users/<int:user_id>", methods=["DELETE"])
@@ -1254,19 +1282,84 @@ def delete_user(user_id):
     if user_id == current_user_id:
         return jsonify({"error": "You cannot delete your own account."}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
+        try:
+            cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            conn.commit()
+            return jsonify({"success": True})
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            cur.close()
+
+
+@app.route("/api/admin/pool-metrics", methods=["GET"])
+@login_required
+def get_db_pool_metrics():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Access denied"}), 403
+
+    # 连接池指标（借出次数、等待次数、等待时间），用于评估连接池大小
+    return jsonify(get_pool_metrics()), 200
+
+
+@app.route("/api/admin/hourly-store-metrics", methods=["GET"])
+@login_required
+def get_hourly_store_status():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Access denied"}), 403
+
+    # 每小时人数内存存储的摄像头数、小时数和内存占用
+    return jsonify(get_hourly_store_metrics()), 200
+
+
+@app.route("/api/admin/cache-metrics", methods=["GET"])
+@login_required
+def get_query_cache_metrics():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Access denied"}), 403
+
+    # 查询结果缓存的命中/未命中次数及当前数据版本
+    return jsonify(get_cache_metrics()), 200
+
+
+@app.route("/api/admin/live-metrics", methods=["GET"])
+@login_required
+def get_live_update_metrics():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Access denied"}), 403
+
+    # 实时更新的订阅数（不同查询条件）和浏览器连接数
+    return jsonify(get_live_metrics()), 200
+
+
+# 就绪检查（负载均衡、服务管理器及平滑重新加载时使用，无需登录）：本进程能取得可用的数据库连接时返回200
+@app.route("/api/ready", methods=["GET"])
+def readiness():
     try:
-        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
-        conn.commit()
-        return jsonify({"success": True})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+            finally:
+                cur.close()
+    except psycopg2.Error as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ready", "pid": os.getpid()}), 200
+
+
+@app.route("/api/admin/cache/invalidate", methods=["POST"])
+@login_required
+def invalidate_query_cache():
+    if session.get("role") != "admin":
+        return jsonify({"error": "Access denied"}), 403
+
+    # 导入新数据（尤其是补录历史数据）后由导入流程调用，清空全部查询结果缓存
+    invalidate_cache()
+    return jsonify({"message": "Cache invalidated"}), 200
 
 
 # 处理Chrome DevTools请求
@@ -1275,5 +1368,6 @@ def handle_chrome_devtools():
     return jsonify({"message": "Not Found"}), 404
 
 
+# 开发调试用的单进程服务器，生产环境使用 serve.py
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5050, debug=True)
@@ -0,0 +1,468 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2 import extensions
+
+from config import DATABASE_CONFIG
+from common import close_db_pool, db_connection, init_db_pool
+import generate_db
+
+# 预设数据规模：(年数, 每个站点的摄像头数, 站点数)
+SCALE_PRESETS = {
+    "small": (1, 8, 1),  # 1年 / 8个摄像头
+    "medium": (2, 8, 5),  # 2年 / 40个摄像头
+    "large": (5, 8, 25),  # 5年 / 200个摄像头
+}
+
+# 统计扫描行数的表
+SCANNED_TABLES = ["video_analysis", "video_analysis_hourly", "video_analysis_daily"]
+
+# 当前请求执行的SQL条数（由CountingCursor累加）
+_query_count = 0
+
+
+class CountingCursor(extensions.cursor):
+    """统计执行SQL条数的游标，通过init_db_pool(cursor_factory=...)注入连接池"""
+
+    def execute(self, query, vars=None):
+        global _query_count
+        _query_count += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        global _query_count
+        _query_count += 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        global _query_count
+        _query_count += 1
+        return super().copy_expert(sql, file, size)
+
+
+def get_bench_config(dbname):
+    """
+    获取压测数据库的连接参数
+    :param dbname: 压测数据库名
+    :return: 连接参数字典
+    """
+    return {**DATABASE_CONFIG, "dbname": dbname}
+
+
+def ensure_database(dbname):
+    """
+    压测数据库不存在时创建
+    :param dbname: 压测数据库名
+    """
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,))
+        if cur.fetchone() is None:
+            cur.execute(f'CREATE DATABASE "{dbname}"')
+            print(f"已创建压测数据库 {dbname}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def seed_database(db_config, start_date, end_date, camera_count, scale):
+    """
+    按generate_db.py的表结构重建压测数据库并批量导入数据
+    :param db_config: 压测数据库连接参数
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param camera_count: 每个站点的摄像头数量
+    :param scale: 站点数量
+    :return: 导入耗时（秒）
+    """
+    started = time.perf_counter()
+    generate_db.setup_database(db_config)
+    generate_db.bulk_load_video_analysis(
+        start_date, end_date, camera_count, scale, db_config
+    )
+    return time.perf_counter() - started
+
+
+def get_data_range(db_config):
+    """
+    获取压测数据库中数据的时间范围及行数
+    :return: (最早开始时间, 最晚开始时间, 行数)
+    """
+    conn = psycopg2.connect(**db_config)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT MIN(start_time), MAX(start_time), COUNT(*) FROM video_analysis"
+        )
+        return cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def read_scan_stats(stats_conn):
+    """
+    读取各表累计的扫描行数（顺序扫描读取的行 + 索引扫描返回的索引项）
+    :param stats_conn: 统计专用连接（autocommit，不经过连接池）
+    :return: {表名: 扫描行数}
+    """
+    cur = stats_conn.cursor()
+    try:
+        # 清除本连接缓存的统计快照，读取最新值
+        cur.execute("SELECT pg_stat_clear_snapshot()")
+        cur.execute(
+            """
+            SELECT
+                t.relname,
+                COALESCE(t.seq_tup_read, 0)
+                    + COALESCE(SUM(i.idx_tup_read), 0)
+            FROM pg_stat_user_tables t
+            LEFT JOIN pg_stat_user_indexes i ON i.relid = t.relid
+            WHERE t.relname = ANY(%s)
+            GROUP BY t.relname, t.seq_tup_read
+            """,
+            (SCANNED_TABLES,),
+        )
+        return {name: int(count) for name, count in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def flush_pool_stats():
+    """
+    让连接池中的连接立即上报统计数据（PostgreSQL 15+；默认最多每秒上报一次）
+    压测时连接池只有1个连接，上报后即可读取到本次请求的扫描行数
+    """
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT pg_stat_force_next_flush()")
+            finally:
+                cur.close()
+            conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def percentile(values, percent):
+    """
+    计算百分位数（线性插值）
+    :param values: 数值列表
+    :param percent: 百分位，如95
+    :return: 百分位数
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_case(name, func, repeat, stats_conn, before_each=None):
+    """
+    重复执行一个场景，记录延迟、SQL条数和扫描行数
+    :param name: 场景名称
+    :param func: 执行一次场景的函数，返回是否成功
+    :param repeat: 重复次数
+    :param stats_conn: 统计专用连接
+    :param before_each: 每次执行前调用的函数（如清空查询缓存）
+    :return: 场景结果字典
+    """
+    global _query_count
+
+    latencies = []
+    query_counts = []
+    rows_scanned = []
+    errors = 0
+    stats_available = True
+
+    for _ in range(repeat):
+        if before_each is not None:
+            before_each()
+        scans_before = read_scan_stats(stats_conn)
+        _query_count = 0
+
+        started = time.perf_counter()
+        ok = func()
+        latencies.append((time.perf_counter() - started) * 1000)
+        query_counts.append(_query_count)
+        if not ok:
+            errors += 1
+
+        stats_available = flush_pool_stats() and stats_available
+        scans_after = read_scan_stats(stats_conn)
+        rows_scanned.append(
+            {
+                table: scans_after.get(table, 0) - scans_before.get(table, 0)
+                for table in SCANNED_TABLES
+            }
+        )
+
+    result = {
+        "runs": repeat,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "min_ms": round(min(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries_per_request": max(query_counts),
+        "rows_scanned": (
+            {
+                table: max(scans[table] for scans in rows_scanned)
+                for table in SCANNED_TABLES
+            }
+            if stats_available
+            else None
+        ),
+    }
+    print(
+        f"{name:<32} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+        f"queries {result['queries_per_request']:>3}"
+    )
+    return result
+
+
+def get_range_pairs(last_time):
+    """
+    以数据的最后一天为“今天”，生成常用的(当前范围, 对比范围)组合
+    :param last_time: 数据中最晚的开始时间
+    :return: {场景名: (date_start, date_end, ref_date_start, ref_date_end)}
+    """
+    fmt = "%Y-%m-%d %H:%M:%S"
+    today = datetime(last_time.year, last_time.month, last_time.day)
+
+    def day_range(start, days):
+        end = start + timedelta(days=days) - timedelta(seconds=1)
+        return start.strftime(fmt), end.strftime(fmt)
+
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    prev_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return {
+        "today_vs_yesterday": (
+            *day_range(today, 1),
+            *day_range(today - timedelta(days=1), 1),
+        ),
+        "this_week_vs_last_week": (
+            *day_range(week_start, 7),
+            *day_range(week_start - timedelta(days=7), 7),
+        ),
+        "this_month_vs_last_month": (
+            *day_range(month_start, (today - month_start).days + 1),
+            *day_range(prev_month_start, (month_start - prev_month_start).days),
+        ),
+        "last_30_days_vs_previous": (
+            *day_range(today - timedelta(days=29), 30),
+            *day_range(today - timedelta(days=59), 30),
+        ),
+        "last_365_days_vs_previous": (
+            *day_range(today - timedelta(days=364), 365),
+            *day_range(today - timedelta(days=729), 365),
+        ),
+    }
+
+
+def get_git_commit():
+    """获取当前代码的git提交（用于对比不同版本的压测结果）"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(db_config, repeat, use_cache):
+    """
+    通过Flask测试客户端压测仪表板、客流分布和PDF报告
+    :param db_config: 压测数据库连接参数
+    :param repeat: 每个场景的重复次数
+    :param use_cache: 是否保留查询结果缓存（否则每次执行前清空）
+    :return: {场景名: 结果字典}
+    """
+    # 连接池只保留1个连接，保证本次请求的统计数据都来自同一个后端进程
+    init_db_pool(
+        minconn=1,
+        maxconn=1,
+        dbname=db_config["dbname"],
+        cursor_factory=CountingCursor,
+    )
+
+    import app as app_module
+    import cache
+    import generate_pdf
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["logged_in"] = True
+        sess["user_id"] = 1
+        sess["username"] = "benchmark"
+        sess["role"] = "admin"
+
+    before_each = None if use_cache else cache.invalidate_cache
+
+    first_time, last_time, _ = get_data_range(db_config)
+    if last_time is None:
+        raise SystemExit("压测数据库中没有数据，请先使用 --seed 导入数据")
+
+    stats_conn = psycopg2.connect(**db_config)
+    stats_conn.autocommit = True
+    results = {}
+    try:
+        for name, (start, end, ref_start, ref_end) in get_range_pairs(
+            last_time
+        ).items():
+            body = {
+                "date_start": start,
+                "date_end": end,
+                "ref_date_start": ref_start,
+                "ref_date_end": ref_end,
+            }
+            results[f"dashboard:{name}"] = run_case(
+                f"dashboard:{name}",
+                lambda body=body: client.post("/api/dashboard", json=body).status_code
+                == 200,
+                repeat,
+                stats_conn,
+                before_each,
+            )
+
+        results["footfall_distribution"] = run_case(
+            "footfall_distribution",
+            lambda: client.get("/api/footfall-distribution").status_code == 200,
+            repeat,
+            stats_conn,
+            before_each,
+        )
+
+        report_date = last_time.strftime("%Y-%m-%d")
+        with tempfile.TemporaryDirectory() as output_dir:
+
+            def render_report():
+                generate_pdf.main(
+                    [
+                        "--start",
+                        report_date,
+                        "--workers",
+                        "1",
+                        "--output-dir",
+                        output_dir,
+                    ]
+                )
+                return True
+
+            results["generate_pdf"] = run_case(
+                "generate_pdf", render_report, repeat, stats_conn
+            )
+    finally:
+        stats_conn.close()
+        close_db_pool()
+
+    return results
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="压测仪表板、客流分布和PDF报告，输出JSON结果"
+    )
+    parser.add_argument(
+        "--dbname", default="dashboard_bench", help="压测数据库名（会被重建）"
+    )
+    parser.add_argument(
+        "--preset", choices=sorted(SCALE_PRESETS), default="small", help="预设数据规模"
+    )
+    parser.add_argument("--years", type=int, help="数据年数（覆盖预设）")
+    parser.add_argument("--cameras", type=int, help="每个站点的摄像头数量（覆盖预设）")
+    parser.add_argument("--scale", type=int, help="站点数量（覆盖预设）")
+    parser.add_argument("--seed", action="store_true", help="重建压测数据库并导入数据")
+    parser.add_argument("--repeat", type=int, default=20, help="每个场景的重复次数")
+    parser.add_argument(
+        "--with-cache",
+        action="store_true",
+        help="保留查询结果缓存（默认每次请求前清空，测量查询本身）",
+    )
+    parser.add_argument(
+        "--output", default="benchmark_results.json", help="JSON结果输出文件"
+    )
+    args = parser.parse_args()
+    if args.dbname == DATABASE_CONFIG["dbname"]:
+        parser.error("压测数据库不能与业务数据库相同")
+    if args.repeat < 1:
+        parser.error("重复次数必须大于0")
+    return args
+
+
+def main():
+    args = parse_args()
+    years, camera_count, scale = SCALE_PRESETS[args.preset]
+    years = args.years or years
+    camera_count = args.cameras or camera_count
+    scale = args.scale or scale
+
+    db_config = get_bench_config(args.dbname)
+    ensure_database(args.dbname)
+
+    seed_seconds = None
+    if args.seed:
+        end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = end_date - timedelta(days=365 * years - 1)
+        seed_seconds = seed_database(
+            db_config, start_date, end_date, camera_count, scale
+        )
+
+    first_time, last_time, row_count = get_data_range(db_config)
+    results = run_benchmarks(db_config, args.repeat, args.with_cache)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "dbname": args.dbname,
+            # 本次重建数据时的规模（未指定--seed时沿用已有数据，见rows/data_start/data_end）
+            "seed": (
+                {
+                    "years": years,
+                    "cameras_per_site": camera_count,
+                    "sites": scale,
+                    "seconds": round(seed_seconds, 3),
+                }
+                if args.seed
+                else None
+            ),
+            "rows": row_count,
+            "data_start": first_time.isoformat() if first_time else None,
+            "data_end": last_time.isoformat() if last_time else None,
+            "repeat": args.repeat,
+            "with_cache": args.with_cache,
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from config import ASSETS_CONFIG
+from http_cache import PRECOMPRESSED_SUFFIXES, precompress_static
+
+# 项目根目录及前端源文件目录
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SOURCE_DIR = os.path.join(PROJECT_ROOT, "frontend")
+
+# 需要改写资源引用的页面
+HTML_PAGES = ["dashboard.html", "login.html", "register.html", "admin.html"]
+
+# 构建清单文件名（位于构建目录中）
+MANIFEST_NAME = "manifest.json"
+
+# 页面中的相对路径引用，如 src="./themes/mei/dashboard.js"
+_HTML_REFERENCE = re.compile(r'((?:src|href)=")\./([^"#?]+)(")')
+# CSS中的url()引用，如 url(./images/picture_total.png)
+_CSS_REFERENCE = re.compile(r"url\((['\"]?)([^)'\"]+)\1\)")
+
+
+def get_dist_dir():
+    """构建目录的绝对路径"""
+    return os.path.join(PROJECT_ROOT, ASSETS_CONFIG["dist_dir"])
+
+
+def load_manifest(dist_dir=None):
+    """
+    读取构建清单
+    :param dist_dir: 构建目录，默认取ASSETS_CONFIG
+    :return: {原路径: 带内容哈希的路径}，未构建时为None
+    """
+    path = os.path.join(dist_dir or get_dist_dir(), MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["assets"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _hashed_name(path, data):
+    """
+    带内容哈希的文件名，如 themes/mei/dashboard.js -> themes/mei/dashboard.3f2a1b9c0d.js
+    :param path: 相对路径（/分隔）
+    :param data: 文件内容
+    """
+    digest = hashlib.sha256(data).hexdigest()[: ASSETS_CONFIG["hash_length"]]
+    base, ext = os.path.splitext(path)
+    return f"{base}.{digest}{ext}"
+
+
+class _Fingerprinter:
+    """为构建目录中的文件生成带内容哈希的副本（原文件保留，供脚本中动态拼接的路径使用）"""
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+
+    def fingerprint(self, path):
+        """
+        生成带内容哈希的副本，CSS先改写其中的url()引用再计算哈希
+        :param path: 相对于构建目录的路径（/分隔）
+        :return: 带内容哈希的路径，文件不存在时为None
+        """
+        if path in self.assets:
+            return self.assets[path]
+
+        full_path = os.path.join(self.root, *path.split("/"))
+        if not os.path.isfile(full_path):
+            return None
+        with open(full_path, "rb") as f:
+            data = f.read()
+        if path.endswith(".css"):
+            data = self._rewrite_css(path, data)
+
+        hashed = _hashed_name(path, data)
+        with open(os.path.join(self.root, *hashed.split("/")), "wb") as f:
+            f.write(data)
+        # 保持与原文件相同的修改时间，预压缩时按修改时间判断是否需要重新生成
+        shutil.copystat(full_path, os.path.join(self.root, *hashed.split("/")))
+        self.assets[path] = hashed
+        return hashed
+
+    def _rewrite_css(self, path, data):
+        """改写CSS中的相对路径url()引用"""
+        directory = os.path.dirname(path)
+
+        def replace(match):
+            quote, reference = match.groups()
+            if reference.startswith(("data:", "http:", "https:", "/", "#")):
+                return match.group(0)
+            target = os.path.normpath(os.path.join(directory, reference)).replace(
+                "\\", "/"
+            )
+            hashed = self.fingerprint(target)
+            if hashed is None:
+                return match.group(0)
+            relative = os.path.relpath(hashed, directory).replace("\\", "/")
+            if reference.startswith("./"):
+                relative = "./" + relative
+            return f"url({quote}{relative}{quote})"
+
+        return _CSS_REFERENCE.sub(replace, data.decode("utf-8")).encode("utf-8")
+
+    def rewrite_page(self, page):
+        """
+        改写页面中的资源引用为带内容哈希的路径
+        :param page: 页面文件名
+        :return: 改写的引用数
+        """
+        full_path = os.path.join(self.root, page)
+        with open(full_path, encoding="utf-8", newline="") as f:
+            html = f.read()
+
+        count = 0
+
+        def replace(match):
+            nonlocal count
+            prefix, reference, suffix = match.groups()
+            hashed = self.fingerprint(reference)
+            if hashed is None:
+                return match.group(0)
+            count += 1
+            return f"{prefix}./{hashed}{suffix}"
+
+        html = _HTML_REFERENCE.sub(replace, html)
+        with open(full_path, "w", encoding="utf-8", newline="") as f:
+            f.write(html)
+        return count
+
+
+def build_assets(source_dir=SOURCE_DIR, dist_dir=None):
+    """
+    构建前端静态文件：复制源目录，为页面引用的资源（及CSS引用的图片）生成带内容哈希的副本并改写引用，
+    生成预压缩文件和构建清单；先在临时目录中构建，完成后替换原构建目录
+    :param source_dir: 前端源文件目录
+    :param dist_dir: 构建目录，默认取ASSETS_CONFIG
+    :return: {原路径: 带内容哈希的路径}
+    """
+    dist_dir = dist_dir or get_dist_dir()
+    build_dir = dist_dir + ".tmp"
+    if os.path.exists(build_dir):
+        shutil.rmtree(build_dir)
+
+    # 源目录中手动生成的预压缩文件不复制，构建目录中统一重新生成
+    suffixes = tuple(f"*{suffix}" for suffix in PRECOMPRESSED_SUFFIXES.values())
+    shutil.copytree(source_dir, build_dir, ignore=shutil.ignore_patterns(*suffixes))
+
+    fingerprinter = _Fingerprinter(build_dir)
+    for page in HTML_PAGES:
+        if os.path.isfile(os.path.join(build_dir, page)):
+            fingerprinter.rewrite_page(page)
+    precompress_static(build_dir)
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"assets": fingerprinter.assets}, f, indent=2, sort_keys=True)
+
+    if os.path.exists(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.replace(build_dir, dist_dir)
+    return fingerprinter.assets
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="构建前端静态文件（内容哈希文件名 + 预压缩），修改frontend后需重新构建"
+    )
+    parser.add_argument(
+        "--clean", action="store_true", help="删除构建目录，恢复直接使用frontend"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.clean:
+        if os.path.exists(get_dist_dir()):
+            shutil.rmtree(get_dist_dir())
+        print(f"已删除 {get_dist_dir()}")
+    else:
+        assets = build_assets()
+        print(f"构建完成: {len(assets)} 个带内容哈希的文件 -> {get_dist_dir()}")
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from common import db_connection, get_data_version, parse_timestamp
+from config import CACHE_CONFIG
+
+# 查询结果缓存：key -> (过期时间, 结果)，过期时间为None表示不过期（纯历史数据）
+# OrderedDict按访问顺序排列，队首为最久未使用的条目
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_metrics = {
+    "hits": 0,  # 命中次数
+    "misses": 0,  # 未命中次数（含已过期）
+    "expirations": 0,  # 因过期而失效的条目数
+    "evictions": 0,  # 因超过容量被淘汰的条目数
+    "invalidations": 0,  # 整体失效次数（新数据导入或手动失效）
+    "stale_writes": 0,  # 因期间缓存被清空而丢弃的写入次数
+}
+
+# 缓存代数：每次整体清空时加一，清空前开始的查询不能再写入结果
+_cache_generation = 0
+
+# 数据版本：(max_run_id, max_end_time, max_analysis_time, max_change_seq)，版本变化时清空缓存
+_data_version = None
+_data_version_checked_at = 0.0
+
+
+def normalize_range(date_start, date_end):
+    """
+    将请求中的时间范围规范化为缓存键（同一时刻的不同写法得到相同的键）
+    :param date_start: 开始时间
+    :param date_end: 结束时间
+    :return: (start, end) 字符串元组
+    """
+    normalized = []
+    for value in (date_start, date_end):
+        parsed = parse_timestamp(value)
+        normalized.append(parsed.isoformat(sep=" ") if parsed else str(value))
+    return tuple(normalized)
+
+
+def cache_get(key):
+    """
+    读取缓存
+    :param key: 缓存键
+    :return: (是否命中, 缓存的结果, 读取时的缓存代数)，未命中时将代数传给cache_set
+    """
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at is None or expires_at > time.monotonic():
+                _cache.move_to_end(key)
+                _cache_metrics["hits"] += 1
+                return True, value, _cache_generation
+            del _cache[key]
+            _cache_metrics["expirations"] += 1
+        _cache_metrics["misses"] += 1
+        return False, None, _cache_generation
+
+
+def cache_set(key, value, ttl=None, generation=None):
+    """
+    写入缓存，超过容量时淘汰最久未使用的条目
+    :param key: 缓存键
+    :param value: 结果（调用方不应再修改）
+    :param ttl: 缓存时间（秒），None表示不过期
+    :param generation: cache_get返回的缓存代数；期间缓存已被清空时丢弃本次写入
+                       （结果可能基于旧数据，不能按新的数据版本缓存）
+    :return: 是否已写入
+    """
+    expires_at = None if ttl is None else time.monotonic() + ttl
+    with _cache_lock:
+        if generation is not None and generation != _cache_generation:
+            _cache_metrics["stale_writes"] += 1
+            return False
+        _cache[key] = (expires_at, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_CONFIG["max_entries"]:
+            _cache.popitem(last=False)
+            _cache_metrics["evictions"] += 1
+        return True
+
+
+def _clear_cache():
+    """清空全部缓存并增加缓存代数（调用方须持有_cache_lock）"""
+    global _cache_generation
+
+    _cache.clear()
+    _cache_generation += 1
+    _cache_metrics["invalidations"] += 1
+
+
+def invalidate_cache():
+    """清空全部缓存（导入新数据后调用）"""
+    global _data_version_checked_at
+
+    with _cache_lock:
+        _clear_cache()
+        # 下次请求时重新读取数据版本
+        _data_version_checked_at = 0.0
+
+
+def sync_data_version():
+    """
+    按间隔检查数据版本，发现有新导入的数据时清空缓存
+    （其他进程导入数据后无需显式调用invalidate_cache，最多延迟一个检查间隔）
+    :return: 当前数据版本 (max_run_id, max_end_time, max_analysis_time, max_change_seq)
+    """
+    global _data_version, _data_version_checked_at
+
+    now = time.monotonic()
+    with _cache_lock:
+        if now - _data_version_checked_at < CACHE_CONFIG["version_check_interval"]:
+            return _data_version
+
+    with db_connection() as conn:
+        version = get_data_version(conn)
+
+    with _cache_lock:
+        if version != _data_version:
+            if _data_version is not None:
+                _clear_cache()
+            _data_version = version
+        _data_version_checked_at = now
+        return _data_version
+
+
+def get_range_ttl(*range_ends):
+    """
+    根据时间范围的结束时间决定缓存时间：全部早于最新数据的范围为纯历史数据，不过期；
+    包含最新数据（如今天）的范围使用较短的缓存时间
+    :param range_ends: 各时间范围的结束时间
+    :return: 缓存时间（秒），None表示不过期
+    """
+    version = sync_data_version()
+    watermark = version[1] if version else None
+    if watermark is None:
+        return CACHE_CONFIG["live_ttl"]
+
+    for value in range_ends:
+        end = parse_timestamp(value)
+        if end is None or end >= watermark:
+            return CACHE_CONFIG["live_ttl"]
+    return None
+
+
+def get_cache_metrics():
+    """
+    获取缓存命中统计
+    :return: 统计信息字典
+    """
+    with _cache_lock:
+        metrics = dict(_cache_metrics)
+        metrics["entries"] = len(_cache)
+        metrics["max_entries"] = CACHE_CONFIG["max_entries"]
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else 0.0
+        metrics["data_version"] = (
+            [
+                value.isoformat(sep=" ") if isinstance(value, datetime) else value
+                for value in _data_version
+            ]
+            if _data_version
+            else None
+        )
+    return metrics
@@ -1,13 +1,292 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
 import psycopg2
-from config import DATABASE_CONFIG
+from psycopg2 import extensions, pool
+from config import DATABASE_CONFIG, POOL_CONFIG
+from tracing import TracingCursor
 
 # 数据库配置
 DB_CONFIG = DATABASE_CONFIG
 
+# 连接池（按进程懒加载，fork后的子进程会重新创建自己的连接池）
+_db_pool = None
+_db_pool_pid = None
+_db_pool_slots = None
+_db_pool_options = {}
+_db_pool_lock = threading.Lock()
+
+# 连接池指标
+_pool_metrics = {
+    "checkouts": 0,
+    "waits": 0,
+    "wait_time": 0.0,
+    "max_wait_time": 0.0,
+    "timeouts": 0,
+    "discarded": 0,
+    "in_use": 0,
+}
+_pool_metrics_lock = threading.Lock()
+
+# 并发查询线程池（按进程懒加载）
+_query_executor = None
+_query_executor_pid = None
+_query_executor_lock = threading.Lock()
+
 
 def get_db_connection():
-    """创建并返回数据库连接"""
-    return psycopg2.connect(**DB_CONFIG)
+    """创建并返回数据库连接（不经过连接池，仅用于独立脚本和长连接）"""
+    return psycopg2.connect(**DB_CONFIG, cursor_factory=TracingCursor)
+
+
+def init_db_pool(minconn=None, maxconn=None, **connect_kwargs):
+    """
+    初始化（或重建）当前进程的数据库连接池
+    :param minconn: 最小连接数，默认取POOL_CONFIG
+    :param maxconn: 最大连接数，默认取POOL_CONFIG
+    :param connect_kwargs: 额外传给psycopg2.connect的参数（如cursor_factory、dbname）
+    """
+    global _db_pool_options
+
+    with _db_pool_lock:
+        _db_pool_options = {
+            "minconn": POOL_CONFIG["minconn"] if minconn is None else minconn,
+            "maxconn": POOL_CONFIG["maxconn"] if maxconn is None else maxconn,
+            "connect_kwargs": connect_kwargs,
+        }
+        _create_db_pool()
+
+
+def _pool_connect_kwargs():
+    """连接池使用的psycopg2.connect参数"""
+    # 默认使用TracingCursor（不在追踪的请求中时不做记录），
+    # init_db_pool的connect_kwargs可覆盖DB_CONFIG中的同名参数（如dbname）
+    return {
+        **DB_CONFIG,
+        "cursor_factory": TracingCursor,
+        **_db_pool_options.get("connect_kwargs", {}),
+    }
+
+
+def get_dedicated_connection():
+    """
+    创建与连接池参数相同、但不归连接池管理的连接（用于LISTEN等长期占用的连接）
+    :return: 数据库连接
+    """
+    return psycopg2.connect(**_pool_connect_kwargs())
+
+
+def _create_db_pool():
+    """按_db_pool_options创建连接池（调用方需持有_db_pool_lock）"""
+    global _db_pool, _db_pool_pid, _db_pool_slots
+
+    # 只关闭本进程创建的连接池，fork继承的连接属于父进程
+    if _db_pool is not None and _db_pool_pid == os.getpid():
+        _db_pool.closeall()
+
+    minconn = _db_pool_options.get("minconn", POOL_CONFIG["minconn"])
+    maxconn = _db_pool_options.get("maxconn", POOL_CONFIG["maxconn"])
+    _db_pool = pool.ThreadedConnectionPool(minconn, maxconn, **_pool_connect_kwargs())
+    _db_pool_pid = os.getpid()
+    # 信号量限制同时借出的连接数，连接池耗尽时排队等待而不是直接报错
+    _db_pool_slots = threading.BoundedSemaphore(maxconn)
+
+    with _pool_metrics_lock:
+        _pool_metrics["in_use"] = 0
+
+
+def close_db_pool():
+    """关闭当前进程的数据库连接池"""
+    global _db_pool, _db_pool_pid, _db_pool_slots
+
+    with _db_pool_lock:
+        if _db_pool is not None and _db_pool_pid == os.getpid():
+            _db_pool.closeall()
+        _db_pool = None
+        _db_pool_pid = None
+        _db_pool_slots = None
+
+
+def _get_db_pool():
+    """返回当前进程的连接池，必要时创建"""
+    if _db_pool is None or _db_pool_pid != os.getpid():
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool_pid != os.getpid():
+                _create_db_pool()
+    return _db_pool, _db_pool_slots
+
+
+def _checkout_connection(db_pool):
+    """从连接池取出一个健康的连接，失效的连接会被丢弃并重试"""
+    for _ in range(_db_pool_options.get("maxconn", POOL_CONFIG["maxconn"]) + 1):
+        conn = db_pool.getconn()
+        if conn.closed:
+            db_pool.putconn(conn, close=True)
+            with _pool_metrics_lock:
+                _pool_metrics["discarded"] += 1
+            continue
+
+        if not POOL_CONFIG["health_check"]:
+            return conn
+
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+            finally:
+                cur.close()
+            conn.rollback()
+            return conn
+        except psycopg2.Error:
+            db_pool.putconn(conn, close=True)
+            with _pool_metrics_lock:
+                _pool_metrics["discarded"] += 1
+
+    raise pool.PoolError("Unable to obtain a healthy database connection")
+
+
+@contextmanager
+def db_connection():
+    """
+    从连接池借出数据库连接，退出时自动归还
+    未提交的事务会被回滚，已断开的连接会被丢弃
+    用法：
+        with db_connection() as conn:
+            ...
+    """
+    db_pool, slots = _get_db_pool()
+
+    # 等待空闲连接
+    wait_start = time.monotonic()
+    waited = not slots.acquire(blocking=False)
+    if waited and not slots.acquire(timeout=POOL_CONFIG["checkout_timeout"]):
+        with _pool_metrics_lock:
+            _pool_metrics["timeouts"] += 1
+        raise pool.PoolError("Timed out waiting for a database connection")
+    wait_time = time.monotonic() - wait_start
+
+    try:
+        conn = _checkout_connection(db_pool)
+    except Exception:
+        slots.release()
+        raise
+
+    with _pool_metrics_lock:
+        _pool_metrics["checkouts"] += 1
+        _pool_metrics["in_use"] += 1
+        if waited:
+            _pool_metrics["waits"] += 1
+            _pool_metrics["wait_time"] += wait_time
+            _pool_metrics["max_wait_time"] = max(
+                _pool_metrics["max_wait_time"], wait_time
+            )
+
+    try:
+        yield conn
+    finally:
+        try:
+            if conn.closed:
+                db_pool.putconn(conn, close=True)
+                with _pool_metrics_lock:
+                    _pool_metrics["discarded"] += 1
+            else:
+                # 归还前回滚未提交的事务，保证下一个使用者拿到干净的连接
+                if conn.status != extensions.STATUS_READY:
+                    conn.rollback()
+                db_pool.putconn(conn)
+        except psycopg2.Error:
+            db_pool.putconn(conn, close=True)
+            with _pool_metrics_lock:
+                _pool_metrics["discarded"] += 1
+        finally:
+            with _pool_metrics_lock:
+                _pool_metrics["in_use"] -= 1
+            slots.release()
+
+
+def _get_query_executor():
+    """返回当前进程的并发查询线程池，必要时创建"""
+    global _query_executor, _query_executor_pid
+
+    if _query_executor is None or _query_executor_pid != os.getpid():
+        with _query_executor_lock:
+            if _query_executor is None or _query_executor_pid != os.getpid():
+                _query_executor = ThreadPoolExecutor(
+                    max_workers=POOL_CONFIG["query_workers"],
+                    thread_name_prefix="db-query",
+                )
+                _query_executor_pid = os.getpid()
+    return _query_executor
+
+
+def _run_query_task(func, args):
+    """在线程池中借出一个连接执行单个查询函数"""
+    with db_connection() as conn:
+        return func(conn, *args)
+
+
+def run_queries(tasks, conn=None, max_concurrency=None):
+    """
+    执行一组互相独立的查询函数，返回各自的结果
+    传入conn时在该连接上依次执行；否则分发到线程池并发执行，每个任务从连接池借出独立的连接，
+    同一调用同时执行的任务数不超过max_concurrency，避免单个请求占满连接池
+    :param tasks: {键: (查询函数, 参数...)}，查询函数的第一个参数为数据库连接
+    :param conn: 数据库连接，为None时并发执行
+    :param max_concurrency: 同时执行的任务数上限，默认为 POOL_CONFIG["request_concurrency"]
+    :return: {键: 查询函数的返回值}
+    """
+    if max_concurrency is None:
+        max_concurrency = POOL_CONFIG["request_concurrency"]
+
+    if conn is not None:
+        return {key: func(conn, *args) for key, (func, *args) in tasks.items()}
+    if max_concurrency <= 1 or len(tasks) <= 1:
+        with db_connection() as conn:
+            return {key: func(conn, *args) for key, (func, *args) in tasks.items()}
+
+    executor = _get_query_executor()
+    pending_tasks = list(tasks.items())
+    running = {}
+    results = {}
+    try:
+        while pending_tasks or running:
+            while pending_tasks and len(running) < max_concurrency:
+                key, (func, *args) = pending_tasks.pop(0)
+                # 每个任务复制一份当前上下文，SQL追踪等上下文变量在工作线程中同样生效
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, _run_query_task, func, args)
+                running[future] = key
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    finally:
+        # 出错时取消尚未开始的任务，并等待已开始的任务归还连接
+        for future in running:
+            future.cancel()
+        wait(running)
+    return results
+
+
+def get_pool_metrics():
+    """
+    返回连接池指标，用于评估连接池大小
+    :return: 包含借出次数、等待次数、等待时间等的字典
+    """
+    with _pool_metrics_lock:
+        metrics = dict(_pool_metrics)
+
+    metrics["minconn"] = _db_pool_options.get("minconn", POOL_CONFIG["minconn"])
+    metrics["maxconn"] = _db_pool_options.get("maxconn", POOL_CONFIG["maxconn"])
+    metrics["avg_wait_time"] = (
+        metrics["wait_time"] / metrics["waits"] if metrics["waits"] else 0.0
+    )
+    return metrics
 
 
 def get_gender_count(
@@ -65,6 +344,585 @@ def get_gender_count(
     return {"male": male_int, "female": female_int, "unknown": unknown_int}
 
 
+def get_gender_counts(totals, male_percents, female_percents, unknown_percents):
+    """
+    批量按比例计算整数性别分布（与get_gender_count逐个计算的结果一致）
+    :param totals: 总人数数组
+    :param male_percents: 男性百分比数组（数值，如12.3）
+    :param female_percents: 女性百分比数组
+    :param unknown_percents: 未知性别百分比数组
+    :return: {"male": 男性人数数组, "female": 女性人数数组, "unknown": 未知人数数组}
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    percents = np.column_stack(
+        [
+            np.asarray(male_percents, dtype=np.float64),
+            np.asarray(female_percents, dtype=np.float64),
+            np.asarray(unknown_percents, dtype=np.float64),
+        ]
+    )
+
+    # 计算浮点数人数，向下取整得到整数部分（与int()一致，向零取整）
+    floats = totals[:, None].astype(np.float64) * (percents / 100.0)
+    counts = np.trunc(floats)
+    fractions = floats - counts
+    counts = counts.astype(np.int64)
+
+    # 分配剩余人数：每次把1人分给小数部分最大的一项（并列时取靠前的一项），
+    # 然后将其小数部分置为0。最多3次后不再有正的小数部分，
+    # 之后每次都会选中同一项，剩余人数一次性分给它
+    remainder = totals - counts.sum(axis=1)
+    rows = np.arange(len(totals))
+    for _ in range(3):
+        active = remainder > 0
+        target = np.argmax(fractions, axis=1)
+        counts[rows[active], target[active]] += 1
+        fractions[rows[active], target[active]] = 0
+        remainder[active] -= 1
+
+    active = remainder > 0
+    target = np.argmax(fractions, axis=1)
+    counts[rows[active], target[active]] += remainder[active]
+
+    return {"male": counts[:, 0], "female": counts[:, 1], "unknown": counts[:, 2]}
+
+
+def _round_percents(counts, people):
+    """
+    按build_camera_stats的方式计算保留1位小数的百分比
+    （等价于 float("{:.1f}".format(count / people * 100))，人数为0时为0.0）
+    :param counts: 人数数组
+    :param people: 总人数数组
+    :return: 百分比数组
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    people = np.asarray(people, dtype=np.float64)
+    has_people = people > 0
+    percents = np.zeros_like(counts)
+    np.divide(counts, people, out=percents, where=has_people)
+    percents *= 100
+
+    scaled = percents * 10
+    rounded = np.rint(scaled) / 10
+
+    # 接近 x.x5 的值，乘10后的舍入误差可能改变舍入方向，改用字符串格式化逐个计算
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.abs(
+        np.spacing(scaled)
+    )
+    for i in np.flatnonzero(ambiguous & has_people):
+        rounded[i] = float("{:.1f}".format(percents[i]))
+
+    return np.where(has_people, rounded, 0.0)
+
+
+def get_gender_counts_from_rows(totals, rows):
+    """
+    由汇总行批量计算整数性别分布，不经过百分比字符串
+    （与 build_camera_stats + get_gender_count 的结果一致）
+    :param totals: 需要按比例拆分的人数数组（如各摄像头的进入人数）
+    :param rows: 汇总行列表，(total_people, total_in, total_out, male, female, minor, unknown_gender)
+    :return: {"male": 男性人数数组, "female": 女性人数数组, "unknown": 未知人数数组}
+    """
+    rows = np.asarray(rows, dtype=np.int64).reshape(-1, 7)
+    people = rows[:, 0]
+    return get_gender_counts(
+        totals,
+        _round_percents(rows[:, 3], people),
+        _round_percents(rows[:, 4], people),
+        _round_percents(rows[:, 6], people),
+    )
+
+
+def build_camera_stats(row, peak_period, low_period):
+    """
+    根据汇总行组装摄像头统计数据
+    :param row: (total_people, total_in, total_out, male, female, minor, unknown_gender)
+    :param peak_period: 高峰时段字符串
+    :param low_period: 低峰时段字符串
+    :return: 包含统计数据的字典
+    """
+    total = row[0]
+
+    male_percent = "{:.1f}".format((row[3] / total) * 100, 1) if total > 0 else "0.0"
+    female_percent = "{:.1f}".format((row[4] / total) * 100, 1) if total > 0 else "0.0"
+    minor_percent = "{:.1f}".format((row[5] / total) * 100, 1) if total > 0 else "0.0"
+    unknown_percent = "{:.1f}".format((row[6] / total) * 100, 1) if total > 0 else "0.0"
+
+    return {
+        "total_in": row[1],
+        "total_out": row[2],
+        "male_percent": male_percent,
+        "female_percent": female_percent,
+        "minor_percent": minor_percent,
+        "unknown_percent": unknown_percent,
+        "peak_period": peak_period,
+        "low_period": low_period,
+    }
+
+
+# 原始表时间范围条件，参数由 to_time_range 生成
+TIME_RANGE_SQL = "start_time >= %s AND start_time < %s AND end_time <= %s"
+
+# 汇总表中与原始表同名的统计列
+ROLLUP_SUM_COLUMNS = [
+    "total_people",
+    "in_count",
+    "out_count",
+    "male_count",
+    "female_count",
+    "unknown_gender_count",
+    "adult_count",
+    "minor_count",
+    "unknown_age_count",
+]
+
+# video_analysis上刷新小时/日汇总表的语句级触发器（由generate_db.ROLLUP_TRIGGERS_SQL创建）
+ROLLUP_TRIGGER_NAMES = [
+    "video_analysis_rollup_insert",
+    "video_analysis_rollup_update",
+    "video_analysis_rollup_delete",
+]
+
+
+def rollup_triggers_installed(conn):
+    """
+    汇总表刷新触发器是否都已创建（未创建时写入video_analysis的数据不会进入小时/日汇总表）
+    :param conn: 数据库连接
+    :return: bool
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM pg_trigger
+            WHERE tgrelid = to_regclass('video_analysis') AND tgname = ANY(%s)
+            """,
+            (ROLLUP_TRIGGER_NAMES,),
+        )
+        return cur.fetchone()[0] == len(ROLLUP_TRIGGER_NAMES)
+    finally:
+        cur.close()
+
+
+# 汇总表中的摄像头列表：按主键逐个跳到下一个摄像头，每个摄像头只读取一个索引项
+# （空字符串代表camera_name为空的原始行，由raw_range_source单独读取）
+CAMERA_NAMES_SQL = """
+    WITH RECURSIVE cameras AS (
+        (
+            SELECT camera_name FROM video_analysis_hourly
+            WHERE camera_name > '' ORDER BY camera_name LIMIT 1
+        )
+        UNION ALL
+        SELECT (
+            SELECT h.camera_name FROM video_analysis_hourly AS h
+            WHERE h.camera_name > cameras.camera_name ORDER BY h.camera_name LIMIT 1
+        )
+        FROM cameras WHERE cameras.camera_name IS NOT NULL
+    )
+    SELECT camera_name FROM cameras WHERE camera_name IS NOT NULL
+"""
+
+
+def parse_timestamp(value):
+    """将请求中的日期时间字符串解析为datetime，无法解析时返回None"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def to_time_range(date_start, date_end):
+    """
+    将请求的 [date_start, date_end] 转换为查询参数：
+    start_time 使用半开区间 [开始时间, 结束时间+1秒) 以命中 (camera_name, start_time) 覆盖索引，
+    end_time <= 结束时间 作为索引内的附加过滤条件保持原有语义
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :return: (开始时间, 结束时间(不含), 结束时间)，对应 TIME_RANGE_SQL 的三个参数
+    """
+    start = parse_timestamp(date_start)
+    end = parse_timestamp(date_end)
+
+    # 无法解析的值原样传给数据库（None 与原查询一样不匹配任何行）
+    if start is None:
+        start = date_start
+    if end is None:
+        return start, date_end, date_end
+    return start, end + timedelta(seconds=1), end
+
+
+def raw_range_source(columns, time_range):
+    """
+    构造读取原始表时间范围数据的子查询：逐个摄像头按 (camera_name, start_time) 覆盖索引读取，
+    camera_name为空的行单独读取（不带摄像头条件时规划器只能全索引扫描或退回主键/顺序扫描，
+    带等值条件后每个摄像头都是覆盖索引上的Index Only Scan；OFFSET 0阻止子查询被提升为普通连接，
+    保证按摄像头逐个参数化扫描而不是对整个时间范围做一次扫描再哈希连接）
+    :param columns: 读取的列（不含camera_name）
+    :param time_range: TIME_RANGE_SQL 的三个参数
+    :return: (子查询SQL, 参数列表)，子查询包含camera_name及columns列
+    """
+    column_sql = ", ".join(columns)
+    sql = f"""
+        SELECT cameras.camera_name, raw.*
+        FROM ({CAMERA_NAMES_SQL}) AS cameras
+        CROSS JOIN LATERAL (
+            SELECT {column_sql} FROM video_analysis
+            WHERE camera_name = cameras.camera_name AND {TIME_RANGE_SQL}
+            OFFSET 0
+        ) AS raw
+        UNION ALL
+        SELECT camera_name, {column_sql} FROM video_analysis
+        WHERE camera_name IS NULL AND {TIME_RANGE_SQL}
+    """
+    return sql, list(time_range) * 2
+
+
+def rollup_source(date_start, date_end):
+    """
+    构造覆盖 start_time >= date_start AND end_time <= date_end 的数据来源子查询，
+    完整覆盖的日使用日汇总表，完整覆盖的小时使用小时汇总表，首尾不足一小时的部分读取原始表
+    （视频按整点切分，每个时段不会跨越小时边界）
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :return: (子查询SQL, 参数列表)，子查询包含camera_name及ROLLUP_SUM_COLUMNS列
+    """
+    columns = ", ".join(["camera_name"] + ROLLUP_SUM_COLUMNS)
+    start = parse_timestamp(date_start)
+    end = parse_timestamp(date_end)
+
+    # 无法解析的范围直接查询原始表，保持原有语义
+    if start is None or end is None:
+        source, params = raw_range_source(
+            ROLLUP_SUM_COLUMNS, to_time_range(date_start, date_end)
+        )
+        return f"({source}) AS src", params
+
+    # 完整覆盖的小时区间 [hour_lo, hour_hi)
+    hour_lo = start.replace(minute=0, second=0, microsecond=0)
+    if hour_lo < start:
+        hour_lo += timedelta(hours=1)
+    hour_hi = (end + timedelta(seconds=1)).replace(minute=0, second=0, microsecond=0)
+
+    if hour_lo >= hour_hi:
+        source, params = raw_range_source(ROLLUP_SUM_COLUMNS, to_time_range(start, end))
+        return f"({source}) AS src", params
+
+    # 完整覆盖的日区间 [day_lo, day_hi)
+    day_lo = hour_lo.replace(hour=0)
+    if day_lo < hour_lo:
+        day_lo += timedelta(days=1)
+    day_hi = hour_hi.replace(hour=0)
+
+    segments = []
+    params = []
+
+    # 开头不足一小时的部分
+    if start < hour_lo:
+        source, source_params = raw_range_source(
+            ROLLUP_SUM_COLUMNS, (start, hour_lo, end)
+        )
+        segments.append(source)
+        params += source_params
+
+    if day_lo < day_hi:
+        segments.append(f"""SELECT {columns} FROM video_analysis_hourly
+                WHERE bucket >= %s AND bucket < %s""")
+        params += [hour_lo, day_lo]
+        segments.append(f"""SELECT {columns} FROM video_analysis_daily
+                WHERE bucket >= %s AND bucket < %s""")
+        params += [day_lo, day_hi]
+        segments.append(f"""SELECT {columns} FROM video_analysis_hourly
+                WHERE bucket >= %s AND bucket < %s""")
+        params += [day_hi, hour_hi]
+    else:
+        segments.append(f"""SELECT {columns} FROM video_analysis_hourly
+                WHERE bucket >= %s AND bucket < %s""")
+        params += [hour_lo, hour_hi]
+
+    # 结尾不足一小时的部分
+    if hour_hi <= end:
+        source, source_params = raw_range_source(
+            ROLLUP_SUM_COLUMNS, to_time_range(hour_hi, end)
+        )
+        segments.append(source)
+        params += source_params
+
+    return "(" + " UNION ALL ".join(segments) + ") AS src", params
+
+
+def refresh_rollups(conn, run_id=None):
+    """
+    刷新小时/日汇总表（不提交事务，由调用方提交）；
+    video_analysis上的语句级触发器已在每次写入后刷新涉及的时间桶，
+    本函数用于全量重建和触发器被禁用期间写入的数据
+    :param conn: 数据库连接
+    :param run_id: 运行批次ID，只重新计算该批次涉及的(摄像头, 小时/日)；为None时全量重建
+    """
+    sums = ", ".join(f"SUM({col})" for col in ROLLUP_SUM_COLUMNS)
+    columns = ", ".join(ROLLUP_SUM_COLUMNS)
+
+    cur = conn.cursor()
+
+    try:
+        if run_id is None:
+            # 与触发器的刷新串行执行，保证变化序号按提交顺序分配
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('video_analysis_rollups'))"
+            )
+            cur.execute("TRUNCATE video_analysis_hourly, video_analysis_daily")
+            cur.execute(f"""
+                INSERT INTO video_analysis_hourly (
+                    camera_name, bucket, min_start_time, max_end_time, slot_count,
+                    {columns}
+                )
+                SELECT
+                    COALESCE(camera_name, ''), date_trunc('hour', start_time),
+                    MIN(start_time), MAX(end_time), COUNT(*), {sums}
+                FROM video_analysis
+                WHERE start_time IS NOT NULL
+                GROUP BY 1, 2
+                """)
+            cur.execute(f"""
+                INSERT INTO video_analysis_daily (
+                    camera_name, bucket, min_start_time, max_end_time, slot_count,
+                    {columns}
+                )
+                SELECT
+                    camera_name, date_trunc('day', bucket),
+                    MIN(min_start_time), MAX(max_end_time), SUM(slot_count), {sums}
+                FROM video_analysis_hourly
+                GROUP BY 1, 2
+                """)
+            # 全部时间桶（包括重建后不再存在的）都记为已变化
+            cur.execute("""
+                UPDATE video_analysis_hourly_changes
+                SET change_seq = nextval('video_analysis_hourly_change_seq')
+                """)
+            cur.execute("""
+                INSERT INTO video_analysis_hourly_changes (camera_name, bucket, change_seq)
+                SELECT camera_name, bucket, nextval('video_analysis_hourly_change_seq')
+                FROM video_analysis_hourly
+                ON CONFLICT (camera_name, bucket) DO NOTHING
+                """)
+            return
+
+        # 与触发器使用同一个数据库函数重新计算该批次涉及的小时桶及其所在的日桶
+        cur.execute(
+            """
+            SELECT refresh_video_analysis_rollups(array_agg(camera_name), array_agg(bucket))
+            FROM (
+                SELECT DISTINCT
+                    COALESCE(camera_name, '') AS camera_name,
+                    date_trunc('hour', start_time) AS bucket
+                FROM video_analysis
+                WHERE run_id = %s AND start_time IS NOT NULL
+            ) AS touched
+            """,
+            (run_id,),
+        )
+    finally:
+        cur.close()
+
+
+def get_data_version(conn):
+    """
+    获取当前数据版本：最新导入批次的run_id、汇总表中最晚的数据结束时间、最近一次写入的分析时间
+    及小时汇总表的最新变化序号（重新导入已有时段的数据时run_id和结束时间可能不变，analysis_time会更新；
+    删除数据或不改analysis_time的更新只改变变化序号）
+    :param conn: 数据库连接
+    :return: (max_run_id, max_end_time, max_analysis_time, max_change_seq)
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT
+                (SELECT MAX(run_id) FROM video_analysis),
+                (SELECT MAX(max_end_time) FROM video_analysis_hourly
+                    WHERE bucket = (SELECT MAX(bucket) FROM video_analysis_hourly)),
+                (SELECT MAX(analysis_time) FROM video_analysis),
+                (SELECT COALESCE(MAX(change_seq), 0) FROM video_analysis_hourly_changes)
+            """)
+        return cur.fetchone()
+    finally:
+        cur.close()
+
+
+def get_range_camera_sums(conn, date_start, date_end):
+    """
+    分组查询时间范围内每个摄像头及整体的汇总行
+    （从覆盖该范围的最粗粒度汇总表读取，每个摄像头一行，外加GROUPING SETS的整体汇总行）
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :return: {摄像头名称: 汇总行, None: 整体汇总行}
+    """
+    # 启用每小时人数的内存存储时直接由内存计算（hourly_store依赖本模块，在此延迟导入）
+    from hourly_store import get_range_sums
+
+    stored = get_range_sums(date_start, date_end)
+    if stored is not None:
+        return stored
+
+    cur = conn.cursor()
+
+    try:
+        source, params = rollup_source(date_start, date_end)
+        cur.execute(
+            f"""
+            SELECT
+                camera_name,
+                GROUPING(camera_name) AS is_total,
+                COALESCE(SUM(total_people), 0) AS total_people,
+                COALESCE(SUM(in_count), 0) AS total_in,
+                COALESCE(SUM(out_count), 0) AS total_out,
+                COALESCE(SUM(male_count), 0) AS male,
+                COALESCE(SUM(female_count), 0) AS female,
+                COALESCE(SUM(minor_count), 0) AS minor,
+                COALESCE(SUM(unknown_gender_count), 0) AS unknown_gender
+            FROM {source}
+            GROUP BY GROUPING SETS ((camera_name), ())
+            """,
+            params,
+        )
+        sums = {}
+        for row in cur.fetchall():
+            if row[1] == 1:
+                sums[None] = row[2:9]
+            elif row[0] is not None:
+                sums[row[0]] = row[2:9]
+        return sums
+    finally:
+        cur.close()
+
+
+def get_range_camera_periods(conn, date_start, date_end):
+    """
+    分组查询时间范围内每个摄像头及整体的高峰/低峰时段
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :return: {摄像头名称: (高峰时段, 低峰时段), None: 整体的(高峰时段, 低峰时段)}
+    """
+    # 启用每小时人数的内存存储时直接由内存计算
+    from hourly_store import get_range_periods
+
+    stored = get_range_periods(date_start, date_end)
+    if stored is not None:
+        return stored
+
+    cur = conn.cursor()
+
+    try:
+        # 高峰/低峰时段：在原始时段数据上通过窗口函数排序后取第一名
+        source, params = raw_range_source(
+            ["start_time", "end_time", "in_count"],
+            to_time_range(date_start, date_end),
+        )
+        cur.execute(
+            f"""
+            WITH ranked AS (
+                SELECT
+                    camera_name, start_time, end_time, in_count,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY camera_name ORDER BY in_count DESC
+                    ) AS peak_rank,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY camera_name ORDER BY in_count ASC
+                    ) AS low_rank,
+                    ROW_NUMBER() OVER (ORDER BY in_count DESC) AS all_peak_rank,
+                    ROW_NUMBER() OVER (ORDER BY in_count ASC) AS all_low_rank
+                FROM ({source}) AS raw
+            )
+            SELECT
+                camera_name,
+                GROUPING(camera_name) AS is_total,
+                MAX(
+                    TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' ||
+                    TO_CHAR(end_time, 'HH24:MI:SS') || ', ' || in_count || ' pax'
+                ) FILTER (WHERE peak_rank = 1) AS peak_period,
+                MAX(
+                    TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' ||
+                    TO_CHAR(end_time, 'HH24:MI:SS') || ', ' || in_count || ' pax'
+                ) FILTER (WHERE low_rank = 1) AS low_period,
+                MAX(
+                    TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' ||
+                    TO_CHAR(end_time, 'HH24:MI:SS') || ', ' || in_count || ' pax'
+                ) FILTER (WHERE all_peak_rank = 1) AS all_peak_period,
+                MAX(
+                    TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' ||
+                    TO_CHAR(end_time, 'HH24:MI:SS') || ', ' || in_count || ' pax'
+                ) FILTER (WHERE all_low_rank = 1) AS all_low_period
+            FROM ranked
+            GROUP BY GROUPING SETS ((camera_name), ())
+            """,
+            params,
+        )
+        periods = {}
+        for row in cur.fetchall():
+            if row[1] == 1:
+                periods[None] = (row[4] or "N/A", row[5] or "N/A")
+            elif row[0] is not None:
+                periods[row[0]] = (row[2] or "N/A", row[3] or "N/A")
+        return periods
+    finally:
+        cur.close()
+
+
+def merge_range_camera_rows(sums, periods, cameras=()):
+    """
+    合并汇总行和高峰/低峰时段
+    :param sums: get_range_camera_sums 的返回值
+    :param periods: get_range_camera_periods 的返回值
+    :param cameras: 需要保证存在于结果中的摄像头列表（无数据时返回零值）
+    :return: {摄像头名称: (汇总行, 高峰时段, 低峰时段), None: 整体数据}
+    """
+    # 整体汇总行无数据时也会返回一行零值；没有数据的摄像头返回零值统计
+    results = {}
+    for cam_name in list(sums) + [c for c in cameras if c not in sums]:
+        peak_period, low_period = periods.get(cam_name, ("N/A", "N/A"))
+        results[cam_name] = (sums.get(cam_name, (0,) * 7), peak_period, low_period)
+    return results
+
+
+def get_range_camera_rows(conn, date_start, date_end, cameras=()):
+    """
+    分组查询获取时间范围内每个摄像头及整体的汇总行和高峰/低峰时段
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :param cameras: 需要保证存在于结果中的摄像头列表（无数据时返回零值）
+    :return: {摄像头名称: (汇总行, 高峰时段, 低峰时段), None: 整体数据}，
+        汇总行为 (total_people, total_in, total_out, male, female, minor, unknown_gender)
+    """
+    return merge_range_camera_rows(
+        get_range_camera_sums(conn, date_start, date_end),
+        get_range_camera_periods(conn, date_start, date_end),
+        cameras,
+    )
+
+
+def get_range_camera_stats(conn, date_start, date_end, cameras=()):
+    """
+    分组查询获取时间范围内每个摄像头及整体的统计数据
+    （汇总值、Peak Period、Low Period），替代逐个摄像头调用get_camera_stats
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :param cameras: 需要保证存在于结果中的摄像头列表（无数据时返回零值）
+    :return: {摄像头名称: 统计数据字典, None: 整体统计数据字典}
+    """
+    return {
+        cam_name: build_camera_stats(*data)
+        for cam_name, data in get_range_camera_rows(
+            conn, date_start, date_end, cameras
+        ).items()
+    }
+
+
 def get_camera_stats(conn, cam_name, date_start, date_end):
     """
     获取摄像头基本统计数据
@@ -74,13 +932,23 @@ def get_camera_stats(conn, cam_name, date_start, date_end):
     :param date_end: 结束日期
     :return: 包含统计数据的字典
     """
+    # 启用每小时人数的内存存储时直接由内存计算
+    from hourly_store import get_camera_summary
+
+    stored = get_camera_summary(cam_name, date_start, date_end)
+    if stored is not None:
+        return build_camera_stats(*stored)
+
     cur = conn.cursor()
 
     try:
+        # 汇总值从覆盖该范围的最粗粒度汇总表读取
+        source, params = rollup_source(date_start, date_end)
+
         if cam_name is None:
             # 获取整体基本统计数据
             cur.execute(
-                """
+                f"""
                 SELECT 
                     COALESCE(SUM(total_people), 0) AS total_people,
                     COALESCE(SUM(in_count), 0) AS total_in,
@@ -89,21 +957,16 @@ def get_camera_stats(conn, cam_name, date_start, date_end):
                     COALESCE(SUM(female_count), 0) AS female,
                     COALESCE(SUM(minor_count), 0) AS minor,
                     COALESCE(SUM(unknown_gender_count), 0) AS unknown_gender
-                FROM video_analysis
-                WHERE start_time >= %s AND end_time <= %s
+                FROM {source}
             """,
-                (date_start, date_end),
+                params,
             )
             row = cur.fetchone()
 
-            total = row[0]
-            total_in = row[1]
-            total_out = row[2]
-
         else:
             # 获取摄像头基本统计数据
             cur.execute(
-                """
+                f"""
                 SELECT 
                     COALESCE(SUM(total_people), 0) AS total_people,
                     COALESCE(SUM(in_count), 0) AS total_in,
@@ -112,30 +975,13 @@ def get_camera_stats(conn, cam_name, date_start, date_end):
                     COALESCE(SUM(female_count), 0) AS female,
                     COALESCE(SUM(minor_count), 0) AS minor,
                     COALESCE(SUM(unknown_gender_count), 0) AS unknown_gender
-                FROM video_analysis
-                WHERE camera_name = %s AND start_time >= %s AND end_time <= %s
+                FROM {source}
+                WHERE camera_name = %s
             """,
-                (cam_name, date_start, date_end),
+                params + [cam_name],
             )
             row = cur.fetchone()
 
-            total = row[0]
-            total_in = row[1]
-            total_out = row[2]
-
-        male_percent = (
-            "{:.1f}".format((row[3] / total) * 100, 1) if total > 0 else "0.0"
-        )
-        female_percent = (
-            "{:.1f}".format((row[4] / total) * 100, 1) if total > 0 else "0.0"
-        )
-        minor_percent = (
-            "{:.1f}".format((row[5] / total) * 100, 1) if total > 0 else "0.0"
-        )
-        unknown_percent = (
-            "{:.1f}".format((row[6] / total) * 100, 1) if total > 0 else "0.0"
-        )
-
         # 获取Peak Period（最高in_count人流时段）
         cur.execute(
             """
@@ -146,11 +992,12 @@ def get_camera_stats(conn, cam_name, date_start, date_end):
             FROM video_analysis
             WHERE camera_name = %s 
                 AND start_time >= %s 
+                AND start_time < %s 
                 AND end_time <= %s
             ORDER BY in_count DESC
             LIMIT 1
             """,
-            (cam_name, date_start, date_end),
+            (cam_name, *to_time_range(date_start, date_end)),
         )
         peak_row = cur.fetchone()
         peak_period = peak_row[0] + ", " + peak_row[1] if peak_row else "N/A"
@@ -165,25 +1012,17 @@ def get_camera_stats(conn, cam_name, date_start, date_end):
             FROM video_analysis
             WHERE camera_name = %s 
                 AND start_time >= %s 
+                AND start_time < %s 
                 AND end_time <= %s
             ORDER BY in_count ASC
             LIMIT 1
             """,
-            (cam_name, date_start, date_end),
+            (cam_name, *to_time_range(date_start, date_end)),
         )
         low_row = cur.fetchone()
         low_period = low_row[0] + ", " + low_row[1] if low_row else "N/A"
 
-        return {
-            "total_in": total_in,
-            "total_out": total_out,
-            "male_percent": male_percent,
-            "female_percent": female_percent,
-            "minor_percent": minor_percent,
-            "unknown_percent": unknown_percent,
-            "peak_period": peak_period,
-            "low_period": low_period,
-        }
+        return build_camera_stats(row, peak_period, low_period)
     finally:
         cur.close()
 
@@ -208,6 +1047,13 @@ def get_peak_and_low_periods(conn, date_start, date_end):
     :param date_end: 结束日期
     :return: (高峰时段, 低峰时段)
     """
+    # 启用每小时人数的内存存储时直接由内存计算
+    from hourly_store import get_overall_periods
+
+    stored = get_overall_periods(date_start, date_end)
+    if stored is not None:
+        return stored
+
     cur = conn.cursor()
 
     try:
@@ -219,11 +1065,11 @@ def get_peak_and_low_periods(conn, date_start, date_end):
                 TO_CHAR(end_time, 'HH24:MI:SS') AS period,
                 in_count || ' pax' AS count_str
             FROM video_analysis
-            WHERE start_time >= %s AND end_time <= %s
+            WHERE start_time >= %s AND start_time < %s AND end_time <= %s
             ORDER BY in_count DESC
             LIMIT 1
             """,
-            (date_start, date_end),
+            to_time_range(date_start, date_end),
         )
         peak_row = cur.fetchone()
         peak_period = peak_row[0] + ", " + peak_row[1] if peak_row else "N/A"
@@ -236,11 +1082,11 @@ def get_peak_and_low_periods(conn, date_start, date_end):
                 TO_CHAR(end_time, 'HH24:MI:SS') AS period,
                 in_count || ' pax' AS count_str
             FROM video_analysis
-            WHERE start_time >= %s AND end_time <= %s
+            WHERE start_time >= %s AND start_time < %s AND end_time <= %s
             ORDER BY in_count ASC
             LIMIT 1
             """,
-            (date_start, date_end),
+            to_time_range(date_start, date_end),
         )
         low_row = cur.fetchone()
         low_period = low_row[0] + ", " + low_row[1] if low_row else "N/A"
@@ -258,17 +1104,24 @@ def get_total_visitors(conn, date_start, date_end):
     :param date_end: 结束日期
     :return: (进入人数, 离开人数)
     """
+    # 启用每小时人数的内存存储时直接由内存计算
+    from hourly_store import get_range_totals
+
+    stored = get_range_totals(date_start, date_end)
+    if stored is not None:
+        return stored[1], stored[2]
+
     cur = conn.cursor()
 
     try:
+        source, params = rollup_source(date_start, date_end)
         cur.execute(
-            """
+            f"""
             SELECT COALESCE(SUM(in_count), 0) ,
             COALESCE(SUM(out_count), 0) 
-            FROM video_analysis
-            WHERE start_time >= %s AND end_time <= %s
+            FROM {source}
         """,
-            (date_start, date_end),
+            params,
         )
         return cur.fetchone()
     finally:
@@ -283,16 +1136,23 @@ def get_reference_visitors(conn, date_start, date_end):
     :param date_end: 结束日期
     :return: 进入人数
     """
+    # 启用每小时人数的内存存储时直接由内存计算
+    from hourly_store import get_range_totals
+
+    stored = get_range_totals(date_start, date_end)
+    if stored is not None:
+        return stored[1]
+
     cur = conn.cursor()
 
     try:
+        source, params = rollup_source(date_start, date_end)
         cur.execute(
-            """
+            f"""
             SELECT COALESCE(SUM(in_count), 0)
-            FROM video_analysis
-            WHERE start_time >= %s AND end_time <= %s
+            FROM {source}
         """,
-            (date_start, date_end),
+            params,
         )
         return cur.fetchone()[0]
     finally:
@@ -301,68 +1161,17 @@ def get_reference_visitors(conn, date_start, date_end):
 
 def get_cold_storage_peak_and_low_periods(conn, date_start, date_end):
     """
-    获取冷库区域的最高和最低密度时段（基于A7进+A6出）
+    获取冷库区域的最高和最低密度时段（基于同一时段的A7进+A6出）
     :param conn: 数据库连接
     :param date_start: 开始日期
     :param date_end: 结束日期
     :return: (高峰时段, 低峰时段)
     """
-    cur = conn.cursor()
-
-    try:
-        # 计算最高密度时段（基于进入人数，即A7.in_count + A6.out_count）
-        cur.execute(
-            """
-            SELECT 
-                TO_CHAR(A7.start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' || 
-                TO_CHAR(A7.end_time, 'HH24:MI:SS') AS period,
-                (A7.in_count + A6.out_count) AS count
-            FROM video_analysis A7
-            JOIN video_analysis A6 
-                ON A7.start_time = A6.start_time AND A7.end_time = A6.end_time
-            WHERE A7.camera_name = 'A7'
-                AND A6.camera_name = 'A6'
-                AND A7.start_time >= %s 
-                AND A7.end_time <= %s
-            ORDER BY count DESC
-            LIMIT 1
-            """,
-            (date_start, date_end),
-        )
-        peak_row = cur.fetchone()
-        if peak_row and peak_row[1] is not None:
-            peak_period = f"{peak_row[0]}, {int(peak_row[1])} pax"
-        else:
-            peak_period = "N/A"
+    # zones依赖本模块，在此延迟导入
+    from zones import get_zone_periods, resolve_zones
 
-        # 计算最低密度时段（基于进入人数，即A7.in_count + A6.out_count）
-        cur.execute(
-            """
-            SELECT 
-                TO_CHAR(A7.start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' || 
-                TO_CHAR(A7.end_time, 'HH24:MI:SS') AS period,
-                (A7.in_count + A6.out_count) AS count
-            FROM video_analysis A7
-            JOIN video_analysis A6 
-                ON A7.start_time = A6.start_time AND A7.end_time = A6.end_time
-            WHERE A7.camera_name = 'A7'
-                AND A6.camera_name = 'A6'
-                AND A7.start_time >= %s 
-                AND A7.end_time <= %s
-            ORDER BY count ASC
-            LIMIT 1
-            """,
-            (date_start, date_end),
-        )
-        low_row = cur.fetchone()
-        if low_row and low_row[1] is not None:
-            low_period = f"{low_row[0]}, {int(low_row[1])} pax"
-        else:
-            low_period = "N/A"
-
-        return peak_period, low_period
-    finally:
-        cur.close()
+    zones = resolve_zones(["cold_storage"])
+    return get_zone_periods(conn, date_start, date_end, zones)["cold_storage"]
 
 
 def get_area_peak_and_low_periods(conn, cameras, date_start, date_end):
@@ -374,53 +1183,7 @@ def get_area_peak_and_low_periods(conn, cameras, date_start, date_end):
     :param date_end: 结束日期
     :return: (高峰时段, 低峰时段)
     """
-    cur = conn.cursor()
+    from zones import get_zone_periods
 
-    try:
-        # 计算最高密度时段（基于区域内所有摄像头的进入人数之和）
-        placeholders = ",".join(["%s"] * len(cameras))
-        query = f"""
-            SELECT 
-                TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' || 
-                TO_CHAR(end_time, 'HH24:MI:SS') AS period,
-                SUM(in_count) AS count
-            FROM video_analysis
-            WHERE camera_name IN ({placeholders}) 
-                AND start_time >= %s 
-                AND end_time <= %s
-            GROUP BY start_time, end_time
-            ORDER BY count DESC
-            LIMIT 1
-        """
-        params = cameras + [date_start, date_end]
-        cur.execute(query, params)
-        peak_row = cur.fetchone()
-        if peak_row and peak_row[1] is not None:
-            peak_period = f"{peak_row[0]}, {int(peak_row[1])} pax"
-        else:
-            peak_period = "N/A"
-
-        # 计算最低密度时段（基于区域内所有摄像头的进入人数之和）
-        query = f"""
-            SELECT 
-                TO_CHAR(start_time, 'YYYY/MM/DD HH24:MI:SS') || '~' || 
-                TO_CHAR(end_time, 'HH24:MI:SS') AS period,
-                SUM(in_count) AS count
-            FROM video_analysis
-            WHERE camera_name IN ({placeholders}) 
-                AND start_time >= %s 
-                AND end_time <= %s
-            GROUP BY start_time, end_time
-            ORDER BY count ASC
-            LIMIT 1
-        """
-        cur.execute(query, params)
-        low_row = cur.fetchone()
-        if low_row and low_row[1] is not None:
-            low_period = f"{low_row[0]}, {int(low_row[1])} pax"
-        else:
-            low_period = "N/A"
-
-        return peak_period, low_period
-    finally:
-        cur.close()
+    zones = {"area": {"name": "area", "members": [(cam, 1) for cam in cameras]}}
+    return get_zone_periods(conn, date_start, date_end, zones)["area"]
@@ -4,4 +4,108 @@ DATABASE_CONFIG = {
     "user": "postgres",
     "password": "postgres",
     "dbname": "postgres"
-}
\ No newline at end of file
+}
+
+# 数据库连接池配置
+POOL_CONFIG = {
+    "minconn": 1,  # 最小连接数
+    "maxconn": 10,  # 最大连接数
+    "health_check": True,  # 借出连接时执行 SELECT 1 检查连接是否可用
+    "checkout_timeout": 30,  # 等待空闲连接的超时时间（秒）
+    "query_workers": 8,  # 并发查询线程池的线程数（每个进程）
+    "request_concurrency": 4,  # 单个请求同时占用的连接数上限，应小于maxconn
+}
+
+# 仪表板查询结果缓存配置
+CACHE_CONFIG = {
+    "max_entries": 256,  # 最多缓存的查询结果数（超过后淘汰最久未使用的）
+    "live_ttl": 60,  # 包含最新数据的时间范围的缓存时间（秒）
+    "version_check_interval": 30,  # 检查数据版本（是否有新导入数据）的间隔（秒）
+}
+
+# SQL追踪配置
+TRACING_CONFIG = {
+    "enabled": True,  # 是否按请求汇总SQL并输出Server-Timing响应头
+    "n_plus_one_threshold": 3,  # 同一函数在一个请求中执行相同结构的查询达到该次数时视为疑似N+1
+    "timing_callers": 5,  # Server-Timing中按耗时列出的调用函数个数
+    # 不参与N+1检测的调用函数（如连接池借出连接时的健康检查，每借出一个连接执行一次）
+    "n_plus_one_ignore": ["common._checkout_connection"],
+}
+
+# 原始数据导出配置
+EXPORT_CONFIG = {
+    "itersize": 2000,  # 服务器端游标每次从数据库读取的行数
+}
+
+# video_analysis月分区配置（partitions.py）
+PARTITION_CONFIG = {
+    "months_ahead": 3,  # 预先创建的未来月分区数
+    "retention_months": None,  # 原始数据保留的月数（含当月），None表示不删除
+}
+
+# 分析结果导入接口配置（POST /api/ingest）
+INGEST_CONFIG = {
+    "max_rows": 20000,  # 每次请求最多导入的行数（同一事务）
+}
+
+# 仪表板实时更新配置（Server-Sent Events，live.py）
+LIVE_CONFIG = {
+    "max_subscribers": 200,  # 每个进程最多同时连接的浏览器数
+    "keepalive": 15,  # 无消息时发送保持连接注释行的间隔（秒）
+    "retry_ms": 5000,  # 浏览器断线后重连的等待时间（毫秒）
+    "reconnect_delay": 5,  # 监听连接断开后重连的等待时间（秒）
+    "recompute_workers": 2,  # 数据变化后重新计算订阅结果的线程数
+}
+
+# HTTP响应缓存与压缩配置（http_cache.py）
+HTTP_CACHE_CONFIG = {
+    "min_size": 1024,  # 小于该大小（字节）的响应不压缩
+    "gzip_level": 6,  # 动态响应的gzip压缩级别
+    "brotli_quality": 5,  # 动态响应的brotli压缩级别（需安装brotli）
+}
+
+# 前端静态文件构建配置（build_assets.py）；构建目录存在时应用改为使用构建目录中的文件
+ASSETS_CONFIG = {
+    "dist_dir": "frontend_dist",  # 构建目录（相对于项目根目录）
+    "hash_length": 10,  # 文件名中内容哈希的长度
+    "immutable_max_age": 31536000,  # 带内容哈希的文件的浏览器缓存时间（秒）
+}
+
+# 生产环境服务配置（serve.py）
+SERVER_CONFIG = {
+    "host": "0.0.0.0",  # 监听地址
+    "port": 5050,  # 监听端口
+    "workers": 4,  # 工作进程数（gunicorn）
+    "threads": 16,  # 每个工作进程的线程数，实时更新连接最多占用其中一半
+    "timeout": 120,  # 工作进程无响应超过该时间（秒）后被重启
+    "graceful_timeout": 30,  # 平滑重启/停止时等待进行中请求完成的时间（秒）
+    "keepalive": 5,  # HTTP长连接空闲保持时间（秒）
+    "pidfile": "dashboard.pid",  # 主进程PID文件（相对于项目根目录），平滑重新加载时使用
+    "reload_delay": 5,  # 平滑重新加载时新工作进程的启动等待时间（秒）
+}
+
+# 最后登录时间批量写入配置（last_login.py）
+LAST_LOGIN_CONFIG = {
+    "flush_interval": 5,  # 待写入的最后登录时间写入数据库的间隔（秒）
+}
+
+# 服务器端PDF报告存储配置（report_store.py）
+REPORT_STORE_CONFIG = {
+    "dir": "report_cache",  # 报告存储目录（相对于项目根目录）
+    "max_bytes": 200 * 1024 * 1024,  # 存储容量（字节），超过后删除最久未使用的报告
+    "max_days": 366,  # 单个报告最多包含的天数
+}
+
+# 每日PDF报告补生成配置（generate_pdf.py --catch-up）
+REPORT_SCHEDULE_CONFIG = {
+    "catch_up_days": 30,  # 未指定--start时检查的天数（截至前一天）
+    "watermark_overlap": 600,  # 检查变化日期时向前多读取的时间（秒），覆盖检查时尚未提交的写入
+}
+
+# 每小时人数的内存存储配置（hourly_store.py）：启用后按摄像头×小时将小时汇总表加载为NumPy数组，
+# 汇总值、高峰/低峰时段和足迹分布直接由内存计算；要求每个时段为一个整点小时，否则仍查询数据库
+HOURLY_STORE_CONFIG = {
+    "enabled": False,  # 是否启用（80个摄像头×3年约占用30MB内存）
+    "grow_hours": 24 * 30,  # 新数据超出容量时每次扩大的小时数
+    "reload_cells": 100000,  # 变化的 (摄像头, 小时) 超过该数量时全量重新加载
+}
@@ -1,7 +1,11 @@
+import argparse
+import io
 import psycopg2
 from datetime import datetime, timedelta
 import random
 import time
+from common import ROLLUP_SUM_COLUMNS, ROLLUP_TRIGGER_NAMES, refresh_rollups
+from partitions import ensure_partitions
 
 # 数据库配置
 DATABASE_CONFIG = {
@@ -12,23 +16,39 @@ DATABASE_CONFIG = {
     "dbname": "postgres",
 }
 
-
-def setup_database():
-    """创建表和索引"""
-    create_table_sql = """
+# 默认生成的数据范围
+DEFAULT_START_DATE = datetime(2024, 9, 1)
+DEFAULT_END_DATE = datetime(2025, 8, 31)
+
+# 批量导入时每累计约8MB数据执行一次COPY
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# 生成数据时写入的video_analysis列（analysis_id由序列生成）
+VIDEO_ANALYSIS_COLUMNS = [
+    "run_id",
+    "video_name",
+    "camera_name",
+    "start_time",
+    "end_time",
+    "total_people",
+    "in_count",
+    "out_count",
+    "male_count",
+    "female_count",
+    "unknown_gender_count",
+    "adult_count",
+    "minor_count",
+    "unknown_age_count",
+    "detection_method",
+    "line_position",
+    "analysis_time",
+]
+
+# video_analysis表：按start_time按月范围分区，主键需包含分区键；
+# 月分区由partitions.ensure_partitions创建，不在已有分区范围内的行写入默认分区
+VIDEO_ANALYSIS_TABLE_SQL = """
     -- DROP TABLE
-    DROP TABLE IF EXISTS public.run_records CASCADE;
     DROP TABLE IF EXISTS public.video_analysis CASCADE;
-    DROP TABLE IF EXISTS public.users CASCADE;
-
-    -- CREATE TABLE
-    CREATE TABLE public.run_records(
-        run_id serial NOT NULL,
-        folder_path character varying(255) NOT NULL,
-        run_date timestamp(0) without time zone DEFAULT CURRENT_TIMESTAMP(0) NOT NULL,
-        total_videos integer NOT NULL,
-        PRIMARY KEY (run_id)
-    );
 
     -- CREATE TABLE
     CREATE TABLE public.video_analysis (
@@ -50,28 +70,262 @@ def setup_database():
         detection_method character varying(50) DEFAULT 'horizontal_a' NOT NULL,
         line_position numeric(3, 2) DEFAULT 0.5 NOT NULL,
         analysis_time timestamp(0) without time zone DEFAULT CURRENT_TIMESTAMP(0) NOT NULL,
-        PRIMARY KEY (analysis_id)
+        PRIMARY KEY (analysis_id, start_time)
+    ) PARTITION BY RANGE (start_time);
+
+    -- CREATE TABLE
+    CREATE TABLE public.video_analysis_default PARTITION OF public.video_analysis DEFAULT;
+"""
+
+# video_analysis索引：
+# 1. (camera_name, start_time) 唯一覆盖索引，INCLUDE统计列，单摄像头时间范围查询可走Index Only Scan；
+#    同时作为导入接口upsert的冲突键（唯一索引包含分区键start_time，可在分区表上创建）
+# 2. start_time 上的BRIN索引，用于不限摄像头的时间范围扫描（数据按时间顺序写入，BRIN体积很小）
+# 3. run_id 索引，用于按批次增量刷新汇总表
+# 4. analysis_time 索引，用于数据版本检查（重新导入的数据只改变analysis_time，不改变run_id）
+VIDEO_ANALYSIS_INDEXES_SQL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_video_analysis_camera_start
+        ON video_analysis (camera_name, start_time)
+        INCLUDE (
+            end_time, total_people, in_count, out_count, male_count, female_count,
+            unknown_gender_count, adult_count, minor_count, unknown_age_count
+        );
+    CREATE INDEX IF NOT EXISTS idx_video_analysis_start_time_brin
+        ON video_analysis USING brin (start_time);
+    CREATE INDEX IF NOT EXISTS idx_video_analysis_run ON video_analysis (run_id);
+    CREATE INDEX IF NOT EXISTS idx_video_analysis_analysis_time
+        ON video_analysis (analysis_time);
+"""
+VIDEO_ANALYSIS_INDEX_NAMES = [
+    "idx_video_analysis_camera_start",
+    "idx_video_analysis_start_time_brin",
+    "idx_video_analysis_run",
+    "idx_video_analysis_analysis_time",
+]
+
+# 小时/日汇总表：按(camera_name, 时间桶)预先汇总进出及性别年龄人数，
+# 由ROLLUP_TRIGGERS_SQL中的触发器在每次写入video_analysis后刷新涉及的时间桶
+ROLLUP_TABLES_SQL = """
+    -- DROP TABLE
+    DROP TABLE IF EXISTS public.video_analysis_hourly CASCADE;
+    DROP TABLE IF EXISTS public.video_analysis_daily CASCADE;
+    DROP TABLE IF EXISTS public.video_analysis_hourly_changes CASCADE;
+    DROP SEQUENCE IF EXISTS public.video_analysis_hourly_change_seq;
+
+    -- CREATE TABLE
+    CREATE TABLE public.video_analysis_hourly (
+        camera_name character varying(20) NOT NULL,
+        bucket timestamp(0) without time zone NOT NULL,
+        min_start_time timestamp(0) without time zone NOT NULL,
+        max_end_time timestamp(0) without time zone,
+        slot_count integer NOT NULL,
+        total_people integer NOT NULL,
+        in_count integer NOT NULL,
+        out_count integer NOT NULL,
+        male_count integer NOT NULL,
+        female_count integer NOT NULL,
+        unknown_gender_count integer NOT NULL,
+        adult_count integer NOT NULL,
+        minor_count integer NOT NULL,
+        unknown_age_count integer NOT NULL,
+        PRIMARY KEY (camera_name, bucket)
+    );
+
+    -- CREATE TABLE
+    CREATE TABLE public.video_analysis_daily (
+        camera_name character varying(20) NOT NULL,
+        bucket timestamp(0) without time zone NOT NULL,
+        min_start_time timestamp(0) without time zone NOT NULL,
+        max_end_time timestamp(0) without time zone,
+        slot_count integer NOT NULL,
+        total_people integer NOT NULL,
+        in_count integer NOT NULL,
+        out_count integer NOT NULL,
+        male_count integer NOT NULL,
+        female_count integer NOT NULL,
+        unknown_gender_count integer NOT NULL,
+        adult_count integer NOT NULL,
+        minor_count integer NOT NULL,
+        unknown_age_count integer NOT NULL,
+        PRIMARY KEY (camera_name, bucket)
+    );
+
+    -- CREATE INDEX
+    CREATE INDEX idx_video_analysis_hourly_bucket ON video_analysis_hourly (bucket);
+    CREATE INDEX idx_video_analysis_daily_bucket ON video_analysis_daily (bucket);
+"""
+
+# 小时汇总表的变化记录：刷新函数每次重新计算 (摄像头, 小时) 时写入新的序号，
+# 时间桶被删除后记录仍保留，读取方按序号取得上次读取后变化（含删除）的时间桶；
+# 序号在汇总表刷新的咨询锁内分配，分配顺序与提交顺序一致，已提交的最大序号之前不会再出现新提交的序号
+ROLLUP_CHANGES_SQL = """
+    CREATE SEQUENCE IF NOT EXISTS public.video_analysis_hourly_change_seq;
+
+    CREATE TABLE IF NOT EXISTS public.video_analysis_hourly_changes (
+        camera_name character varying(20) NOT NULL,
+        bucket timestamp(0) without time zone NOT NULL,
+        change_seq bigint NOT NULL,
+        PRIMARY KEY (camera_name, bucket)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_video_analysis_hourly_changes_seq
+        ON video_analysis_hourly_changes (change_seq);
+"""
+
+# 小时汇总表的覆盖索引，热力图按摄像头和小时范围读取进出人数时走Index Only Scan
+ROLLUP_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_video_analysis_hourly_camera_inout
+        ON video_analysis_hourly (camera_name, bucket) INCLUDE (in_count, out_count);
+"""
+
+# 汇总表刷新函数和video_analysis上的语句级触发器：任何写入video_analysis的语句
+# （导入接口、外部分析流程直接写入、删除重复数据等）结束后，按转换表中新旧行涉及的
+# (摄像头, 小时)重新计算小时汇总及其所在的日汇总，只处理本语句改动的时间桶；
+# 先删除再重新计算，时段全部被删除的时间桶不再保留，涉及的时间桶记入video_analysis_hourly_changes；
+# 并发写入时用事务级咨询锁串行刷新，后刷新的事务能读取到先提交的行
+ROLLUP_TRIGGERS_SQL = """
+    CREATE OR REPLACE FUNCTION refresh_video_analysis_rollups(
+        cameras character varying[], hours timestamp without time zone[]
+    ) RETURNS void LANGUAGE plpgsql AS $$
+    DECLARE
+        first_hour timestamp without time zone;
+        last_hour timestamp without time zone;
+    BEGIN
+        SELECT MIN(hour), MAX(hour) INTO first_hour, last_hour FROM unnest(hours) AS hour;
+        IF first_hour IS NULL THEN
+            RETURN;
+        END IF;
+        PERFORM pg_advisory_xact_lock(hashtext('video_analysis_rollups'));
+
+        DELETE FROM video_analysis_hourly AS rollup
+        USING unnest(cameras, hours) AS touched (camera_name, bucket)
+        WHERE rollup.camera_name = touched.camera_name AND rollup.bucket = touched.bucket;
+
+        INSERT INTO video_analysis_hourly (
+            camera_name, bucket, min_start_time, max_end_time, slot_count, {columns}
+        )
+        SELECT
+            COALESCE(camera_name, ''), date_trunc('hour', start_time),
+            MIN(start_time), MAX(end_time), COUNT(*), {sums}
+        FROM video_analysis
+        WHERE start_time >= first_hour AND start_time < last_hour + INTERVAL '1 hour'
+            AND (COALESCE(camera_name, ''), date_trunc('hour', start_time))
+                IN (SELECT * FROM unnest(cameras, hours))
+        GROUP BY 1, 2;
+
+        INSERT INTO video_analysis_hourly_changes (camera_name, bucket, change_seq)
+        SELECT camera_name, bucket, nextval('video_analysis_hourly_change_seq')
+        FROM (SELECT DISTINCT * FROM unnest(cameras, hours)) AS touched (camera_name, bucket)
+        ON CONFLICT (camera_name, bucket) DO UPDATE SET change_seq = EXCLUDED.change_seq;
+
+        DELETE FROM video_analysis_daily AS rollup
+        USING unnest(cameras, hours) AS touched (camera_name, bucket)
+        WHERE rollup.camera_name = touched.camera_name
+            AND rollup.bucket = date_trunc('day', touched.bucket);
+
+        INSERT INTO video_analysis_daily (
+            camera_name, bucket, min_start_time, max_end_time, slot_count, {columns}
+        )
+        SELECT
+            camera_name, date_trunc('day', bucket),
+            MIN(min_start_time), MAX(max_end_time), SUM(slot_count), {sums}
+        FROM video_analysis_hourly
+        WHERE bucket >= date_trunc('day', first_hour)
+            AND bucket < date_trunc('day', last_hour) + INTERVAL '1 day'
+            AND (camera_name, date_trunc('day', bucket)) IN (
+                SELECT touched.camera_name, date_trunc('day', touched.bucket)
+                FROM unnest(cameras, hours) AS touched (camera_name, bucket)
+            )
+        GROUP BY 1, 2;
+    END;
+    $$;
+
+    CREATE OR REPLACE FUNCTION video_analysis_rollup_trigger() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM refresh_video_analysis_rollups(array_agg(camera_name), array_agg(bucket))
+            FROM (
+                SELECT DISTINCT COALESCE(camera_name, '') AS camera_name,
+                    date_trunc('hour', start_time) AS bucket
+                FROM new_rows WHERE start_time IS NOT NULL
+            ) AS touched;
+        ELSIF TG_OP = 'UPDATE' THEN
+            PERFORM refresh_video_analysis_rollups(array_agg(camera_name), array_agg(bucket))
+            FROM (
+                SELECT COALESCE(camera_name, '') AS camera_name,
+                    date_trunc('hour', start_time) AS bucket
+                FROM new_rows WHERE start_time IS NOT NULL
+                UNION
+                SELECT COALESCE(camera_name, ''), date_trunc('hour', start_time)
+                FROM old_rows WHERE start_time IS NOT NULL
+            ) AS touched;
+        ELSE
+            PERFORM refresh_video_analysis_rollups(array_agg(camera_name), array_agg(bucket))
+            FROM (
+                SELECT DISTINCT COALESCE(camera_name, '') AS camera_name,
+                    date_trunc('hour', start_time) AS bucket
+                FROM old_rows WHERE start_time IS NOT NULL
+            ) AS touched;
+        END IF;
+        RETURN NULL;
+    END;
+    $$;
+
+    DROP TRIGGER IF EXISTS video_analysis_rollup_insert ON video_analysis;
+    CREATE TRIGGER video_analysis_rollup_insert
+        AFTER INSERT ON video_analysis
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_analysis_rollup_trigger();
+
+    DROP TRIGGER IF EXISTS video_analysis_rollup_update ON video_analysis;
+    CREATE TRIGGER video_analysis_rollup_update
+        AFTER UPDATE ON video_analysis
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_analysis_rollup_trigger();
+
+    DROP TRIGGER IF EXISTS video_analysis_rollup_delete ON video_analysis;
+    CREATE TRIGGER video_analysis_rollup_delete
+        AFTER DELETE ON video_analysis
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION video_analysis_rollup_trigger();
+""".format(
+    columns=", ".join(ROLLUP_SUM_COLUMNS),
+    sums=", ".join(f"SUM({col})" for col in ROLLUP_SUM_COLUMNS),
+)
+
+
+def drop_rollup_triggers(cur):
+    """
+    删除汇总表刷新触发器（批量生成数据期间使用，导入完成后全量重建汇总表并重新创建触发器）
+    :param cur: 游标
+    """
+    for trigger_name in ROLLUP_TRIGGER_NAMES:
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger_name} ON video_analysis")
+
+
+def setup_database(db_config=DATABASE_CONFIG):
+    """
+    创建表和索引
+    :param db_config: 数据库连接参数
+    """
+    create_table_sql = """
+    -- DROP TABLE
+    DROP TABLE IF EXISTS public.run_records CASCADE;
+    DROP TABLE IF EXISTS public.video_analysis CASCADE;
+    DROP TABLE IF EXISTS public.users CASCADE;
+
+    -- CREATE TABLE
+    CREATE TABLE public.run_records(
+        run_id serial NOT NULL,
+        folder_path character varying(255) NOT NULL,
+        run_date timestamp(0) without time zone DEFAULT CURRENT_TIMESTAMP(0) NOT NULL,
+        total_videos integer NOT NULL,
+        PRIMARY KEY (run_id)
     );
 
     -- CREATE INDEX
     CREATE INDEX idx_run_records_date ON run_records(run_date);
-    CREATE INDEX idx_video_analysis_run ON video_analysis(run_id);
-    CREATE INDEX idx_video_analysis_start_time ON video_analysis(start_time);
-    CREATE INDEX idx_video_analysis_end_time ON video_analysis(end_time);
-    CREATE INDEX idx_video_analysis_camera ON video_analysis(camera_name);
-    CREATE INDEX idx_video_analysis_start_time_gender ON video_analysis (start_time, male_count, female_count, minor_count, unknown_gender_count);
-    CREATE INDEX idx_video_analysis_start_date ON video_analysis ((start_time::date));
-    CREATE INDEX idx_video_analysis_end_date ON video_analysis ((end_time::date));
-    CREATE INDEX idx_video_analysis_start_time_camera ON video_analysis (start_time, camera_name);
-    CREATE INDEX idx_video_analysis_year_month ON video_analysis (EXTRACT(YEAR FROM start_time), EXTRACT(MONTH FROM start_time));
-    CREATE INDEX idx_video_analysis_year_quarter ON video_analysis (EXTRACT(YEAR FROM start_time), EXTRACT(QUARTER FROM start_time));
-    CREATE INDEX idx_video_analysis_year ON video_analysis (EXTRACT(YEAR FROM start_time));
-    CREATE INDEX idx_video_analysis_week ON video_analysis (date_trunc('week', start_time));
-    CREATE INDEX idx_video_analysis_date_range ON video_analysis USING btree (start_time, end_time);
-    CREATE INDEX idx_video_analysis_camera_time ON video_analysis (camera_name, start_time, end_time);
-    CREATE INDEX idx_video_analysis_weekly ON video_analysis (date_trunc('week', start_time));
-    CREATE INDEX idx_video_analysis_quarter ON video_analysis (date_trunc('quarter', start_time));
-    CREATE INDEX idx_video_analysis_camera_period ON video_analysis (camera_name, start_time, end_time);
 
     -- CREATE TABLE
     CREATE TABLE public.users( 
@@ -90,10 +344,17 @@ def setup_database():
         'admin'
     );
     """
+    conn = None
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = psycopg2.connect(**db_config)
         cur = conn.cursor()
         cur.execute(create_table_sql)
+        cur.execute(VIDEO_ANALYSIS_TABLE_SQL)
+        cur.execute(VIDEO_ANALYSIS_INDEXES_SQL)
+        cur.execute(ROLLUP_TABLES_SQL)
+        cur.execute(ROLLUP_CHANGES_SQL)
+        cur.execute(ROLLUP_INDEXES_SQL)
+        cur.execute(ROLLUP_TRIGGERS_SQL)
         conn.commit()
         print("数据库表和索引创建完成")
         cur.close()
@@ -104,131 +365,151 @@ def setup_database():
             conn.close()
 
 
-def generate_video_analysis_data():
-    """生成并插入video_analysis表的数据（修复A6/A7逻辑）"""
+def build_day_rows(current_date, camera_count=8, scale=1, run_id=1):
+    """
+    生成某一天所有站点、所有摄像头的24小时数据（A6/A7按楼层流量关系生成）
+    :param current_date: 日期
+    :param camera_count: 每个站点的摄像头数量
+    :param scale: 站点数量，第1个站点摄像头名为A1..An，其余站点为S{站点}-A1..An
+    :param run_id: 批次ID
+    :return: 按video_analysis列顺序（VIDEO_ANALYSIS_COLUMNS）排列的数据行列表
+    """
+    rows = []
+    date_str = current_date.strftime("%Y%m%d")
+    # 分析时间基准 (当天9:44:00)
+    analysis_base = datetime(
+        current_date.year, current_date.month, current_date.day, 9, 44, 0
+    )
+    for hour in range(24):
+        # 计算时间范围
+        start_time = current_date + timedelta(hours=hour)
+        end_time = start_time + timedelta(hours=1) - timedelta(seconds=1)
+        for site in range(1, scale + 1):
+            # 先计算每个小时的总流量（独立于摄像头）
+            base_hour_flow = 10 + hour + random.uniform(-3, 3)
+
+            # 楼层间流量（二楼与一楼之间）
+            floor_flow = int(base_hour_flow * 0.6 + random.uniform(0, 5))
+
+            # 外部流量（一楼与外界）
+            external_in = int(base_hour_flow * 0.4 + random.uniform(0, 3))
+            external_out = int(base_hour_flow * 0.3 + random.uniform(0, 3))
+
+            # 按摄像头生成数据
+            for camera_num in range(1, camera_count + 1):
+                camera_name = f"A{camera_num}"
+                if site > 1:
+                    camera_name = f"S{site}-{camera_name}"
+
+                # === 特殊处理A6(二楼)和A7(一楼)的流量关系 ===
+                if camera_num == 7:  # 一楼主出入口
+                    # 总进 = 外部进入 + 二楼下来的人
+                    in_count = external_in + floor_flow
+                    # 总出 = 离开大楼 + 前往二楼的人
+                    out_count = external_out + floor_flow
+                    total_people = in_count + out_count
+
+                elif camera_num == 6:  # 二楼出入口
+                    # 进出都等于楼层间流量
+                    in_count = floor_flow  # 进入二楼的人数
+                    out_count = floor_flow - 2  # 离开二楼的人数
+                    total_people = in_count + out_count
+
+                else:  # 其他普通摄像头
+                    base_count = 5 + (camera_num - 1) * 2 + (hour / 2)
+                    base_count = max(5, min(50, base_count))
+                    base_count += random.uniform(-5, 5)
+                    base_count = max(5, base_count)
+
+                    in_count = int(base_count * 0.6 + random.uniform(0, 5))
+                    out_count = int(base_count * 0.4 + random.uniform(0, 5))
+                    total_people = in_count + out_count
+                # === 结束特殊处理 ===
+
+                # 性别分布（所有摄像头通用逻辑）
+                male_count = int(total_people * 0.5 + random.uniform(-2.5, 2.5))
+                female_count = int(total_people * 0.3 + random.uniform(-2.5, 2.5))
+                unknown_gender_count = total_people - male_count - female_count
+                # 确保未知性别至少为1
+                if unknown_gender_count <= 0:
+                    unknown_gender_count = 1
+                    female_count = total_people - male_count - unknown_gender_count
+
+                # 年龄分布（所有摄像头通用逻辑）
+                adult_count = int(total_people * 0.6 + random.uniform(-2.5, 2.5))
+                minor_count = int(total_people * 0.2 + random.uniform(-2.5, 2.5))
+                unknown_age_count = total_people - adult_count - minor_count
+                # 确保未知年龄至少为1
+                if unknown_age_count <= 0:
+                    unknown_age_count = 1
+                    minor_count = total_people - adult_count - unknown_age_count
+
+                # 创建视频文件名
+                video_name = (
+                    f"{camera_name}-{date_str}-{hour:02d}0000-{hour:02d}5959.mp4"
+                )
+
+                # 分析时间 (当天9:44:00基础上随机偏移)
+                analysis_time = analysis_base + timedelta(
+                    seconds=random.randint(0, 12 * 3600)
+                )
+
+                rows.append(
+                    (
+                        run_id,
+                        video_name,
+                        camera_name,
+                        start_time,
+                        end_time,
+                        total_people,
+                        in_count,
+                        out_count,
+                        male_count,
+                        female_count,
+                        unknown_gender_count,
+                        adult_count,
+                        minor_count,
+                        unknown_age_count,
+                        "horizontal_a",
+                        0.50,
+                        analysis_time,
+                    )
+                )
+    return rows
+
+
+def generate_video_analysis_data(
+    start_date=DEFAULT_START_DATE,
+    end_date=DEFAULT_END_DATE,
+    camera_count=8,
+    scale=1,
+    db_config=DATABASE_CONFIG,
+):
+    """生成并逐行插入video_analysis表的数据（修复A6/A7逻辑）"""
+    conn = None
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = psycopg2.connect(**db_config)
         cur = conn.cursor()
 
-        start_date = datetime(2024, 9, 1)
-        end_date = datetime(2025, 8, 31)
         current_date = start_date
         total_records = 0
 
         print(f"开始生成数据: {start_date} 到 {end_date}")
 
-        while current_date <= end_date:
-            # 每天生成24小时的数据
-            for hour in range(24):
-                # 先计算每个小时的总流量（独立于摄像头）
-                base_hour_flow = 10 + hour + random.uniform(-3, 3)
-
-                # 楼层间流量（二楼与一楼之间）
-                floor_flow = int(base_hour_flow * 0.6 + random.uniform(0, 5))
-
-                # 外部流量（一楼与外界）
-                external_in = int(base_hour_flow * 0.4 + random.uniform(0, 3))
-                external_out = int(base_hour_flow * 0.3 + random.uniform(0, 3))
-
-                # 按摄像头生成数据
-                for camera_num in range(1, 9):
-                    camera_name = f"A{camera_num}"
-
-                    # === 特殊处理A6(二楼)和A7(一楼)的流量关系 ===
-                    if camera_name == "A7":  # 一楼主出入口
-                        # 总进 = 外部进入 + 二楼下来的人
-                        in_count = external_in + floor_flow
-                        # 总出 = 离开大楼 + 前往二楼的人
-                        out_count = external_out + floor_flow
-                        total_people = in_count + out_count
-
-                    elif camera_name == "A6":  # 二楼出入口
-                        # 进出都等于楼层间流量
-                        in_count = floor_flow  # 进入二楼的人数
-                        out_count = floor_flow - 2   # 离开二楼的人数
-                        total_people = in_count + out_count
-
-                    else:  # 其他普通摄像头
-                        base_count = 5 + (camera_num - 1) * 2 + (hour / 2)
-                        base_count = max(5, min(50, base_count))
-                        base_count += random.uniform(-5, 5)
-                        base_count = max(5, base_count)
-
-                        in_count = int(base_count * 0.6 + random.uniform(0, 5))
-                        out_count = int(base_count * 0.4 + random.uniform(0, 5))
-                        total_people = in_count + out_count
-                    # === 结束特殊处理 ===
-
-                    # 性别分布（所有摄像头通用逻辑）
-                    male_count = int(total_people * 0.5 + random.uniform(-2.5, 2.5))
-                    female_count = int(total_people * 0.3 + random.uniform(-2.5, 2.5))
-                    unknown_gender_count = total_people - male_count - female_count
-                    # 确保未知性别至少为1
-                    if unknown_gender_count <= 0:
-                        unknown_gender_count = 1
-                        female_count = total_people - male_count - unknown_gender_count
-
-                    # 年龄分布（所有摄像头通用逻辑）
-                    adult_count = int(total_people * 0.6 + random.uniform(-2.5, 2.5))
-                    minor_count = int(total_people * 0.2 + random.uniform(-2.5, 2.5))
-                    unknown_age_count = total_people - adult_count - minor_count
-                    # 确保未知年龄至少为1
-                    if unknown_age_count <= 0:
-                        unknown_age_count = 1
-                        minor_count = total_people - adult_count - unknown_age_count
-
-                    # 创建视频文件名
-                    video_name = (
-                        f"{camera_name}-{current_date.strftime('%Y%m%d')}-"
-                        f"{hour:02d}0000-{hour:02d}5959.mp4"
-                    )
+        # 预先创建数据范围内的月分区；逐行插入期间不逐条刷新汇总表，完成后全量重建
+        ensure_partitions(conn, start_date, end_date)
+        drop_rollup_triggers(cur)
+        conn.commit()
 
-                    # 计算时间范围
-                    start_time = current_date + timedelta(hours=hour)
-                    end_time = start_time + timedelta(hours=1) - timedelta(seconds=1)
-
-                    # 分析时间 (当天9:44:00基础上随机偏移)
-                    analysis_time = datetime(
-                        current_date.year,
-                        current_date.month,
-                        current_date.day,
-                        9,
-                        44,
-                        0,
-                    ) + timedelta(seconds=random.randint(0, 12 * 3600))
-
-                    # 插入数据
-                    cur.execute(
-                        """
-                        INSERT INTO public.video_analysis (
-                            run_id, video_name, camera_name, start_time, end_time,
-                            total_people, in_count, out_count, male_count, female_count,
-                            unknown_gender_count, adult_count, minor_count, unknown_age_count,
-                            detection_method, line_position, analysis_time
-                        ) VALUES (
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                        )
-                        """,
-                        (
-                            1,
-                            video_name,
-                            camera_name,
-                            start_time,
-                            end_time,
-                            total_people,
-                            in_count,
-                            out_count,
-                            male_count,
-                            female_count,
-                            unknown_gender_count,
-                            adult_count,
-                            minor_count,
-                            unknown_age_count,
-                            "horizontal_a",
-                            0.50,
-                            analysis_time,
-                        ),
-                    )
+        insert_sql = f"""
+            INSERT INTO public.video_analysis ({", ".join(VIDEO_ANALYSIS_COLUMNS)})
+            VALUES ({", ".join(["%s"] * len(VIDEO_ANALYSIS_COLUMNS))})
+        """
+        while current_date <= end_date:
+            rows = build_day_rows(current_date, camera_count, scale)
+            # 插入数据
+            for row in rows:
+                cur.execute(insert_sql, row)
 
             # 每10天提交一次
             if current_date.day % 10 == 0:
@@ -236,10 +517,16 @@ def generate_video_analysis_data():
                 print(f"已提交数据到 {current_date.strftime('%Y-%m-%d')}")
 
             current_date += timedelta(days=1)
-            total_records += 192  # 每天192条记录
+            total_records += len(rows)
 
         conn.commit()
         print(f"数据生成完成! 共生成 {total_records} 条记录")
+
+        # 重建小时/日汇总表
+        refresh_rollups(conn)
+        cur.execute(ROLLUP_TRIGGERS_SQL)
+        conn.commit()
+        print("汇总表刷新完成")
         cur.close()
 
     except Exception as e:
@@ -249,13 +536,137 @@ def generate_video_analysis_data():
             conn.close()
 
 
+def _copy_rows(cur, buffer):
+    """
+    将缓冲区中的数据通过COPY写入video_analysis，并清空缓冲区
+    :param cur: 游标
+    :param buffer: 文本格式的COPY数据缓冲区
+    """
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY public.video_analysis ({', '.join(VIDEO_ANALYSIS_COLUMNS)}) FROM STDIN",
+        buffer,
+    )
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def bulk_load_video_analysis(
+    start_date=DEFAULT_START_DATE,
+    end_date=DEFAULT_END_DATE,
+    camera_count=8,
+    scale=1,
+    db_config=DATABASE_CONFIG,
+):
+    """
+    使用COPY批量导入video_analysis数据：导入前删除二级索引，导入后重建索引并刷新汇总表
+    :param start_date: 开始日期
+    :param end_date: 结束日期
+    :param camera_count: 每个站点的摄像头数量
+    :param scale: 站点数量
+    :param db_config: 数据库连接参数
+    """
+    conn = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cur = conn.cursor()
+        # 测试数据可重新生成，关闭同步提交加快导入
+        cur.execute("SET synchronous_commit = off")
+
+        print(
+            f"开始批量导入: {start_date} 到 {end_date}, "
+            f"{scale} 个站点 x {camera_count} 个摄像头"
+        )
+
+        # 导入期间不维护二级索引和汇总表（导入完成后重建）
+        for index_name in VIDEO_ANALYSIS_INDEX_NAMES:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+        drop_rollup_triggers(cur)
+
+        # 预先创建数据范围内的月分区，COPY直接写入各月分区
+        ensure_partitions(conn, start_date, end_date)
+
+        buffer = io.StringIO()
+        current_date = start_date
+        total_records = 0
+        while current_date <= end_date:
+            for row in build_day_rows(current_date, camera_count, scale):
+                buffer.write("\t".join(map(str, row)))
+                buffer.write("\n")
+                total_records += 1
+            # 缓冲区超过阈值时写入一次，避免整个数据集驻留内存
+            if buffer.tell() >= COPY_BUFFER_SIZE:
+                _copy_rows(cur, buffer)
+            current_date += timedelta(days=1)
+        if buffer.tell():
+            _copy_rows(cur, buffer)
+        print(f"数据导入完成! 共导入 {total_records} 条记录")
+
+        cur.execute(VIDEO_ANALYSIS_INDEXES_SQL)
+        cur.execute("ANALYZE public.video_analysis")
+        print("索引重建完成")
+
+        # 全量重建汇总表时按小时聚合整张表，调大work_mem避免聚合落盘
+        cur.execute("SET work_mem = '256MB'")
+
+        # 重建小时/日汇总表
+        refresh_rollups(conn)
+        cur.execute(ROLLUP_TRIGGERS_SQL)
+        conn.commit()
+        print("汇总表刷新完成")
+        cur.close()
+
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"批量导入出错: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _parse_date(value):
+    """argparse日期参数解析"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为YYYY-MM-DD: {value}")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="初始化数据库并生成测试数据")
+    parser.add_argument(
+        "--bulk", action="store_true", help="使用COPY批量导入（用于生成压测数据）"
+    )
+    parser.add_argument(
+        "--start", type=_parse_date, default=DEFAULT_START_DATE, help="开始日期"
+    )
+    parser.add_argument(
+        "--end", type=_parse_date, default=DEFAULT_END_DATE, help="结束日期"
+    )
+    parser.add_argument("--cameras", type=int, default=8, help="每个站点的摄像头数量")
+    parser.add_argument("--scale", type=int, default=1, help="站点数量（数据量倍数）")
+    args = parser.parse_args()
+    if args.end < args.start:
+        parser.error("结束日期不能早于开始日期")
+    if args.cameras < 1 or args.scale < 1:
+        parser.error("摄像头数量和站点数量必须大于0")
+    return args
+
+
 if __name__ == "__main__":
+    args = parse_args()
+
     # 初始化数据库
     setup_database()
 
     # 生成动态数据
     start_time = time.time()
-    generate_video_analysis_data()
+    if args.bulk:
+        bulk_load_video_analysis(args.start, args.end, args.cameras, args.scale)
+    else:
+        generate_video_analysis_data(args.start, args.end, args.cameras, args.scale)
     end_time = time.time()
 
     print(f"总耗时: {end_time - start_time:.2f} 秒")
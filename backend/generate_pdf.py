@@ -1,5 +1,11 @@
+import argparse
+import io
+import json
 import os
+import tempfile
 import psycopg2
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
@@ -12,276 +18,145 @@ from reportlab.platypus import (
     TableStyle,
     PageBreak,
 )
-from config import DATABASE_CONFIG
-from common import (
-    get_db_connection,
-    get_gender_count,
-    get_camera_stats,
-    get_area_peak_and_low_periods,
-    get_cold_storage_peak_and_low_periods,
-)
+from config import DATABASE_CONFIG, REPORT_SCHEDULE_CONFIG
+from common import TIME_RANGE_SQL, db_connection, to_time_range
+from zones import compute_zone_periods, compute_zone_totals, resolve_zones, zone_cameras
 
 # 数据库配置
 DB_CONFIG = DATABASE_CONFIG
 
+# 报告各部分（按报告中的顺序）：区域键（定义见zones.ZONES）或单个摄像头
+REPORT_SECTIONS = ["cold_storage", "second_floor", "canteen", "A1", "A3", "A2"]
+
+# 报告涉及的全部摄像头（冷库A6/A7、二楼A1/A2/A3/A6、餐厅A4/A5）
+REPORT_CAMERAS = zone_cameras(resolve_zones(REPORT_SECTIONS))
+
+# 单个时段的原始统计数据
+Slot = namedtuple(
+    "Slot",
+    [
+        "camera_name",
+        "start_time",
+        "end_time",
+        "total_people",
+        "in_count",
+        "out_count",
+        "male_count",
+        "female_count",
+        "minor_count",
+        "unknown_gender_count",
+    ],
+)
 
-def calculate_individual_stats(camera_name, date_str):
-    """
-    计算单个摄像头的统计数据（调整为与app.py一致）
-    :param camera_name: 摄像头名称
-    :param date_str: 日期字符串 (YYYY-MM-DD)
-    :return: 包含统计数据的字典
-    """
-    conn = get_db_connection()
-    start_time = f"{date_str} 00:00:00"
-    end_time = f"{date_str} 23:59:59"
-
-    try:
-        # 使用共通函数获取摄像头统计数据
-        stats = get_camera_stats(conn, camera_name, start_time, end_time)
-        stats["name"] = f"Camera {camera_name}"
-
-        # 重新组织数据结构以匹配PDF报告的格式
-        total_in = stats["total_in"]
-
-        # 计算性别分布（基于进入人数）
-        if total_in > 0:
-            # 使用get_gender_count函数计算整数性别分布
-            gender_count = get_gender_count(
-                total_in,
-                stats["male_percent"],
-                stats["female_percent"],
-                stats["unknown_percent"],
-            )
-            stats["total_males"] = gender_count["male"]
-            stats["total_females"] = gender_count["female"]
-            stats["total_unknowns"] = gender_count["unknown"]
-
-            # 儿童人数单独计算（向下取整）
-            minor_percent = float(stats["minor_percent"])
-            stats["total_children"] = int(total_in * minor_percent / 100)
-        else:
-            stats["total_males"] = 0
-            stats["total_females"] = 0
-            stats["total_unknowns"] = 0
-            stats["total_children"] = 0
-
-        # 使用峰值和低谷时段数据
-        stats["highest_period"] = stats["peak_period"]
-        stats["lowest_period"] = stats["low_period"]
-
-        # 移除不需要的字段
-        stats.pop("peak_period", None)
-        stats.pop("low_period", None)
-        stats.pop("male_percent", None)
-        stats.pop("female_percent", None)
-        stats.pop("unknown_percent", None)
-        stats.pop("minor_percent", None)
-
-    except Exception as e:
-        print(f"Error calculating stats for {camera_name}: {e}")
-        # 返回默认统计数据
-        stats = {
-            "name": f"Camera {camera_name}",
-            "total_in": 0,
-            "total_out": 0,
-            "total_males": 0,
-            "total_females": 0,
-            "total_children": 0,
-            "total_unknowns": 0,
-            "highest_period": "N/A",
-            "lowest_period": "N/A",
-        }
-    finally:
-        conn.close()
+# 报告日期的全部时段数据快照（只读，各区域统计均由此推导）
+ReportSnapshot = namedtuple("ReportSnapshot", ["date_str", "slots"])
 
-    return stats
+# 补生成模式的清单文件名（位于报告输出目录中）
+MANIFEST_NAME = "reports_manifest.json"
 
 
-def calculate_cold_storage_stats(date_str):
+def load_report_snapshot(
+    date_str, cameras=REPORT_CAMERAS, end_date_str=None, strict=False
+):
     """
-    计算冷库区域统计数据（调整为与app.py一致）
+    一次查询取得报告日期内所有报告摄像头的时段数据
     :param date_str: 日期字符串 (YYYY-MM-DD)
-    :return: 包含统计数据的字典
+    :param cameras: 摄像头列表
+    :param end_date_str: 结束日期字符串（多日报告），默认与date_str相同
+    :param strict: 查询失败时抛出异常；否则各区域按无数据处理
+    :return: ReportSnapshot
     """
-    conn = get_db_connection()
     start_time = f"{date_str} 00:00:00"
-    end_time = f"{date_str} 23:59:59"
+    end_time = f"{end_date_str or date_str} 23:59:59"
 
     try:
-        # 获取A7摄像头的统计数据
-        a7_stats = get_camera_stats(conn, "A7", start_time, end_time)
-        # 获取A6摄像头的统计数据
-        a6_stats = get_camera_stats(conn, "A6", start_time, end_time)
-
-        # 计算冷库区域的总进出人数
-        a7_in = a7_stats["total_in"]
-        a7_out = a7_stats["total_out"]
-        a6_in = a6_stats["total_in"]
-        a6_out = a6_stats["total_out"]
-
-        cold_storage_in = a7_in + a6_out  # 进入冷库：A7进入 + A6离开
-        cold_storage_out = a7_out + a6_in  # 离开冷库：A7离开 + A6进入
-
-        # 计算A7部分的性别分布（基于进入冷库的部分，即A7_in）
-        if a7_in > 0:
-            a7_gender_count = get_gender_count(
-                a7_in,
-                a7_stats["male_percent"],
-                a7_stats["female_percent"],
-                a7_stats["unknown_percent"],
-            )
-            a7_males = a7_gender_count["male"]
-            a7_females = a7_gender_count["female"]
-            a7_unknowns = a7_gender_count["unknown"]
-            # 计算儿童（向下取整）
-            a7_minor_percent = float(a7_stats["minor_percent"])
-            a7_children = int(a7_in * a7_minor_percent / 100)
-        else:
-            a7_males = a7_females = a7_unknowns = a7_children = 0
-
-        # 计算A6部分的性别分布（基于离开A6的人数，即a6_out，这部分人进入冷库）
-        if a6_out > 0:
-            a6_gender_count = get_gender_count(
-                a6_out,
-                a6_stats["male_percent"],
-                a6_stats["female_percent"],
-                a6_stats["unknown_percent"],
-            )
-            a6_males = a6_gender_count["male"]
-            a6_females = a6_gender_count["female"]
-            a6_unknowns = a6_gender_count["unknown"]
-            # 计算儿童（向下取整）
-            a6_minor_percent = float(a6_stats["minor_percent"])
-            a6_children = int(a6_out * a6_minor_percent / 100)
-        else:
-            a6_males = a6_females = a6_unknowns = a6_children = 0
-
-        # 合并A7和A6的数据
-        total_males = a7_males + a6_males
-        total_females = a7_females + a6_females
-        total_unknowns = a7_unknowns + a6_unknowns
-        total_children = a7_children + a6_children
-
-        # 计算最高/最低密度时段（基于进入人数，即A7.in_count + A6.out_count）
-        peak_period, low_period = get_cold_storage_peak_and_low_periods(
-            conn, start_time, end_time
-        )
-
-        stats = {
-            "name": "Cold Storage",
-            "total_in": cold_storage_in,
-            "total_out": cold_storage_out,
-            "total_males": total_males,
-            "total_females": total_females,
-            "total_children": total_children,
-            "total_unknowns": total_unknowns,
-            "highest_period": peak_period,
-            "lowest_period": low_period,
-        }
-
+        with db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    f"""
+                    SELECT
+                        camera_name, start_time, end_time, total_people,
+                        in_count, out_count, male_count, female_count,
+                        minor_count, unknown_gender_count
+                    FROM video_analysis
+                    WHERE camera_name = ANY(%s) AND {TIME_RANGE_SQL}
+                    ORDER BY start_time, camera_name
+                    """,
+                    (list(cameras), *to_time_range(start_time, end_time)),
+                )
+                slots = tuple(Slot(*row) for row in cur.fetchall())
+            finally:
+                cur.close()
     except Exception as e:
-        print(f"Error calculating cold storage stats: {e}")
-        # 返回默认统计数据
-        stats = {
-            "name": "Cold Storage",
-            "total_in": 0,
-            "total_out": 0,
-            "total_males": 0,
-            "total_females": 0,
-            "total_children": 0,
-            "total_unknowns": 0,
-            "highest_period": "N/A",
-            "lowest_period": "N/A",
-        }
-    finally:
-        conn.close()
+        if strict:
+            raise
+        print(f"Error loading report data for {date_str}: {e}")
+        # 各区域按无数据处理（与原先查询失败时的默认值一致）
+        slots = ()
 
-    return stats
+    return ReportSnapshot(date_str, slots)
 
 
-def calculate_area_stats(area_name, cameras, date_str):
+def load_report_version(date_str, end_date_str=None, cameras=REPORT_CAMERAS):
     """
-    计算指定区域的统计数据（调整为累加各摄像头，并统一计算性别）
-    :param area_name: 区域名称
-    :param cameras: 摄像头列表
+    报告日期（或日期范围）内数据的版本，数据被重新导入或补录后版本变化
+    （只改写已有行时最近分析时间和最大批次ID不一定变化，因此另加报告所用各列的校验和；
+    各行哈希值求和与行的顺序无关）
     :param date_str: 日期字符串 (YYYY-MM-DD)
-    :return: 包含统计数据的字典
+    :param end_date_str: 结束日期字符串，默认与date_str相同
+    :param cameras: 摄像头列表
+    :return: [行数, 最近分析时间, 最大批次ID, 校验和]（可JSON序列化）
     """
-    conn = get_db_connection()
     start_time = f"{date_str} 00:00:00"
-    end_time = f"{date_str} 23:59:59"
+    end_time = f"{end_date_str or date_str} 23:59:59"
 
-    try:
-        # 初始化统计值
-        total_in = 0
-        total_out = 0
-        total_males = 0
-        total_females = 0
-        total_children = 0
-        total_unknowns = 0
-
-        # 遍历每个摄像头
-        for cam in cameras:
-            cam_stats = get_camera_stats(conn, cam, start_time, end_time)
-
-            in_cnt = cam_stats["total_in"]
-            out_cnt = cam_stats["total_out"]
-            total_in += in_cnt
-            total_out += out_cnt
-
-            if in_cnt > 0:
-                # 计算该摄像头的性别整数分布
-                cam_gender_count = get_gender_count(
-                    in_cnt,
-                    cam_stats["male_percent"],
-                    cam_stats["female_percent"],
-                    cam_stats["unknown_percent"],
-                )
-                total_males += cam_gender_count["male"]
-                total_females += cam_gender_count["female"]
-                total_unknowns += cam_gender_count["unknown"]
-
-                # 计算儿童（向下取整）
-                minor_percent = float(cam_stats["minor_percent"])
-                cam_children = int(in_cnt * minor_percent / 100)
-                total_children += cam_children
-
-        # 计算最高/最低密度时段
-        peak_period, low_period = get_area_peak_and_low_periods(
-            conn, cameras, start_time, end_time
-        )
-
-        stats = {
-            "name": area_name,
-            "total_in": total_in,
-            "total_out": total_out,
-            "total_males": total_males,
-            "total_females": total_females,
-            "total_children": total_children,
-            "total_unknowns": total_unknowns,
-            "highest_period": peak_period,
-            "lowest_period": low_period,
-        }
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT
+                    COUNT(*), MAX(analysis_time), MAX(run_id),
+                    COALESCE(SUM(hashtextextended(concat_ws(',',
+                        camera_name, start_time, end_time, total_people,
+                        in_count, out_count, male_count, female_count,
+                        unknown_gender_count, adult_count, minor_count,
+                        unknown_age_count
+                    ), 0)), 0)
+                FROM video_analysis
+                WHERE camera_name = ANY(%s) AND {TIME_RANGE_SQL}
+                """,
+                (list(cameras), *to_time_range(start_time, end_time)),
+            )
+            count, analysis_time, run_id, checksum = cur.fetchone()
+        finally:
+            cur.close()
+    return [
+        count,
+        analysis_time.isoformat(sep=" ") if analysis_time else None,
+        run_id,
+        str(checksum),
+    ]
 
-    except Exception as e:
-        print(f"Error calculating area stats for {area_name}: {e}")
-        # 返回默认统计数据
-        stats = {
-            "name": area_name,
-            "total_in": 0,
-            "total_out": 0,
-            "total_males": 0,
-            "total_females": 0,
-            "total_children": 0,
-            "total_unknowns": 0,
-            "highest_period": "N/A",
-            "lowest_period": "N/A",
-        }
-    finally:
-        conn.close()
 
-    return stats
+def _snapshot_camera_rows(snapshot):
+    """
+    由快照一次遍历计算各摄像头的汇总行
+    :param snapshot: ReportSnapshot
+    :return: {摄像头: (total_people, total_in, total_out, male, female, minor, unknown_gender)}
+    """
+    rows = {}
+    for slot in snapshot.slots:
+        row = rows.setdefault(slot.camera_name, [0] * 7)
+        row[0] += slot.total_people
+        row[1] += slot.in_count
+        row[2] += slot.out_count
+        row[3] += slot.male_count
+        row[4] += slot.female_count
+        row[5] += slot.minor_count
+        row[6] += slot.unknown_gender_count
+    return {cam: tuple(row) for cam, row in rows.items()}
 
 
 def generate_pdf_report(stats_data, report_date, output_path):
@@ -289,16 +164,18 @@ def generate_pdf_report(stats_data, report_date, output_path):
     生成PDF报告
     :param stats_data: 统计数据列表
     :param report_date: 报告日期
-    :param output_path: 输出文件路径
+    :param output_path: 输出文件路径，或可写入的文件对象（如io.BytesIO）
     """
+    # 写入文件对象时不涉及文件系统，生成的内容只由统计数据决定（固定创建时间和文档ID）
+    in_memory = not isinstance(output_path, str)
 
     # 确保输出目录存在
-    output_dir = os.path.dirname(output_path)
+    output_dir = "" if in_memory else os.path.dirname(output_path)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
     # 如果文件已存在，尝试删除
-    if os.path.exists(output_path):
+    if not in_memory and os.path.exists(output_path):
         try:
             os.remove(output_path)
             print(f"Deleted existing file: {output_path}")
@@ -316,6 +193,7 @@ def generate_pdf_report(stats_data, report_date, output_path):
         leftMargin=72,
         topMargin=72,
         bottomMargin=18,
+        invariant=in_memory,
     )
 
     styles = getSampleStyleSheet()
@@ -411,8 +289,8 @@ def generate_pdf_report(stats_data, report_date, output_path):
             ]
 
             # 设置固定列宽
-            col_widths = [150, 200] 
-            
+            col_widths = [150, 200]
+
             table = Table(data, colWidths=col_widths)
             table.setStyle(
                 TableStyle(
@@ -442,40 +320,356 @@ def generate_pdf_report(stats_data, report_date, output_path):
 
     # 生成PDF
     doc.build(elements)
-    print(f"PDF report generated at: {output_path}")
+    if not in_memory:
+        print(f"PDF report generated at: {output_path}")
 
-def main():
-    # 计算前一天的日期
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # 计算各区域统计数据
+def calculate_report_stats(snapshot, sections=REPORT_SECTIONS, strict=False):
+    """
+    由快照计算报告中各区域的统计数据（区域及单个摄像头统一按区域定义计算）
+    :param snapshot: ReportSnapshot
+    :param sections: 报告各部分
+    :param strict: 计算失败时抛出异常；否则各区域按无数据处理
+    :return: 统计数据列表（按报告中的顺序）
+    """
+    zones = resolve_zones(sections)
+    try:
+        totals = compute_zone_totals(_snapshot_camera_rows(snapshot), zones)
+        periods = compute_zone_periods(snapshot.slots, zones)
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error calculating report stats for {snapshot.date_str}: {e}")
+        # 各区域按无数据处理
+        totals = compute_zone_totals({}, zones)
+        periods = {name: ("N/A", "N/A") for name in zones}
+
     stats_data = []
+    for name, zone in zones.items():
+        zone_totals = totals[name]
+        peak_period, low_period = periods[name]
+        stats_data.append(
+            {
+                "name": zone["name"],
+                "total_in": zone_totals["in"],
+                "total_out": zone_totals["out"],
+                "total_males": zone_totals["gender"]["male"],
+                "total_females": zone_totals["gender"]["female"],
+                "total_children": zone_totals["minor"],
+                "total_unknowns": zone_totals["gender"]["unknown"],
+                "highest_period": peak_period,
+                "lowest_period": low_period,
+            }
+        )
+    return stats_data
 
-    # 冷库区域（特殊计算逻辑）
-    cold_storage_stats = calculate_cold_storage_stats(yesterday)
-    stats_data.append(cold_storage_stats)
 
-    # 二楼区域
-    second_floor_stats = calculate_area_stats(
-        "2nd Floor", ["A1", "A2", "A3", "A6"], yesterday
+def report_filename(date_str):
+    """报告文件名"""
+    return f"Date of Report({date_str}).pdf"
+
+
+def write_file_atomic(path, data):
+    """
+    先写入同目录的临时文件再改名替换，读取方不会看到写了一半的文件，失败时原文件不受影响；
+    目标文件被占用无法替换时（如Windows上正在查看的报告），改用带时间戳的新文件名
+    :param path: 目标文件路径
+    :param data: 文件内容（bytes）
+    :return: 实际写入的文件路径
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory or None, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            os.replace(temp_path, path)
+        except PermissionError:
+            timestamp = datetime.now().strftime("%H%M%S")
+            base, ext = os.path.splitext(path)
+            path = f"{base}_{timestamp}{ext}"
+            print(f"Failed to replace existing file, using new name: {path}")
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+def generate_report(date_str, output_dir):
+    """
+    生成指定日期的PDF报告
+    :param date_str: 日期字符串 (YYYY-MM-DD)
+    :param output_dir: 输出目录
+    :return: (日期, 输出文件路径, 生成时的数据版本)
+    """
+    # 先取数据版本再读取数据：期间有新数据时记录的版本较旧，下次补生成时会重新生成；
+    # 读取数据失败时抛出异常，该日期不写入清单，下次补生成时重试
+    version = load_report_version(date_str)
+    output_path = write_file_atomic(
+        os.path.join(output_dir, report_filename(date_str)),
+        render_report(date_str, strict=True),
+    )
+    print(f"PDF report generated at: {output_path}")
+    return date_str, output_path, version
+
+
+def render_report(date_str, end_date_str=None, strict=False):
+    """
+    在内存中生成指定日期（或日期范围）的PDF报告
+    :param date_str: 日期字符串 (YYYY-MM-DD)
+    :param end_date_str: 结束日期字符串，默认与date_str相同
+    :param strict: 读取或计算数据失败时抛出异常，而不是生成各区域为0的报告
+                   （报告会按数据版本保存时必须使用，否则错误的报告在数据变化前一直被复用）
+    :return: PDF内容（bytes）
+    """
+    if end_date_str is None or end_date_str == date_str:
+        end_date_str = None
+        report_date = date_str
+    else:
+        report_date = f"{date_str} ~ {end_date_str}"
+
+    snapshot = load_report_snapshot(
+        date_str, end_date_str=end_date_str, strict=strict
     )
-    stats_data.append(second_floor_stats)
+    stats_data = calculate_report_stats(snapshot, strict=strict)
+
+    buffer = io.BytesIO()
+    generate_pdf_report(stats_data, report_date, buffer)
+    return buffer.getvalue()
+
+
+def load_manifest(output_dir):
+    """
+    读取补生成清单
+    :param output_dir: 报告输出目录
+    :return: {"watermark": 上次检查时的最近分析时间, "reports": {日期: {"file", "version"}}}
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("watermark", None)
+    manifest.setdefault("reports", {})
+    return manifest
+
+
+def save_manifest(output_dir, manifest):
+    """原子写入补生成清单"""
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    write_file_atomic(os.path.join(output_dir, MANIFEST_NAME), data)
+
+
+def _load_watermark():
+    """当前最近一次写入的分析时间（补生成开始前读取，之后写入的数据留给下次检查）"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT MAX(analysis_time) FROM video_analysis")
+            watermark = cur.fetchone()[0]
+        finally:
+            cur.close()
+    return watermark.isoformat(sep=" ") if watermark else None
+
+
+def _load_changed_dates(since, start, end, cameras=REPORT_CAMERAS):
+    """
+    上次检查之后有数据写入（导入、重新导入或补录）的报告日期，
+    按analysis_time索引只读取变化的行。analysis_time是写入事务的开始时间，
+    开始于上次读取检查位置之前、提交于之后的写入其analysis_time早于检查位置，
+    因此向前多读取watermark_overlap秒
+    :param since: 上次检查时的最近分析时间
+    :param start: 开始日期字符串
+    :param end: 结束日期字符串
+    :return: {日期字符串: 该日期变化行的最近分析时间}
+    """
+    overlap = timedelta(seconds=REPORT_SCHEDULE_CONFIG["watermark_overlap"])
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                SELECT start_time::date, MAX(analysis_time)
+                FROM video_analysis
+                WHERE analysis_time > %s
+                    AND camera_name = ANY(%s) AND {TIME_RANGE_SQL}
+                GROUP BY 1
+                """,
+                (
+                    datetime.fromisoformat(since) - overlap,
+                    list(cameras),
+                    *to_time_range(f"{start} 00:00:00", f"{end} 23:59:59"),
+                ),
+            )
+            return {day.strftime("%Y-%m-%d"): latest for day, latest in cur.fetchall()}
+        finally:
+            cur.close()
+
+
+def find_pending_dates(dates, output_dir, manifest):
+    """
+    需要（重新）生成的日期：清单中没有或文件已不存在的日期，上次检查之后数据有变化的日期，
+    以及只在重叠窗口内有写入、且数据版本与生成时记录的版本不同的日期
+    （重叠窗口内的写入可能已包含在上次生成的报告中，比较版本避免每次都重新生成）
+    :param dates: 日期字符串列表（升序）
+    :param output_dir: 报告输出目录
+    :param manifest: load_manifest 的返回值
+    :return: 日期字符串列表（升序）
+    """
+    reports = manifest["reports"]
+    pending = {
+        date_str
+        for date_str in dates
+        if date_str not in reports
+        or not os.path.isfile(os.path.join(output_dir, reports[date_str]["file"]))
+    }
+    if manifest["watermark"] is not None and dates:
+        watermark = datetime.fromisoformat(manifest["watermark"])
+        changed = _load_changed_dates(manifest["watermark"], dates[0], dates[-1])
+        for date_str, latest in changed.items():
+            if date_str in pending:
+                continue
+            if latest > watermark or (
+                load_report_version(date_str) != reports[date_str].get("version")
+            ):
+                pending.add(date_str)
+    return sorted(pending & set(dates))
+
+
+def _generate_reports(dates, output_dir, workers):
+    """
+    生成多个日期的报告：单个日期或单进程时在当前进程生成，否则按进程并行生成
+    （每个进程各自建立连接池，读取各自日期的快照）
+    :return: 成功生成的 [(日期, 输出文件路径, 数据版本)]
+    """
+    if len(dates) <= 1 or workers == 1:
+        results = []
+        for date_str in dates:
+            try:
+                results.append(generate_report(date_str, output_dir))
+            except Exception as e:
+                print(f"Error generating report for {date_str}: {e}")
+        return results
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(dates))) as executor:
+        futures = {
+            executor.submit(generate_report, date_str, output_dir): date_str
+            for date_str in dates
+        }
+        for future, date_str in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error generating report for {date_str}: {e}")
+    return results
+
 
-    # 餐厅区域
-    canteen_stats = calculate_area_stats("Canteen Area", ["A4", "A5"], yesterday)
-    stats_data.append(canteen_stats)
+def catch_up(dates, output_dir, workers):
+    """
+    补生成模式：只生成缺失或数据已变化的日期，生成后更新清单
+    （失败的日期不写入清单，下次运行时重试）
+    :param dates: 需要保持最新的日期字符串列表（升序）
+    :param output_dir: 报告输出目录
+    :param workers: 并行生成报告的进程数
+    :return: 生成的报告数
+    """
+    manifest = load_manifest(output_dir)
+    watermark = _load_watermark()
+    pending = find_pending_dates(dates, output_dir, manifest)
+    print(f"{len(pending)} of {len(dates)} reports are missing or out of date")
+
+    results = _generate_reports(pending, output_dir, workers)
+    for date_str, output_path, version in results:
+        manifest["reports"][date_str] = {
+            "file": os.path.basename(output_path),
+            "version": version,
+        }
+    if len(results) == len(pending):
+        # 全部成功时才推进检查位置，否则下次仍从上次的位置检查
+        manifest["watermark"] = watermark
+    save_manifest(output_dir, manifest)
+    return len(results)
 
-    # 各个摄像头区域
-    stats_data.append(calculate_individual_stats("A1", yesterday))
-    stats_data.append(calculate_individual_stats("A3", yesterday))
-    stats_data.append(calculate_individual_stats("A2", yesterday))
 
-    # 生成PDF报告
-    output_dir = os.path.join(os.path.expanduser("~"), "Desktop", "reports")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"Date of Report({yesterday}).pdf")
+def _parse_date(value):
+    """argparse日期参数解析"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为YYYY-MM-DD: {value}")
+
 
-    generate_pdf_report(stats_data, yesterday, output_path)
+def parse_args(argv=None):
+    """
+    解析命令行参数（不指定日期时生成前一天的报告；补生成模式默认检查最近catch_up_days天）
+    :param argv: 参数列表，默认取sys.argv
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="生成每日人流统计PDF报告")
+    parser.add_argument("--start", type=_parse_date, default=None, help="开始日期")
+    parser.add_argument(
+        "--end",
+        type=_parse_date,
+        default=None,
+        help="结束日期，默认与开始日期相同（补生成模式默认为前一天）",
+    )
+    parser.add_argument(
+        "--catch-up",
+        action="store_true",
+        help="补生成模式：按清单只生成缺失或数据已变化的日期（适合每日定时任务）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="并行生成报告的进程数",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=os.path.join(os.path.expanduser("~"), "Desktop", "reports"),
+        help="报告输出目录",
+    )
+    args = parser.parse_args(argv)
+    if args.catch_up:
+        if args.end is None:
+            args.end = yesterday
+        if args.start is None:
+            args.start = args.end - timedelta(
+                days=REPORT_SCHEDULE_CONFIG["catch_up_days"] - 1
+            )
+    else:
+        if args.start is None:
+            args.start = yesterday
+        if args.end is None:
+            args.end = args.start
+    if args.end < args.start:
+        parser.error("结束日期不能早于开始日期")
+    if args.workers < 1:
+        parser.error("进程数必须大于0")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # 需要生成报告的日期
+    dates = []
+    current = args.start
+    while current <= args.end:
+        dates.append(current.strftime("%Y-%m-%d"))
+        current += timedelta(days=1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.catch_up:
+        catch_up(dates, args.output_dir, args.workers)
+    else:
+        _generate_reports(dates, args.output_dir, args.workers)
 
 
 if __name__ == "__main__":
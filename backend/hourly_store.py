@@ -0,0 +1,591 @@
+import io
+import logging
+import threading
+from datetime import timedelta
+
+import numpy as np
+import psycopg2
+
+from cache import sync_data_version
+from common import (
+    db_connection,
+    get_data_version,
+    get_db_connection,
+    parse_timestamp,
+    rollup_triggers_installed,
+)
+from config import HOURLY_STORE_CONFIG
+from zones import format_period
+
+logger = logging.getLogger(__name__)
+
+# 存储的统计列，顺序与get_range_camera_sums的汇总行一致
+STORE_COLUMNS = [
+    "total_people",
+    "in_count",
+    "out_count",
+    "male_count",
+    "female_count",
+    "minor_count",
+    "unknown_gender_count",
+]
+_IN = STORE_COLUMNS.index("in_count")
+_OUT = STORE_COLUMNS.index("out_count")
+
+# 足迹分布使用的列：(total_people, in_count, male, female, minor, unknown_gender)
+_FOOTFALL_COLUMNS = [0, 1, 3, 4, 5, 6]
+
+_HOUR = timedelta(hours=1)
+# 整点时段的结束时间与开始时间之差
+_SLOT_LENGTH = timedelta(seconds=3599)
+
+# 内存存储（未加载时为None，发布后不再修改，刷新时整体替换；_store_lock保护引用的读取和替换）：
+#   cameras: 摄像头名称列表，index: {摄像头名称: 行号}
+#   base: 第0小时（最早数据当天的0点），hours: 已使用的小时数
+#   counts: (统计列, 摄像头, 小时) 的计数数组，present: (摄像头, 小时) 是否有数据
+#   irregular: 不是单个整点时段的 (摄像头, 小时)，存在时改为查询数据库
+#   version: 加载时的数据版本，change_seq: 已读取的小时汇总表最新变化序号
+#   maintained: 汇总表刷新触发器是否已创建，未创建时小时汇总表可能落后于video_analysis，不使用存储
+_store = None
+_store_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+_COPY_SQL = """
+    COPY (
+        SELECT
+            COALESCE(cameras.idx, -1),
+            (EXTRACT(EPOCH FROM h.bucket - %s::timestamp) / 3600)::int,
+            (
+                h.slot_count = 1
+                AND h.min_start_time = h.bucket
+                AND h.max_end_time IS NOT DISTINCT FROM h.bucket + INTERVAL '3599 seconds'
+                AND h.camera_name <> ''
+            )::int,
+            {columns}
+        FROM video_analysis_hourly AS h
+        LEFT JOIN (VALUES {cameras}) AS cameras (camera_name, idx) USING (camera_name)
+        WHERE {condition}
+    ) TO STDOUT WITH (FORMAT csv)
+"""
+
+
+def _copy_cells(cur, cameras, base, condition="TRUE", params=()):
+    """
+    用COPY读取小时汇总表的行并解析为数组（比逐行fetch快一个数量级）
+    :param cur: 游标
+    :param cameras: 摄像头名称列表，不在其中的摄像头行号为-1
+    :param base: 第0小时
+    :param condition: 附加的WHERE条件
+    :param params: 条件的参数
+    :return: (摄像头行号, 小时, 是否整点时段, 计数(行数×统计列))
+    """
+    values = ", ".join(
+        cur.mogrify("(%s, %s)", (name, i)).decode() for i, name in enumerate(cameras)
+    )
+    sql = cur.mogrify(
+        _COPY_SQL.format(
+            columns=", ".join(f"h.{col}" for col in STORE_COLUMNS),
+            cameras=values,
+            condition=condition,
+        ),
+        (base, *params),
+    ).decode()
+
+    buf = io.StringIO()
+    cur.copy_expert(sql, buf)
+    text = buf.getvalue().replace("\n", ",").rstrip(",")
+    data = (
+        np.fromstring(text, dtype=np.int64, sep=",") if text else np.zeros(0, np.int64)
+    )
+    data = data.reshape(-1, 3 + len(STORE_COLUMNS))
+    return data[:, 0], data[:, 1], data[:, 2].astype(bool), data[:, 3:]
+
+
+def _apply_cells(store, cells, cleared=None):
+    """
+    将读取的行写入存储的副本，必要时扩大小时容量或计数类型
+    （已发布的存储可能正在被查询读取，不做修改）
+    :param cells: _copy_cells的返回值
+    :param cleared: 写入前清空的 (摄像头行号, 小时)（已变化的时间桶，其中已删除的不在cells中）
+    :return: 写入后的新存储，出现新摄像头或早于第0小时的数据时为None（需要重新加载）
+    """
+    cams, hours, regular, counts = cells
+    if len(cams) and (cams.min() < 0 or hours.min() < 0):
+        return None
+
+    # 使用能容纳全部计数的最小整数类型
+    dtype = store["counts"].dtype
+    if len(cams):
+        dtype = np.result_type(
+            dtype,
+            np.min_scalar_type(int(counts.min())),
+            np.min_scalar_type(int(counts.max())),
+        )
+
+    needed = int(hours.max()) + 1 if len(cams) else 0
+    capacity = store["counts"].shape[2]
+    if needed > capacity:
+        grow = max(needed - capacity, HOURLY_STORE_CONFIG["grow_hours"])
+        new_counts = np.pad(store["counts"], ((0, 0), (0, 0), (0, grow)))
+        new_counts = new_counts.astype(dtype, copy=False)
+        present = np.pad(store["present"], ((0, 0), (0, grow)))
+    else:
+        new_counts = store["counts"].astype(dtype)
+        present = store["present"].copy()
+
+    irregular = set(store["irregular"])
+    if cleared:
+        # 不在存储范围内的时间桶（未知摄像头或超出已用小时）原本就没有数据
+        cleared = [
+            (cam, hour)
+            for cam, hour in cleared
+            if 0 <= cam < present.shape[0] and 0 <= hour < present.shape[1]
+        ]
+    if cleared:
+        cleared_cams, cleared_hours = (np.array(axis) for axis in zip(*cleared))
+        new_counts[:, cleared_cams, cleared_hours] = 0
+        present[cleared_cams, cleared_hours] = False
+        irregular.difference_update(cleared)
+
+    new_counts[:, cams, hours] = counts.T
+    present[cams, hours] = True
+
+    if irregular:
+        irregular.difference_update(
+            zip(cams[regular].tolist(), hours[regular].tolist())
+        )
+    irregular.update(zip(cams[~regular].tolist(), hours[~regular].tolist()))
+    return dict(
+        store,
+        counts=new_counts,
+        present=present,
+        hours=max(store["hours"], needed),
+        irregular=irregular,
+    )
+
+
+def load_hourly_store():
+    """
+    从小时汇总表全量加载存储（使用独立连接，gunicorn主进程预加载时不创建连接池，
+    fork后的工作进程共享加载的数组）。小时汇总表由video_analysis上的触发器在同一事务中刷新，
+    触发器未创建（数据库未执行migrate_db）时不加载数据，查询改为读取数据库
+    :return: 存储
+    """
+    global _store
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        try:
+            # 两次查询读取同一快照
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            version = get_data_version(conn)
+            maintained = rollup_triggers_installed(conn)
+            if not maintained:
+                logger.error(
+                    "Rollup triggers on video_analysis are missing, "
+                    "run migrate_db.py; the hourly store is disabled"
+                )
+            cur.execute("""
+                SELECT camera_name, MIN(bucket) FROM video_analysis_hourly
+                GROUP BY camera_name
+                """)
+            rows = sorted(cur.fetchall())
+            cameras = [row[0] for row in rows]
+            base = (
+                min(row[1] for row in rows).replace(hour=0, minute=0, second=0)
+                if rows
+                else None
+            )
+            store = {
+                "cameras": cameras,
+                "index": {name: i for i, name in enumerate(cameras)},
+                "base": base,
+                "hours": 0,
+                "counts": np.zeros((len(STORE_COLUMNS), len(cameras), 0), np.uint8),
+                "present": np.zeros((len(cameras), 0), bool),
+                "irregular": set(),
+                "version": version,
+                "change_seq": version[3],
+                "maintained": maintained,
+            }
+            if cameras and maintained:
+                store = _apply_cells(store, _copy_cells(cur, cameras, base))
+        finally:
+            cur.close()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    with _store_lock:
+        _store = store
+    logger.info(
+        "Hourly store loaded: %s cameras, %s hours, %.1f MB",
+        len(store["cameras"]),
+        store["hours"],
+        _store_bytes(store) / 1024 / 1024,
+    )
+    return store
+
+
+def _refresh_store(store, version):
+    """
+    按小时汇总表的变化记录读取上次加载后变化（含删除）的 (摄像头, 小时)，
+    写入存储的副本后替换当前存储（读取期间不持有_store_lock，查询继续使用旧的存储）。
+    变化序号在汇总表刷新的咨询锁内按提交顺序分配，读取到的最大序号之前的变化都已提交，
+    长时间运行的导入事务提交后其变化序号仍大于已读取的序号，不会遗漏
+    :param version: sync_data_version返回的数据版本（用于判断下次是否需要刷新）
+    :return: 新的存储，需要全量重新加载时为None
+    """
+    global _store
+
+    if store["base"] is None or not store["maintained"]:
+        return None
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            # 变化记录和汇总表读取同一快照
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute(
+                """
+                SELECT camera_name, bucket, change_seq
+                FROM video_analysis_hourly_changes
+                WHERE change_seq > %s
+                ORDER BY change_seq
+                LIMIT %s
+                """,
+                (store["change_seq"], HOURLY_STORE_CONFIG["reload_cells"] + 1),
+            )
+            changes = cur.fetchall()
+            if len(changes) > HOURLY_STORE_CONFIG["reload_cells"]:
+                return None
+
+            cells = _copy_cells(
+                cur,
+                store["cameras"],
+                store["base"],
+                """(h.camera_name, h.bucket) IN (
+                    SELECT camera_name, bucket FROM video_analysis_hourly_changes
+                    WHERE change_seq > %s
+                )""",
+                (store["change_seq"],),
+            )
+        finally:
+            cur.close()
+        conn.rollback()
+
+    cleared = [
+        (store["index"].get(name, -1), (bucket - store["base"]) // _HOUR)
+        for name, bucket, _ in changes
+    ]
+    new_store = _apply_cells(store, cells, cleared)
+    if new_store is None:
+        return None
+    new_store["version"] = version
+    if changes:
+        new_store["change_seq"] = changes[-1][2]
+    with _store_lock:
+        _store = new_store
+    return new_store
+
+
+def _current_store():
+    """
+    返回与当前数据版本一致的存储（数据版本变化时先读取新导入的小时）。
+    存储发布后不再修改，刷新时替换为新的存储，查询直接读取取得的存储而无需持有锁
+    :return: 存储，未启用、无法加载、汇总表未由触发器维护或存在非整点时段的数据时为None
+    """
+    if not HOURLY_STORE_CONFIG["enabled"]:
+        return None
+
+    try:
+        version = sync_data_version()
+        with _store_lock:
+            store = _store
+        if store is None or store["version"] != version:
+            # 同一时间只有一个线程刷新或全量加载，其他线程等待后使用新的存储
+            with _load_lock:
+                with _store_lock:
+                    store = _store
+                if store is not None and store["version"] != version:
+                    store = _refresh_store(store, version)
+                if store is None:
+                    store = load_hourly_store()
+    except psycopg2.Error:
+        logger.exception("Failed to refresh the hourly store")
+        return None
+
+    return store if store["maintained"] and not store["irregular"] else None
+
+
+def init_hourly_store():
+    """启用时在启动时加载存储（数据库暂不可用时改为第一次查询时加载）"""
+    if not HOURLY_STORE_CONFIG["enabled"]:
+        return
+    try:
+        load_hourly_store()
+    except psycopg2.Error:
+        logger.exception("Failed to load the hourly store")
+
+
+def _store_bytes(store):
+    """存储数组占用的内存（字节）"""
+    return store["counts"].nbytes + store["present"].nbytes
+
+
+def get_hourly_store_metrics():
+    """
+    存储的摄像头数、小时数和内存占用
+    :return: 字典，未加载时只有enabled
+    """
+    metrics = {"enabled": HOURLY_STORE_CONFIG["enabled"]}
+    with _store_lock:
+        store = _store
+        if store is not None:
+            metrics.update(
+                cameras=len(store["cameras"]),
+                hours=store["hours"],
+                start=store["base"].isoformat() if store["base"] else None,
+                dtype=str(store["counts"].dtype),
+                bytes=_store_bytes(store),
+                irregular=len(store["irregular"]),
+                maintained=store["maintained"],
+            )
+    return metrics
+
+
+def _hour_range(store, date_start, date_end):
+    """
+    与rollup_source相同的范围语义：开始时间不早于date_start且结束时间不晚于date_end的整点时段
+    :return: 小时区间 [lo, hi)，日期无法解析时为None
+    """
+    start = parse_timestamp(date_start)
+    end = parse_timestamp(date_end)
+    if start is None or end is None or start.tzinfo or end.tzinfo:
+        return None
+    if store["base"] is None:
+        return 0, 0
+
+    lo = max(-((store["base"] - start) // _HOUR), 0)
+    hi = min((end + timedelta(seconds=1) - store["base"]) // _HOUR, store["hours"])
+    return lo, max(hi, lo)
+
+
+def _format_hour(store, hour, count):
+    """格式化整点时段（与SQL中TO_CHAR的格式一致）"""
+    start = store["base"] + hour * _HOUR
+    return format_period(start, start + _SLOT_LENGTH, count)
+
+
+def _peak_and_low(store, in_counts, present, hours):
+    """
+    有数据的时段中进入人数最多和最少的时段（人数相同时取较早的时段）
+    :param in_counts: 进入人数（一维）
+    :param present: 是否有数据（一维）
+    :param hours: 每个元素对应的小时
+    :return: (高峰时段, 低峰时段)，无数据时为 "N/A"
+    """
+    if not present.any():
+        return "N/A", "N/A"
+    in_counts = in_counts.astype(np.int64)
+    peak = int(np.argmax(np.where(present, in_counts, np.iinfo(np.int64).min)))
+    low = int(np.argmin(np.where(present, in_counts, np.iinfo(np.int64).max)))
+    return (
+        _format_hour(store, int(hours[peak]), in_counts[peak]),
+        _format_hour(store, int(hours[low]), in_counts[low]),
+    )
+
+
+def _overall_periods(store, lo, hi):
+    """全部摄像头中进入人数最多和最少的时段"""
+    # 按 (小时, 摄像头) 展开，人数相同时取较早的时段
+    in_counts = store["counts"][_IN, :, lo:hi].T.ravel()
+    present = store["present"][:, lo:hi].T.ravel()
+    hours = np.repeat(np.arange(lo, hi), len(store["cameras"]))
+    return _peak_and_low(store, in_counts, present, hours)
+
+
+def get_range_sums(date_start, date_end):
+    """
+    时间范围内每个摄像头及整体的汇总行（同get_range_camera_sums）
+    :return: {摄像头名称: 汇总行, None: 整体汇总行}，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    lo, hi = hour_range
+
+    sums = store["counts"][:, :, lo:hi].sum(axis=2, dtype=np.int64)
+    has_data = store["present"][:, lo:hi].any(axis=1)
+    result = {
+        name: tuple(sums[:, i].tolist())
+        for i, name in enumerate(store["cameras"])
+        if has_data[i]
+    }
+    result[None] = tuple(sums.sum(axis=1).tolist())
+    return result
+
+
+def get_range_totals(date_start, date_end):
+    """
+    时间范围内全部摄像头的汇总行
+    :return: (total_people, total_in, total_out, male, female, minor, unknown_gender)，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    lo, hi = hour_range
+    return tuple(store["counts"][:, :, lo:hi].sum(axis=(1, 2), dtype=np.int64).tolist())
+
+
+def get_range_periods(date_start, date_end):
+    """
+    时间范围内每个摄像头及整体的高峰/低峰时段（同get_range_camera_periods）
+    :return: {摄像头名称: (高峰时段, 低峰时段), None: 整体的(高峰时段, 低峰时段)}，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    lo, hi = hour_range
+
+    hours = np.arange(lo, hi)
+    periods = {}
+    for i, name in enumerate(store["cameras"]):
+        present = store["present"][i, lo:hi]
+        if present.any():
+            periods[name] = _peak_and_low(
+                store, store["counts"][_IN, i, lo:hi], present, hours
+            )
+    periods[None] = _overall_periods(store, lo, hi)
+    return periods
+
+
+def get_overall_periods(date_start, date_end):
+    """
+    时间范围内全部摄像头中进入人数最多和最少的时段（同get_peak_and_low_periods）
+    :return: (高峰时段, 低峰时段)，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    return _overall_periods(store, *hour_range)
+
+
+def get_camera_summary(cam_name, date_start, date_end):
+    """
+    摄像头的汇总行和高峰/低峰时段（同get_camera_stats的查询；
+    cam_name为None时汇总全部摄像头，与SQL中 camera_name = NULL 一致，高峰/低峰时段为 "N/A"）
+    :return: (汇总行, 高峰时段, 低峰时段)，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    lo, hi = hour_range
+
+    if cam_name is None:
+        row = store["counts"][:, :, lo:hi].sum(axis=(1, 2), dtype=np.int64)
+        return tuple(row.tolist()), "N/A", "N/A"
+
+    i = store["index"].get(cam_name)
+    if i is None:
+        return (0,) * len(STORE_COLUMNS), "N/A", "N/A"
+    row = store["counts"][:, i, lo:hi].sum(axis=1, dtype=np.int64)
+    peak_period, low_period = _peak_and_low(
+        store,
+        store["counts"][_IN, i, lo:hi],
+        store["present"][i, lo:hi],
+        np.arange(lo, hi),
+    )
+    return tuple(row.tolist()), peak_period, low_period
+
+
+def get_zone_periods(date_start, date_end, zones):
+    """
+    各区域的高峰/低峰时段（同zones.get_zone_periods）
+    :param zones: {名称: 区域定义}
+    :return: {名称: (高峰时段, 低峰时段)}，存储不可用时为None
+    """
+    store = _current_store()
+    hour_range = store and _hour_range(store, date_start, date_end)
+    if hour_range is None:
+        return None
+    lo, hi = hour_range
+
+    hours = np.arange(lo, hi)
+    periods = {}
+    for name, zone in zones.items():
+        # 同一摄像头只按第一次出现的方向计入（与SQL中CASE的匹配顺序一致）
+        members = {}
+        for cam, sign in zone["members"]:
+            members.setdefault(cam, sign)
+
+        counts = np.zeros(hi - lo, np.int64)
+        cameras = np.zeros(hi - lo, np.int64)
+        for cam, sign in members.items():
+            i = store["index"].get(cam)
+            if i is None:
+                continue
+            counts += store["counts"][_IN if sign > 0 else _OUT, i, lo:hi]
+            cameras += store["present"][i, lo:hi]
+
+        if zone.get("require_all"):
+            valid = cameras == len(members)
+        else:
+            valid = cameras > 0
+        periods[name] = _peak_and_low(store, counts, valid, hours)
+    return periods
+
+
+def get_footfall_totals(range_start, range_end):
+    """
+    按日/周/月/季度汇总 [range_start, range_end) 内的人数（同build_footfall_distribution的查询）
+    :param range_start: 开始日期
+    :param range_end: 结束日期（不含）
+    :return: {(粒度, 分组开始日期): (total_people, total_in, male, female, minor, unknown_gender)}，
+        存储不可用时为None
+    """
+    store = _current_store()
+    if store is None:
+        return None
+    if store["base"] is None:
+        return {}
+
+    base_day = store["base"].date()
+    day_lo = max((range_start - base_day).days, 0)
+    day_hi = min((range_end - base_day).days, -(-store["hours"] // 24))
+    if day_lo >= day_hi:
+        return {}
+
+    # 按天汇总：(统计列, 天)，最后一天不足24小时的部分补零
+    lo, hi = day_lo * 24, min(day_hi * 24, store["hours"])
+    padding = day_hi * 24 - hi
+    hourly = store["counts"][_FOOTFALL_COLUMNS, :, lo:hi].sum(axis=1, dtype=np.int64)
+    daily = np.pad(hourly, ((0, 0), (0, padding))).reshape(
+        len(_FOOTFALL_COLUMNS), -1, 24
+    )
+    daily = daily.sum(axis=2).T.tolist()
+    has_data = store["present"][:, lo:hi].any(axis=0)
+    has_data = np.pad(has_data, (0, padding)).reshape(-1, 24).any(axis=1)
+
+    totals = {}
+    for offset in np.flatnonzero(has_data).tolist():
+        day = base_day + timedelta(days=day_lo + offset)
+        for key in (
+            ("day", day),
+            ("week", day - timedelta(days=day.weekday())),
+            ("month", day.replace(day=1)),
+            ("quarter", day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)),
+        ):
+            row = totals.get(key)
+            totals[key] = (
+                daily[offset]
+                if row is None
+                else [a + b for a, b in zip(row, daily[offset])]
+            )
+    return {key: tuple(row) for key, row in totals.items()}
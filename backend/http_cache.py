@@ -0,0 +1,275 @@
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, send_from_directory
+from werkzeug.security import safe_join
+
+from cache import sync_data_version
+from config import ASSETS_CONFIG, HTTP_CACHE_CONFIG
+
+# brotli为可选依赖（pip install brotli），未安装时只使用gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 可压缩的响应类型（图片等已压缩的格式不再压缩）
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+    "image/svg+xml",
+}
+
+# 预压缩文件：编码 -> 文件后缀，按优先顺序排列
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# 带内容哈希的静态文件（相对于static_folder的路径），内容变化时文件名随之变化，可长期缓存
+_immutable_files = frozenset()
+
+
+def _compress(data, encoding, best=False):
+    """
+    按编码压缩数据
+    :param data: 原始字节
+    :param encoding: "br" 或 "gzip"
+    :param best: 是否使用最高压缩级别（预压缩静态文件时只压缩一次，使用最高级别）
+    :return: 压缩后的字节
+    """
+    if encoding == "br":
+        quality = 11 if best else HTTP_CACHE_CONFIG["brotli_quality"]
+        return brotli.compress(data, quality=quality)
+    # mtime固定为0，相同内容得到相同的压缩结果
+    level = 9 if best else HTTP_CACHE_CONFIG["gzip_level"]
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _available_encodings():
+    """当前环境支持的压缩编码，按优先顺序排列"""
+    return [
+        encoding
+        for encoding in PRECOMPRESSED_SUFFIXES
+        if encoding != "br" or brotli is not None
+    ]
+
+
+def choose_encoding(encodings=None):
+    """
+    按请求头Accept-Encoding选择压缩编码
+    :param encodings: 可选的编码（按优先顺序），默认为当前环境支持的全部编码
+    :return: 编码，客户端不接受压缩时为None
+    """
+    if encodings is None:
+        encodings = _available_encodings()
+    for encoding in encodings:
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compute_etag(*parts):
+    """
+    由当前数据版本和请求参数计算ETag（数据未变化且参数相同时结果相同，无需执行统计查询）
+    :param parts: 请求参数等可JSON序列化的值
+    :return: ETag值（不含引号）
+    """
+    payload = json.dumps([sync_data_version(), parts], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def conditional(make_key):
+    """
+    条件响应装饰器：请求头If-None-Match与当前ETag一致时直接返回304，不调用视图函数；
+    否则调用视图函数并在200响应上设置ETag（响应内容可能被压缩，使用弱ETag）
+    :param make_key: 无参数函数，由当前请求返回决定响应内容的参数
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            try:
+                etag = compute_etag(make_key())
+            except Exception:
+                # 参数无法解析时交给视图函数返回错误
+                return view(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # 浏览器可以保存结果，但每次使用前都需要用ETag重新验证
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def _compress_response(response):
+    """压缩较大的动态响应（流式响应、文件响应和已编码的响应除外）"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < HTTP_CACHE_CONFIG["min_size"]:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(_compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _fresh_variant(path, encoding):
+    """
+    静态文件的预压缩文件（存在且不早于原文件时）
+    :param path: 原文件路径
+    :param encoding: 编码
+    :return: 预压缩文件路径，不可用时为None
+    """
+    variant = path + PRECOMPRESSED_SUFFIXES[encoding]
+    if os.path.isfile(variant) and os.path.getmtime(variant) >= os.path.getmtime(path):
+        return variant
+    return None
+
+
+def _set_immutable(response):
+    """带内容哈希的文件：浏览器长期缓存且不再重新验证"""
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSETS_CONFIG["immutable_max_age"]
+    response.cache_control.immutable = True
+    return response
+
+
+def send_static(filename):
+    """
+    发送静态文件：客户端接受压缩且磁盘上有预压缩文件（.br/.gz）时直接发送预压缩文件；
+    ETag和304由send_from_directory按实际发送的文件处理，带内容哈希的文件设置长期缓存
+    :param filename: 相对于static_folder的路径
+    :return: 响应
+    """
+    app = current_app
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    if mimetype in COMPRESSIBLE_MIMETYPES:
+        variants = {
+            encoding: _fresh_variant(path, encoding)
+            for encoding in PRECOMPRESSED_SUFFIXES
+        }
+        encoding = choose_encoding(
+            [name for name, variant in variants.items() if variant]
+        )
+
+    if encoding is None:
+        response = app.send_static_file(filename)
+    else:
+        response = send_from_directory(
+            app.static_folder,
+            filename + PRECOMPRESSED_SUFFIXES[encoding],
+            mimetype=mimetype,
+            max_age=app.get_send_file_max_age(filename),
+        )
+        response.headers["Content-Encoding"] = encoding
+    if mimetype in COMPRESSIBLE_MIMETYPES:
+        response.vary.add("Accept-Encoding")
+    if filename in _immutable_files:
+        _set_immutable(response)
+    return response
+
+
+def init_http_cache(app, immutable_files=()):
+    """
+    为Flask应用注册响应压缩，并让静态文件优先发送预压缩文件
+    （应在其他修改响应内容的after_request钩子之前调用，使压缩最后执行）
+    :param app: Flask应用
+    :param immutable_files: 带内容哈希的静态文件（相对于static_folder的路径，见build_assets.py）
+    """
+    global _immutable_files
+
+    _immutable_files = frozenset(immutable_files)
+    app.after_request(_compress_response)
+    if app.static_folder and "static" in app.view_functions:
+        app.view_functions["static"] = send_static
+
+
+def precompress_static(root, min_size=None):
+    """
+    为目录下的可压缩文件生成预压缩文件（.gz，已安装brotli时同时生成.br），
+    已有且不早于原文件的预压缩文件跳过，压缩后不小于原文件的不生成
+    :param root: 静态文件目录
+    :param min_size: 小于该大小的文件不压缩，默认取HTTP_CACHE_CONFIG
+    :return: 生成的文件路径列表
+    """
+    if min_size is None:
+        min_size = HTTP_CACHE_CONFIG["min_size"]
+    suffixes = tuple(PRECOMPRESSED_SUFFIXES.values())
+    written = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.endswith(suffixes) or os.path.getsize(path) < min_size:
+                continue
+            if mimetypes.guess_type(name)[0] not in COMPRESSIBLE_MIMETYPES:
+                continue
+
+            data = None
+            for encoding in _available_encodings():
+                if _fresh_variant(path, encoding):
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                compressed = _compress(data, encoding, best=True)
+                if len(compressed) >= len(data):
+                    continue
+                variant = path + PRECOMPRESSED_SUFFIXES[encoding]
+                with open(variant, "wb") as f:
+                    f.write(compressed)
+                written.append(variant)
+    return written
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="为前端静态文件生成预压缩文件")
+    parser.add_argument(
+        "root",
+        nargs="?",
+        default=os.path.normpath(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
+        ),
+        help="静态文件目录，默认为frontend",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    written = precompress_static(args.root)
+    print(f"已生成 {len(written)} 个预压缩文件")
@@ -0,0 +1,235 @@
+import csv
+import io
+from datetime import timedelta
+
+from common import parse_timestamp
+from config import INGEST_CONFIG
+from live import notify_data_change
+from partitions import ensure_partitions
+
+# 导入接口接受的字段：文本字段 -> (默认值（None表示必填）, 最大长度)；计数字段均为必填的非负整数
+INGEST_TEXT_FIELDS = {
+    "video_name": (None, 50),
+    "camera_name": (None, 20),
+    "detection_method": ("horizontal_a", 50),
+}
+INGEST_COUNT_FIELDS = [
+    "total_people",
+    "in_count",
+    "out_count",
+    "male_count",
+    "female_count",
+    "unknown_gender_count",
+    "adult_count",
+    "minor_count",
+    "unknown_age_count",
+]
+DEFAULT_LINE_POSITION = 0.5
+
+# 写入暂存表及video_analysis的列（analysis_id由序列生成，analysis_time取导入时间）
+INGEST_COLUMNS = [
+    "run_id",
+    "video_name",
+    "camera_name",
+    "start_time",
+    "end_time",
+    *INGEST_COUNT_FIELDS,
+    "detection_method",
+    "line_position",
+]
+
+
+def _validate_row(index, row, run_id):
+    """
+    校验并转换一行导入数据
+    :param index: 行号（用于错误信息）
+    :param row: 请求中的一行（dict）
+    :param run_id: 批次ID
+    :return: 按INGEST_COLUMNS顺序排列的元组
+    """
+    if not isinstance(row, dict):
+        raise ValueError(f"rows[{index}]: must be an object")
+
+    values = {"run_id": run_id}
+    for field, (default, max_length) in INGEST_TEXT_FIELDS.items():
+        value = row.get(field, default)
+        if not isinstance(value, str) or not value or len(value) > max_length:
+            raise ValueError(
+                f"rows[{index}].{field}: must be a non-empty string "
+                f"of at most {max_length} characters"
+            )
+        values[field] = value
+
+    for field in ("start_time", "end_time"):
+        value = parse_timestamp(row.get(field))
+        if value is None:
+            raise ValueError(f"rows[{index}].{field}: invalid timestamp")
+        # video_analysis使用不带时区的timestamp列，带时区的值写入时会丢失偏移
+        if value.tzinfo is not None:
+            raise ValueError(
+                f"rows[{index}].{field}: must be a local time without a UTC offset"
+            )
+        values[field] = value.replace(microsecond=0)
+    # 汇总表按start_time所在小时归类，时段不能跨越整点
+    hour_end = values["start_time"].replace(minute=0, second=0) + timedelta(hours=1)
+    if not values["start_time"] <= values["end_time"] < hour_end:
+        raise ValueError(
+            f"rows[{index}].end_time: must be within the hour of start_time"
+        )
+
+    for field in INGEST_COUNT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"rows[{index}].{field}: must be a non-negative integer")
+        values[field] = value
+
+    line_position = row.get("line_position", DEFAULT_LINE_POSITION)
+    if (
+        isinstance(line_position, bool)
+        or not isinstance(line_position, (int, float))
+        or not 0 <= line_position <= 1
+    ):
+        raise ValueError(f"rows[{index}].line_position: must be between 0 and 1")
+    values["line_position"] = round(line_position, 2)
+
+    return tuple(values[column] for column in INGEST_COLUMNS)
+
+
+def validate_ingest_rows(run_id, rows):
+    """
+    校验一批导入数据：字段类型与范围，以及批次内(camera_name, start_time)不重复
+    :param run_id: 批次ID
+    :param rows: 请求中的数据行列表
+    :return: 按INGEST_COLUMNS顺序排列的元组列表
+    """
+    if isinstance(run_id, bool) or not isinstance(run_id, int) or run_id <= 0:
+        raise ValueError("run_id must be a positive integer")
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("rows must be a non-empty list")
+    if len(rows) > INGEST_CONFIG["max_rows"]:
+        raise ValueError(f"At most {INGEST_CONFIG['max_rows']} rows per request")
+
+    camera_index = INGEST_COLUMNS.index("camera_name")
+    start_index = INGEST_COLUMNS.index("start_time")
+    seen = {}
+    values = []
+    for index, row in enumerate(rows):
+        value = _validate_row(index, row, run_id)
+        key = (value[camera_index], value[start_index])
+        if key in seen:
+            raise ValueError(
+                f"rows[{index}]: duplicate camera_name and start_time "
+                f"(same as rows[{seen[key]}])"
+            )
+        seen[key] = index
+        values.append(value)
+    return values
+
+
+def ingest_video_analysis(conn, run_id, values, folder_path=None, total_videos=None):
+    """
+    在一个事务中导入一批分析结果：COPY写入临时暂存表，
+    再按(camera_name, start_time)一次性upsert到video_analysis（内容未变的行不更新），
+    最后发出数据变化通知（提交事务；重复发送同一批数据结果不变）。
+    缺少的月分区先在单独的短事务中创建（挂载分区会锁住video_analysis，不能持续到整批写入结束）。
+    小时/日汇总由video_analysis上的语句级触发器刷新，只重新计算本次upsert实际写入的行所在的时间桶
+    :param conn: 数据库连接
+    :param run_id: 批次ID
+    :param values: validate_ingest_rows 的返回值
+    :param folder_path: 批次的视频目录，提供时同时写入run_records
+    :param total_videos: 批次的视频数量
+    :return: {"inserted", "updated", "unchanged", "partitions_created"}
+    """
+    columns = ", ".join(INGEST_COLUMNS)
+    start_index = INGEST_COLUMNS.index("start_time")
+    # 冲突时只更新内容有变化的行，重复发送不产生新的行版本
+    changed = " OR ".join(
+        f"video_analysis.{column} IS DISTINCT FROM EXCLUDED.{column}"
+        for column in INGEST_COLUMNS
+    )
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in INGEST_COLUMNS + ["analysis_time"]
+    )
+
+    first = min(value[start_index] for value in values)
+    last = max(value[start_index] for value in values)
+
+    cur = conn.cursor()
+
+    try:
+        partitions_created = ensure_partitions(conn, first, last)
+        conn.commit()
+
+        if folder_path is not None:
+            cur.execute(
+                """
+                INSERT INTO run_records (run_id, folder_path, total_videos)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (run_id) DO UPDATE
+                SET folder_path = EXCLUDED.folder_path,
+                    total_videos = EXCLUDED.total_videos
+                """,
+                (run_id, folder_path, total_videos or 0),
+            )
+            # 指定了run_id时序列不会前进，保证之后由序列生成的run_id不重复
+            cur.execute("""
+                SELECT setval(
+                    'run_records_run_id_seq',
+                    GREATEST(
+                        (SELECT MAX(run_id) FROM run_records),
+                        (SELECT last_value FROM run_records_run_id_seq)
+                    )
+                )
+                """)
+
+        cur.execute(f"""
+            CREATE TEMP TABLE video_analysis_staging ON COMMIT DROP AS
+            SELECT {columns} FROM video_analysis WITH NO DATA
+            """)
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(values)
+        buffer.seek(0)
+        cur.copy_expert(
+            f"COPY video_analysis_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+        # 已存在的行数（分区表不支持RETURNING xmax区分插入和更新）；
+        # 时间范围使用常量参数，规划时即可裁剪到涉及的月分区
+        cur.execute(
+            """
+            SELECT COUNT(*)
+            FROM video_analysis_staging AS staging
+            JOIN video_analysis USING (camera_name, start_time)
+            WHERE video_analysis.start_time >= %s AND video_analysis.start_time <= %s
+            """,
+            (first, last),
+        )
+        existing = cur.fetchone()[0]
+
+        cur.execute(f"""
+            INSERT INTO video_analysis ({columns}, analysis_time)
+            SELECT {columns}, CURRENT_TIMESTAMP(0) FROM video_analysis_staging
+            ON CONFLICT (camera_name, start_time) DO UPDATE SET {updates}
+            WHERE {changed}
+            """)
+        inserted = len(values) - existing
+        updated = cur.rowcount - inserted
+
+        # 提交后各进程的监听线程收到通知，刷新缓存并向浏览器推送变化
+        end_index = INGEST_COLUMNS.index("end_time")
+        notify_data_change(
+            cur, run_id, first, max(value[end_index] for value in values)
+        )
+        conn.commit()
+        return {
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": existing - updated,
+            "partitions_created": partitions_created,
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
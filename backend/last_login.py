@@ -0,0 +1,125 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from common import db_connection
+from config import LAST_LOGIN_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 尚未写入数据库的最后登录时间：user_id -> 时间（同一用户只保留最新的一次）
+_pending = {}
+_pending_lock = threading.Lock()
+
+# 每个进程一个定期写入的线程，第一次记录时启动
+_flusher = None
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _merge(pending, user_id, login_time):
+    """将登录时间合并到待写入的记录（调用方需持有_pending_lock）"""
+    current = pending.get(user_id)
+    if current is None or login_time > current:
+        pending[user_id] = login_time
+
+
+def record_login(user_id, login_time=None):
+    """
+    记录用户的最后登录时间，由后台线程定期批量写入数据库
+    :param user_id: 用户ID
+    :param login_time: 登录时间，默认为当前时间
+    """
+    if login_time is None:
+        login_time = datetime.now().replace(microsecond=0)
+    _ensure_flusher()
+    with _pending_lock:
+        _merge(_pending, user_id, login_time)
+
+
+def get_pending_login(user_id):
+    """
+    本进程中尚未写入数据库的最后登录时间
+    :param user_id: 用户ID
+    :return: 时间，没有时为None
+    """
+    with _pending_lock:
+        return _pending.get(user_id)
+
+
+def flush_last_logins():
+    """
+    将待写入的最后登录时间用一条UPDATE ... FROM (VALUES ...)批量写入数据库
+    （只会把时间往后更新；写入失败时放回待写入记录，下次重试）
+    :return: 写入的用户数
+    """
+    global _pending
+
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    rows = sorted(pending.items())
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                # 最后登录时间丢失一次的影响很小，不等待WAL刷盘
+                cur.execute("SET LOCAL synchronous_commit TO OFF")
+                execute_values(
+                    cur,
+                    """
+                    UPDATE users
+                    SET last_login = pending.last_login
+                    FROM (VALUES %s) AS pending (id, last_login)
+                    WHERE users.id = pending.id
+                        AND (users.last_login IS NULL OR users.last_login < pending.last_login)
+                    """,
+                    rows,
+                    template="(%s, %s::timestamp)",
+                    page_size=len(rows),
+                )
+                conn.commit()
+            finally:
+                cur.close()
+    except psycopg2.Error:
+        logger.exception("Failed to flush last login times for %s users", len(rows))
+        with _pending_lock:
+            for user_id, login_time in rows:
+                _merge(_pending, user_id, login_time)
+        return 0
+    return len(rows)
+
+
+def _flush_periodically():
+    """定期写入线程"""
+    while True:
+        time.sleep(LAST_LOGIN_CONFIG["flush_interval"])
+        try:
+            flush_last_logins()
+        except Exception:
+            logger.exception("Last login flusher failed")
+
+
+def _ensure_flusher():
+    """启动本进程的定期写入线程（fork后的子进程会重新启动）"""
+    global _flusher, _flusher_pid
+
+    with _flusher_lock:
+        if _flusher is None or _flusher_pid != os.getpid() or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_periodically, name="last-login-flusher", daemon=True
+            )
+            _flusher.start()
+            _flusher_pid = os.getpid()
+
+
+# 进程正常退出时写入剩余的记录（gunicorn工作进程在worker_exit钩子中关闭连接池之前写入）
+atexit.register(flush_last_logins)
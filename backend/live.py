@@ -0,0 +1,294 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from cache import invalidate_cache
+from common import get_dedicated_connection, parse_timestamp
+from config import LIVE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 导入新数据后发出通知的频道，负载为 {"run_id", "date_start", "date_end"}
+LIVE_CHANNEL = "video_analysis_changed"
+
+# 订阅：key -> {"ranges": 查询的时间范围, "compute": 计算函数,
+#               "payload": 最近一次推送（或订阅时）的结果, "queues": 各浏览器连接的消息队列,
+#               "running": 是否正在重新计算, "stale": 计算期间数据又有变化，完成后需再计算一次}
+# 同一查询条件的所有浏览器共用一个订阅，每次数据变化只计算一次；各字段由_subscriptions_lock保护
+_subscriptions = {}
+_subscriptions_lock = threading.Lock()
+
+# 每个进程一个监听线程，第一个订阅时启动；
+# 重新计算在单独的线程池中执行，监听线程只负责读取通知
+_listener = None
+_recompute_executor = None
+_listener_lock = threading.Lock()
+
+
+def notify_data_change(cur, run_id, date_start, date_end):
+    """
+    在导入事务中发出数据变化通知（事务提交后才送达，回滚时不送达）
+    :param cur: 导入事务的游标
+    :param run_id: 批次ID
+    :param date_start: 变化数据的最早开始时间
+    :param date_end: 变化数据的最晚结束时间
+    """
+    cur.execute(
+        "SELECT pg_notify(%s, %s)",
+        (
+            LIVE_CHANNEL,
+            json.dumps(
+                {
+                    "run_id": run_id,
+                    "date_start": date_start.isoformat(sep=" "),
+                    "date_end": date_end.isoformat(sep=" "),
+                }
+            ),
+        ),
+    )
+
+
+def _merge_changes(changes):
+    """
+    合并一次收到的多条通知
+    :param changes: 通知负载列表，None表示范围未知（如监听连接重连期间可能漏掉通知）
+    :return: (date_start, date_end)，范围未知时为None
+    """
+    if any(change is None for change in changes):
+        return None
+    starts = [parse_timestamp(change.get("date_start")) for change in changes]
+    ends = [parse_timestamp(change.get("date_end")) for change in changes]
+    if None in starts or None in ends:
+        return None
+    return min(starts), max(ends)
+
+
+def _overlaps(ranges, changed):
+    """
+    订阅的时间范围（本期及对比期）是否与变化的数据重叠
+    :param ranges: (date_start, date_end, ref_date_start, ref_date_end)
+    :param changed: _merge_changes 的返回值
+    """
+    if changed is None:
+        return True
+    changed_start, changed_end = changed
+    for date_start, date_end in zip(ranges[::2], ranges[1::2]):
+        start = parse_timestamp(date_start)
+        end = parse_timestamp(date_end)
+        if (
+            start is None
+            or end is None
+            or (start <= changed_end and end >= changed_start)
+        ):
+            return True
+    return False
+
+
+def _recompute(key, subscription):
+    """
+    重新计算一个订阅，只向浏览器推送结果有变化的部分；
+    计算期间数据又有变化时再计算一次（同一订阅不会同时计算，推送顺序与数据变化顺序一致）
+    :param key: 订阅键
+    :param subscription: 订阅
+    """
+    while True:
+        try:
+            payload = subscription["compute"](*subscription["ranges"])
+        except Exception:
+            logger.exception("Failed to recompute live subscription %s", key)
+            payload = None
+
+        message = None
+        with _subscriptions_lock:
+            if payload is not None:
+                previous = subscription["payload"] or {}
+                delta = {
+                    part: value
+                    for part, value in payload.items()
+                    if previous.get(part) != value
+                }
+                subscription["payload"] = payload
+                if delta:
+                    message = json.dumps(delta, default=str)
+                    queues = list(subscription["queues"])
+            rerun = subscription["stale"]
+            subscription["stale"] = False
+            subscription["running"] = rerun
+
+        if message is not None:
+            for messages in queues:
+                messages.put(message)
+        if not rerun:
+            return
+
+
+def _publish(changed):
+    """
+    数据变化后清空本进程的查询缓存，将受影响的订阅交给线程池重新计算
+    （正在计算的订阅标记为完成后再计算一次）
+    :param changed: _merge_changes 的返回值
+    """
+    invalidate_cache()
+
+    with _subscriptions_lock:
+        submit = []
+        for key, subscription in _subscriptions.items():
+            if not _overlaps(subscription["ranges"], changed):
+                continue
+            if subscription["running"]:
+                subscription["stale"] = True
+            else:
+                subscription["running"] = True
+                submit.append((key, subscription))
+
+    for key, subscription in submit:
+        _recompute_executor.submit(_recompute, key, subscription)
+
+
+def _listen():
+    """
+    监听线程：使用独立的长连接LISTEN，收到通知后合并同一时刻的多条通知再处理；
+    连接断开时等待后重连，重连后按范围未知处理（可能漏掉了通知）
+    """
+    missed = False
+    while True:
+        conn = None
+        try:
+            conn = get_dedicated_connection()
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {LIVE_CHANNEL}")
+            cur.close()
+            if missed:
+                _publish(None)
+
+            while True:
+                readable, _, _ = select.select([conn], [], [], LIVE_CONFIG["keepalive"])
+                if not readable:
+                    continue
+                conn.poll()
+                changes = []
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        changes.append(json.loads(notify.payload))
+                    except ValueError:
+                        changes.append(None)
+                if changes:
+                    _publish(_merge_changes(changes))
+        except (psycopg2.Error, OSError):
+            logger.exception("Live update listener disconnected")
+            missed = True
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(LIVE_CONFIG["reconnect_delay"])
+
+
+def _ensure_listener():
+    """启动本进程的监听线程（fork后的子进程会重新启动）"""
+    global _listener, _recompute_executor
+
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _recompute_executor = ThreadPoolExecutor(
+                max_workers=LIVE_CONFIG["recompute_workers"],
+                thread_name_prefix="live-recompute",
+            )
+            _listener = threading.Thread(
+                target=_listen, name="live-listener", daemon=True
+            )
+            _listener.start()
+
+
+def subscribe(key, ranges, compute, payload=None):
+    """
+    订阅一个查询条件的实时更新
+    :param key: 订阅键（同一查询条件相同）
+    :param ranges: 传给compute的参数 (date_start, date_end, ref_date_start, ref_date_end)
+    :param compute: 计算函数，返回 {部分: 值}
+    :param payload: 浏览器当前显示的结果（用于计算第一次推送的变化部分），未知时为None
+    :return: 消息队列，超过订阅上限时为None
+    """
+    _ensure_listener()
+    messages = queue.Queue()
+    with _subscriptions_lock:
+        if (
+            sum(len(s["queues"]) for s in _subscriptions.values())
+            >= LIVE_CONFIG["max_subscribers"]
+        ):
+            return None
+        subscription = _subscriptions.setdefault(
+            key,
+            {
+                "ranges": ranges,
+                "compute": compute,
+                "payload": payload,
+                "queues": set(),
+                "running": False,
+                "stale": False,
+            },
+        )
+        subscription["queues"].add(messages)
+    return messages
+
+
+def unsubscribe(key, messages):
+    """
+    取消订阅，查询条件没有浏览器订阅时删除
+    :param key: 订阅键
+    :param messages: subscribe 返回的消息队列
+    """
+    with _subscriptions_lock:
+        subscription = _subscriptions.get(key)
+        if subscription is None:
+            return
+        subscription["queues"].discard(messages)
+        if not subscription["queues"]:
+            del _subscriptions[key]
+
+
+def stream_events(key, ranges, compute, payload=None, event="dashboard"):
+    """
+    Server-Sent Events 文本生成器：开始迭代时订阅，推送变化的部分，空闲时定期发送注释行保持连接；
+    浏览器断开时生成器被关闭，随之取消订阅（参数同subscribe）
+    :param event: 事件名
+    :return: 文本块生成器
+    """
+    messages = subscribe(key, ranges, compute, payload)
+    # 超过订阅上限时结束本次连接，浏览器在retry间隔后重连
+    yield f"retry: {LIVE_CONFIG['retry_ms']}\n\n"
+    if messages is None:
+        return
+
+    try:
+        while True:
+            try:
+                message = messages.get(timeout=LIVE_CONFIG["keepalive"])
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event}\ndata: {message}\n\n"
+    finally:
+        unsubscribe(key, messages)
+
+
+def get_live_metrics():
+    """
+    实时更新的订阅情况
+    :return: {"subscriptions": 不同查询条件数, "connections": 浏览器连接数, "listening": 监听线程是否运行}
+    """
+    with _subscriptions_lock:
+        connections = sum(len(s["queues"]) for s in _subscriptions.values())
+        count = len(_subscriptions)
+    return {
+        "subscriptions": count,
+        "connections": connections,
+        "listening": _listener is not None and _listener.is_alive(),
+    }
@@ -0,0 +1,411 @@
+import json
+from datetime import timedelta
+
+from psycopg2 import extensions
+
+from common import (
+    TIME_RANGE_SQL,
+    get_db_connection,
+    get_range_camera_periods,
+    get_range_camera_sums,
+    refresh_rollups,
+    rollup_triggers_installed,
+    to_time_range,
+)
+from config import HOURLY_STORE_CONFIG
+from generate_db import (
+    ROLLUP_CHANGES_SQL,
+    ROLLUP_INDEXES_SQL,
+    ROLLUP_TABLES_SQL,
+    ROLLUP_TRIGGERS_SQL,
+    VIDEO_ANALYSIS_INDEX_NAMES,
+    VIDEO_ANALYSIS_INDEXES_SQL,
+    VIDEO_ANALYSIS_TABLE_SQL,
+)
+from partitions import add_months, ensure_partitions, month_start
+
+# 已被覆盖索引/BRIN索引取代的旧索引
+LEGACY_INDEXES = [
+    "idx_video_analysis_start_time",
+    "idx_video_analysis_end_time",
+    "idx_video_analysis_camera",
+    "idx_video_analysis_start_time_gender",
+    "idx_video_analysis_start_date",
+    "idx_video_analysis_end_date",
+    "idx_video_analysis_start_time_camera",
+    "idx_video_analysis_year_month",
+    "idx_video_analysis_year_quarter",
+    "idx_video_analysis_year",
+    "idx_video_analysis_week",
+    "idx_video_analysis_date_range",
+    "idx_video_analysis_camera_time",
+    "idx_video_analysis_weekly",
+    "idx_video_analysis_quarter",
+    "idx_video_analysis_camera_period",
+]
+
+# 不限摄像头的时间范围查询（common/zones/generate_pdf中读取原始表的查询均使用该条件）
+PRUNING_QUERY = f"""
+    SELECT camera_name, SUM(in_count)
+    FROM video_analysis
+    WHERE {TIME_RANGE_SQL}
+    GROUP BY camera_name
+"""
+
+
+def partition_video_analysis(conn):
+    """
+    将未分区的video_analysis转换为按月分区的表（已分区时跳过）：
+    旧表改名后按generate_db中的定义建表，创建数据范围内的月分区，按start_time顺序复制数据后删除旧表
+    （二级索引由migrate_indexes在复制完成后创建）
+    :param conn: 数据库连接
+    :return: 是否执行了转换
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass('video_analysis')"
+        )
+        row = cur.fetchone()
+        if row is None or row[0] == "p":
+            # 结束只读事务，之后的migrate_indexes需要切换为自动提交
+            conn.rollback()
+            return False
+
+        cur.execute("""
+            SELECT MIN(start_time), MAX(start_time), COUNT(*) FILTER (WHERE start_time IS NULL)
+            FROM video_analysis
+            """)
+        first, last, missing = cur.fetchone()
+        if missing:
+            raise RuntimeError(
+                f"video_analysis中有 {missing} 行start_time为空，无法按start_time分区"
+            )
+
+        # 旧表的索引、主键和序列名与新表冲突，先删除索引并改名
+        for index_name in VIDEO_ANALYSIS_INDEX_NAMES + LEGACY_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+        cur.execute("ALTER TABLE video_analysis RENAME TO video_analysis_unpartitioned")
+        cur.execute(
+            "ALTER TABLE video_analysis_unpartitioned "
+            "RENAME CONSTRAINT video_analysis_pkey TO video_analysis_unpartitioned_pkey"
+        )
+        cur.execute(
+            "ALTER SEQUENCE IF EXISTS video_analysis_analysis_id_seq "
+            "RENAME TO video_analysis_unpartitioned_analysis_id_seq"
+        )
+
+        cur.execute(VIDEO_ANALYSIS_TABLE_SQL)
+        if first is not None:
+            ensure_partitions(conn, first, last)
+        cur.execute("""
+            INSERT INTO video_analysis
+            SELECT * FROM video_analysis_unpartitioned ORDER BY start_time
+            """)
+        print(f"已复制 {cur.rowcount} 行到分区表")
+        cur.execute("""
+            SELECT setval(
+                'video_analysis_analysis_id_seq',
+                GREATEST((SELECT MAX(analysis_id) FROM video_analysis), 1)
+            )
+            """)
+        cur.execute("DROP TABLE video_analysis_unpartitioned")
+        conn.commit()
+        print("video_analysis已转换为按月分区表")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def migrate_rollups(conn):
+    """
+    创建小时/日汇总表并全量回填，然后创建刷新触发器：
+    汇总表不存在（早于汇总表的数据库）或触发器缺失（如分区转换重建了video_analysis）时，
+    期间写入的数据未进入汇总表，需全量重建；两者都已存在时只补建变化记录表并更新刷新函数
+    :param conn: 数据库连接
+    :return: 是否执行了回填
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('video_analysis_hourly') IS NOT NULL")
+        (tables_exist,) = cur.fetchone()
+        if tables_exist and rollup_triggers_installed(conn):
+            cur.execute(
+                "SELECT to_regclass('video_analysis_hourly_changes') IS NOT NULL"
+            )
+            if cur.fetchone()[0]:
+                conn.rollback()
+                return False
+            # 早于变化记录表的数据库：汇总表已由触发器维护，无需回填
+            cur.execute(ROLLUP_CHANGES_SQL)
+            cur.execute(ROLLUP_TRIGGERS_SQL)
+            conn.commit()
+            print("已创建小时汇总表变化记录表，刷新触发器已更新")
+            return False
+
+        if not tables_exist:
+            cur.execute(ROLLUP_TABLES_SQL)
+            print("已创建小时/日汇总表")
+        cur.execute(ROLLUP_CHANGES_SQL)
+        refresh_rollups(conn)
+        cur.execute(ROLLUP_TRIGGERS_SQL)
+        conn.commit()
+        print("汇总表已全量回填，刷新触发器已创建")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def deduplicate_video_analysis(conn):
+    """
+    删除(camera_name, start_time)重复的行，只保留analysis_id最大（最近一次分析）的行，
+    以便创建唯一索引；有删除时全量重建小时/日汇总表（唯一索引已存在时跳过）
+    :param conn: 数据库连接
+    :return: 删除的行数
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT 1 FROM pg_index
+            WHERE indexrelid = to_regclass('idx_video_analysis_camera_start')
+                AND indisunique
+            """)
+        if cur.fetchone():
+            conn.rollback()
+            return 0
+
+        cur.execute("""
+            DELETE FROM video_analysis
+            WHERE (analysis_id, start_time) IN (
+                SELECT analysis_id, start_time
+                FROM (
+                    SELECT
+                        analysis_id,
+                        start_time,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY camera_name, start_time
+                            ORDER BY analysis_id DESC
+                        ) AS row_number
+                    FROM video_analysis
+                ) AS ranked
+                WHERE row_number > 1
+            )
+            """)
+        deleted = cur.rowcount
+        if deleted:
+            refresh_rollups(conn)
+            print(f"已删除 {deleted} 行重复数据并重建汇总表")
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def migrate_indexes(conn):
+    """
+    删除旧的冗余索引并创建合并后的索引，最后VACUUM ANALYZE更新可见性映射和统计信息
+    :param conn: 数据库连接
+    """
+    old_autocommit = conn.autocommit
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        for index_name in LEGACY_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+            print(f"已删除索引 {index_name}")
+        # (camera_name, start_time) 覆盖索引改为唯一索引（导入接口upsert的冲突键），旧的非唯一索引先删除
+        cur.execute("""
+            SELECT 1 FROM pg_index
+            WHERE indexrelid = to_regclass('idx_video_analysis_camera_start')
+                AND NOT indisunique
+            """)
+        if cur.fetchone():
+            cur.execute("DROP INDEX idx_video_analysis_camera_start")
+            print("已删除非唯一索引 idx_video_analysis_camera_start")
+        cur.execute(VIDEO_ANALYSIS_INDEXES_SQL)
+        cur.execute(ROLLUP_INDEXES_SQL)
+        print("合并索引创建完成")
+        # Index Only Scan依赖可见性映射，迁移后立即VACUUM
+        cur.execute("VACUUM ANALYZE video_analysis")
+        cur.execute("VACUUM ANALYZE video_analysis_hourly")
+        print("VACUUM ANALYZE 完成")
+    finally:
+        cur.close()
+        conn.autocommit = old_autocommit
+
+
+def _find_plan_nodes(plan):
+    """
+    递归展开EXPLAIN (FORMAT JSON)的计划树
+    :param plan: 计划节点
+    :return: 节点列表
+    """
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_find_plan_nodes(child))
+    return nodes
+
+
+def explain_range_queries(conn, date_start, date_end):
+    """
+    执行get_range_camera_sums和get_range_camera_periods，并记录它们实际发出的每条SQL的执行计划
+    （临时关闭每小时人数的内存存储，保证查询走数据库）
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :return: EXPLAIN (FORMAT JSON)的计划列表
+    """
+    plans = []
+
+    class ExplainCursor(extensions.cursor):
+        def execute(self, query, vars=None):
+            super().execute("EXPLAIN (FORMAT JSON) " + query, vars)
+            plan = self.fetchone()[0]
+            plans.append(json.loads(plan) if isinstance(plan, str) else plan)
+            return super().execute(query, vars)
+
+    old_factory = conn.cursor_factory
+    old_enabled = HOURLY_STORE_CONFIG["enabled"]
+    conn.cursor_factory = ExplainCursor
+    HOURLY_STORE_CONFIG["enabled"] = False
+    try:
+        get_range_camera_sums(conn, date_start, date_end)
+        get_range_camera_periods(conn, date_start, date_end)
+    finally:
+        conn.cursor_factory = old_factory
+        HOURLY_STORE_CONFIG["enabled"] = old_enabled
+        conn.rollback()
+    return plans
+
+
+def find_uncovered_scans(conn, plans):
+    """
+    找出计划中读取video_analysis（含各分区）但不是覆盖索引Index Only Scan的扫描节点
+    :param conn: 数据库连接
+    :param plans: explain_range_queries的返回值
+    :return: [(节点类型, 表名, 索引名)]
+    """
+    cur = conn.cursor()
+    try:
+        # 分区表上各分区的表和索引都继承自父表
+        cur.execute("""
+            SELECT parent.relname, child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname IN ('video_analysis', 'idx_video_analysis_camera_start')
+            """)
+        children = cur.fetchall()
+    finally:
+        cur.close()
+        conn.rollback()
+
+    tables = {"video_analysis"}
+    tables.update(child for parent, child in children if parent == "video_analysis")
+    index_names = {"idx_video_analysis_camera_start"}
+    index_names.update(child for parent, child in children if parent in index_names)
+
+    uncovered = []
+    for plan in plans:
+        for node in _find_plan_nodes(plan[0]["Plan"]):
+            if node.get("Relation Name") not in tables:
+                continue
+            if (
+                node["Node Type"] != "Index Only Scan"
+                or node.get("Index Name") not in index_names
+            ):
+                uncovered.append(
+                    (node["Node Type"], node["Relation Name"], node.get("Index Name"))
+                )
+    return uncovered
+
+
+def verify_index_usage(conn):
+    """
+    检查按摄像头分组的时间范围统计（汇总行及高峰/低峰时段）读取原始表时是否都走覆盖索引的Index Only Scan，
+    检查范围取最后一天前两天的10:30到最后一天的12:14:59，首尾不足一小时的部分读取原始表
+    :param conn: 数据库连接
+    :return: 是否全部命中覆盖索引
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MAX(start_time) FROM video_analysis")
+        last = cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.rollback()
+    if last is None:
+        print("video_analysis无数据，跳过索引检查")
+        return False
+
+    last_day = last.replace(hour=0, minute=0, second=0)
+    date_start = last_day - timedelta(days=2) + timedelta(hours=10, minutes=30)
+    date_end = last_day + timedelta(hours=12, minutes=14, seconds=59)
+    uncovered = find_uncovered_scans(
+        conn, explain_range_queries(conn, date_start, date_end)
+    )
+    if uncovered:
+        for node_type, relation, index_name in uncovered:
+            print(f"索引检查未通过: {relation} 使用 {node_type} ({index_name})")
+        return False
+    print("索引检查通过: 原始表均为覆盖索引的Index Only Scan")
+    return True
+
+
+def verify_partition_pruning(conn):
+    """
+    检查一个月的时间范围查询是否只扫描该月的分区
+    :param conn: 数据库连接
+    :return: 是否只扫描了一个分区
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MAX(start_time) FROM video_analysis")
+        last = cur.fetchone()[0]
+        if last is None:
+            print("video_analysis无数据，跳过分区裁剪检查")
+            return False
+
+        start = month_start(last)
+        end = add_months(start, 1) - timedelta(seconds=1)
+        cur.execute("EXPLAIN (FORMAT JSON) " + PRUNING_QUERY, to_time_range(start, end))
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        relations = sorted(
+            {
+                node["Relation Name"]
+                for node in _find_plan_nodes(plan[0]["Plan"])
+                if "Relation Name" in node
+            }
+        )
+        if len(relations) == 1:
+            print(f"分区裁剪检查通过: {relations[0]}")
+            return True
+        print(f"分区裁剪检查未通过: {', '.join(relations)}")
+        return False
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    conn = get_db_connection()
+    try:
+        partition_video_analysis(conn)
+        migrate_rollups(conn)
+        deduplicate_video_analysis(conn)
+        migrate_indexes(conn)
+        if not verify_index_usage(conn) or not verify_partition_pruning(conn):
+            raise SystemExit(1)
+    finally:
+        conn.close()
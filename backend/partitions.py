@@ -0,0 +1,238 @@
+import argparse
+import re
+from datetime import datetime
+
+from common import get_db_connection
+from config import PARTITION_CONFIG
+
+# video_analysis按start_time按月分区，分区名如 video_analysis_y2025m08；
+# 不在任何月分区范围内的行写入默认分区，创建对应月分区时迁出
+PARENT_TABLE = "video_analysis"
+DEFAULT_PARTITION = "video_analysis_default"
+_PARTITION_NAME = re.compile(r"^video_analysis_y(\d{4})m(\d{2})$")
+
+
+def month_start(value):
+    """
+    取所在月份的第一天
+    :param value: datetime或date
+    :return: datetime
+    """
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """
+    月份加减
+    :param value: 某月第一天
+    :param months: 月数（可为负数）
+    :return: datetime
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """
+    月分区的表名
+    :param month: 某月第一天
+    :return: 如 "video_analysis_y2025m08"
+    """
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(conn):
+    """
+    列出已有的月分区
+    :param conn: 数据库连接
+    :return: {分区月份第一天: 分区表名}
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            (PARENT_TABLE,),
+        )
+        partitions = {}
+        for (name,) in cur.fetchall():
+            match = _PARTITION_NAME.match(name)
+            if match:
+                partitions[datetime(int(match[1]), int(match[2]), 1)] = name
+        return partitions
+    finally:
+        cur.close()
+
+
+def create_month_partition(conn, month):
+    """
+    创建某月的分区（已存在时跳过，不提交事务）
+    默认分区中属于该月的行先迁入新表，再挂载为分区；
+    并发创建时用事务级咨询锁串行执行，后执行的事务等先执行的提交后看到分区已存在
+    :param conn: 数据库连接
+    :param month: 某月第一天
+    :return: 是否新建了分区
+    """
+    name = partition_name(month)
+    upper = add_months(month, 1)
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (PARENT_TABLE,))
+        cur.execute("SELECT to_regclass(%s)", (name,))
+        if cur.fetchone()[0] is not None:
+            return False
+
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+        if cur.fetchone()[0] is not None:
+            cur.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE start_time >= %s AND start_time < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """,
+                (month, upper),
+            )
+        # 挂载时父表上的索引会自动在分区上创建
+        cur.execute(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            (month, upper),
+        )
+        return True
+    finally:
+        cur.close()
+
+
+def ensure_partitions(conn, date_start, date_end):
+    """
+    确保时间范围内每个月都有分区（写入数据前调用，不提交事务）
+    :param conn: 数据库连接
+    :param date_start: 开始时间
+    :param date_end: 结束时间
+    :return: 新建的分区表名列表
+    """
+    created = []
+    month = month_start(date_start)
+    last = month_start(date_end)
+    while month <= last:
+        if create_month_partition(conn, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def _check_retention_months(retention_months):
+    """保留月数小于1时截止月份会落在当月之后，删除当月及未来的分区"""
+    if retention_months < 1:
+        raise ValueError(f"retention_months must be at least 1: {retention_months}")
+
+
+def drop_expired_partitions(conn, retention_months, now=None):
+    """
+    分离并删除超过保留期的月分区（整月删除只修改元数据，不执行DELETE，不提交事务）
+    小时/日汇总表中的数据不受影响，历史范围的汇总值仍可查询
+    :param conn: 数据库连接
+    :param retention_months: 保留的月数（含当月），至少为1
+    :param now: 当前时间，默认取系统时间
+    :return: 删除的分区表名列表
+    """
+    _check_retention_months(retention_months)
+    cutoff = add_months(month_start(now or datetime.now()), -(retention_months - 1))
+    dropped = []
+
+    cur = conn.cursor()
+    try:
+        for month, name in sorted(list_partitions(conn).items()):
+            if month >= cutoff:
+                continue
+            cur.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+        return dropped
+    finally:
+        cur.close()
+
+
+def maintain_partitions(conn, months_ahead=None, retention_months=None, now=None):
+    """
+    分区维护：预先创建当月及之后months_ahead个月的分区，并删除超过保留期的分区（提交事务）
+    :param conn: 数据库连接
+    :param months_ahead: 预建的月数，默认取PARTITION_CONFIG
+    :param retention_months: 保留的月数（至少为1），默认取PARTITION_CONFIG，为None时不删除
+    :param now: 当前时间，默认取系统时间
+    :return: (新建的分区表名列表, 删除的分区表名列表)
+    """
+    if months_ahead is None:
+        months_ahead = PARTITION_CONFIG["months_ahead"]
+    if retention_months is None:
+        retention_months = PARTITION_CONFIG["retention_months"]
+    if retention_months is not None:
+        _check_retention_months(retention_months)
+
+    current = month_start(now or datetime.now())
+    try:
+        created = ensure_partitions(conn, current, add_months(current, months_ahead))
+        dropped = []
+        if retention_months is not None:
+            dropped = drop_expired_partitions(conn, retention_months, now)
+        conn.commit()
+        return created, dropped
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _positive_int(value):
+    """argparse正整数参数解析"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"应为整数: {value}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"应不小于1: {value}")
+    return number
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="video_analysis月分区维护（建议每天由计划任务执行）"
+    )
+    parser.add_argument(
+        "--months-ahead",
+        type=int,
+        default=PARTITION_CONFIG["months_ahead"],
+        help="预先创建的月分区数",
+    )
+    parser.add_argument(
+        "--retention-months",
+        type=_positive_int,
+        default=PARTITION_CONFIG["retention_months"],
+        help="原始数据保留的月数（含当月），不指定时不删除",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    conn = get_db_connection()
+    try:
+        created, dropped = maintain_partitions(
+            conn, args.months_ahead, args.retention_months
+        )
+        print(f"新建分区: {', '.join(created) or '无'}")
+        print(f"删除分区: {', '.join(dropped) or '无'}")
+    finally:
+        conn.close()
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from cache import sync_data_version
+from config import REPORT_STORE_CONFIG
+from generate_pdf import load_report_version, render_report, write_file_atomic
+
+# 报告版式或统计口径变化时递增，使已保存的报告失效
+REPORT_FORMAT_VERSION = 1
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 各日期范围的数据版本：(date_start, date_end) -> (全局数据版本, 范围数据版本)
+# 全局数据版本未变化时无需重新查询范围数据版本（超过上限时清空）
+_RANGE_VERSIONS_LIMIT = 1024
+_range_versions = {}
+_range_versions_lock = threading.Lock()
+
+# 同一报告只生成一次：报告键 -> 锁
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+
+
+def get_store_dir():
+    """报告存储目录的绝对路径"""
+    return os.path.join(PROJECT_ROOT, REPORT_STORE_CONFIG["dir"])
+
+
+def get_range_version(date_start, date_end):
+    """
+    日期范围内报告数据的版本（导入只影响其他日期时，历史报告的版本不变）
+    :param date_start: 开始日期字符串 (YYYY-MM-DD)
+    :param date_end: 结束日期字符串 (YYYY-MM-DD)
+    :return: load_report_version 的返回值
+    """
+    global_version = sync_data_version()
+    with _range_versions_lock:
+        cached = _range_versions.get((date_start, date_end))
+    if cached is not None and cached[0] == global_version:
+        return cached[1]
+
+    version = load_report_version(date_start, date_end)
+    with _range_versions_lock:
+        if len(_range_versions) >= _RANGE_VERSIONS_LIMIT:
+            _range_versions.clear()
+        _range_versions[(date_start, date_end)] = (global_version, version)
+    return version
+
+
+def report_key(date_start, date_end, version):
+    """
+    报告的内容键：日期范围和数据版本相同的报告内容相同
+    :return: 十六进制字符串
+    """
+    payload = json.dumps([REPORT_FORMAT_VERSION, date_start, date_end, version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _report_path(key):
+    """报告键对应的文件路径（按前两位分目录）"""
+    return os.path.join(get_store_dir(), key[:2], f"{key}.pdf")
+
+
+def prune_report_store(max_bytes=None):
+    """
+    报告存储超过容量时删除最久未使用的报告（读取时更新修改时间）
+    :param max_bytes: 容量（字节），默认取REPORT_STORE_CONFIG
+    :return: 删除的文件数
+    """
+    if max_bytes is None:
+        max_bytes = REPORT_STORE_CONFIG["max_bytes"]
+
+    files = []
+    for directory, _, names in os.walk(get_store_dir()):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def get_report(date_start, date_end=None):
+    """
+    取得日期范围的PDF报告：已保存且数据版本相同时直接返回，否则生成并保存
+    （读取数据失败时抛出异常，不保存报告）
+    :param date_start: 开始日期字符串 (YYYY-MM-DD)
+    :param date_end: 结束日期字符串，默认与开始日期相同
+    :return: (文件路径, 报告键)
+    """
+    date_end = date_end or date_start
+    key = report_key(date_start, date_end, get_range_version(date_start, date_end))
+    path = _report_path(key)
+
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            try:
+                # 更新修改时间，容量超限时最后被删除
+                os.utime(path)
+                return path, key
+            except OSError:
+                pass
+
+            path = write_file_atomic(
+                path, render_report(date_start, date_end, strict=True)
+            )
+    finally:
+        with _render_locks_lock:
+            _render_locks.pop(key, None)
+
+    prune_report_store()
+    return path, key
+
+
+def parse_report_date(value):
+    """
+    校验日期参数
+    :param value: 日期字符串 (YYYY-MM-DD)
+    :return: 规范化的日期字符串，格式不正确时为None
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,198 @@
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+
+import psycopg2
+
+from common import close_db_pool, init_db_pool
+from config import LIVE_CONFIG, SERVER_CONFIG
+from last_login import flush_last_logins
+
+# 生产环境的WSGI服务器为可选依赖：Linux使用gunicorn（pip install gunicorn），
+# Windows不支持fork，使用单进程多线程的waitress（pip install waitress）
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def get_pidfile():
+    """主进程PID文件的绝对路径"""
+    return os.path.join(PROJECT_ROOT, SERVER_CONFIG["pidfile"])
+
+
+def _limit_live_connections(threads):
+    """
+    每个实时更新(SSE)连接在其存续期间占用一个线程，
+    限制每个进程的实时更新连接最多占用一半线程，其余线程用于普通请求
+    （超过上限的浏览器在retry间隔后重连，期间仍可正常查询）
+    :param threads: 每个进程的线程数
+    """
+    limit = max(threads // 2, 1)
+    if LIVE_CONFIG["max_subscribers"] > limit:
+        LIVE_CONFIG["max_subscribers"] = limit
+
+
+def _open_worker_resources():
+    """在工作进程中创建本进程的数据库连接池（数据库暂不可用时改为第一次请求时创建）"""
+    try:
+        init_db_pool()
+    except psycopg2.Error:
+        logger.exception("Failed to open the database pool in worker %s", os.getpid())
+
+
+def _post_fork(server, worker):
+    """gunicorn钩子：工作进程fork之后打开本进程的数据库资源（连接不能在进程间共享）"""
+    _open_worker_resources()
+
+
+def _worker_exit(server, worker):
+    """gunicorn钩子：工作进程退出时写入待写入的最后登录时间，再关闭本进程的连接池"""
+    flush_last_logins()
+    close_db_pool()
+
+
+def _load_app():
+    """导入Flask应用（gunicorn在fork之前于主进程中导入一次，各工作进程共享配置、路由和密钥）"""
+    if not os.getenv("SECRET_KEY"):
+        logger.warning(
+            "SECRET_KEY is not set: all sessions are invalidated on every restart or reload"
+        )
+    from app import app
+
+    return app
+
+
+def run_gunicorn(host, port, workers, threads):
+    """
+    使用gunicorn运行：主进程预加载应用后fork出多个工作进程，每个工作进程使用多个线程处理请求
+    :param host: 监听地址
+    :param port: 监听端口
+    :param workers: 工作进程数
+    :param threads: 每个工作进程的线程数
+    """
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "timeout": SERVER_CONFIG["timeout"],
+        "graceful_timeout": SERVER_CONFIG["graceful_timeout"],
+        "keepalive": SERVER_CONFIG["keepalive"],
+        "pidfile": get_pidfile(),
+        "accesslog": "-",
+        "post_fork": _post_fork,
+        "worker_exit": _worker_exit,
+    }
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return _load_app()
+
+    DashboardApplication().run()
+
+
+def run_waitress(host, port, threads):
+    """
+    使用waitress运行（Windows）：单进程，多个线程处理请求
+    :param host: 监听地址
+    :param port: 监听端口
+    :param threads: 线程数
+    """
+    app = _load_app()
+    _open_worker_resources()
+    try:
+        waitress.serve(app, host=host, port=port, threads=threads)
+    finally:
+        flush_last_logins()
+        close_db_pool()
+
+
+def reload_server():
+    """
+    平滑重新加载（gunicorn）：向主进程发送USR2启动加载新代码的主进程和工作进程，
+    新主进程就绪（写入"PID文件.2"）后向旧主进程发送TERM，旧工作进程处理完进行中的请求后退出，
+    新主进程随后将PID文件改回原名（只需重启工作进程而不加载新代码时，直接向主进程发送HUP）
+    """
+    pidfile = get_pidfile()
+    with open(pidfile) as f:
+        old_pid = int(f.read().strip())
+    os.kill(old_pid, signal.SIGUSR2)
+
+    deadline = time.monotonic() + SERVER_CONFIG["graceful_timeout"]
+    new_pid = None
+    while new_pid is None and time.monotonic() < deadline:
+        time.sleep(0.5)
+        try:
+            with open(pidfile + ".2") as f:
+                new_pid = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+    if new_pid is None:
+        raise SystemExit("新主进程未能启动，旧主进程继续运行")
+
+    # 等待新主进程的工作进程启动，期间的连接在监听队列中等待
+    time.sleep(SERVER_CONFIG["reload_delay"])
+    os.kill(old_pid, signal.SIGTERM)
+    print(f"已重新加载: 主进程 {old_pid} -> {new_pid}")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="生产环境启动仪表板服务")
+    parser.add_argument("--host", default=SERVER_CONFIG["host"], help="监听地址")
+    parser.add_argument(
+        "--port", type=int, default=SERVER_CONFIG["port"], help="监听端口"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=SERVER_CONFIG["workers"],
+        help="工作进程数（waitress为单进程，忽略该参数）",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=SERVER_CONFIG["threads"],
+        help="每个工作进程的线程数",
+    )
+    parser.add_argument(
+        "--reload",
+        action="store_true",
+        help="平滑重新加载正在运行的服务（gunicorn）",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    if args.reload:
+        reload_server()
+    elif BaseApplication is not None and sys.platform != "win32":
+        _limit_live_connections(args.threads)
+        run_gunicorn(args.host, args.port, args.workers, args.threads)
+    elif waitress is not None:
+        _limit_live_connections(args.threads)
+        run_waitress(args.host, args.port, args.threads)
+    else:
+        raise SystemExit(
+            "未安装WSGI服务器：Linux请安装gunicorn，Windows请安装waitress（见requirements.txt）"
+        )
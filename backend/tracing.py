@@ -0,0 +1,243 @@
+import json
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+from psycopg2 import extensions
+
+from config import TRACING_CONFIG
+
+# 当前请求的SQL追踪记录（未在追踪的请求中时为None，游标不做任何记录）
+_current_trace = ContextVar("sql_trace", default=None)
+
+# 本模块文件名，查找调用方时跳过
+_THIS_FILE = __file__
+
+# SQL规范化：字符串/数字字面量替换为?，连续的%s列表合并，空白压缩
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query):
+    """
+    规范化SQL文本，相同结构的查询得到相同的文本
+    :param query: SQL文本（str或bytes）
+    :return: 规范化后的SQL
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    else:
+        query = str(query)
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    query = _PLACEHOLDER_LIST.sub("%s, ...", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _find_caller():
+    """
+    查找执行SQL的业务函数（跳过本模块的帧）
+    :return: 如 "common.get_camera_stats"
+    """
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == _THIS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class TracingCursor(extensions.cursor):
+    """记录每条SQL的规范化文本、耗时、返回行数和调用函数的游标"""
+
+    def execute(self, query, vars=None):
+        trace = _current_trace.get()
+        if trace is None:
+            return super().execute(query, vars)
+
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(trace, query, started, self.rowcount, _find_caller())
+
+    def executemany(self, query, vars_list):
+        trace = _current_trace.get()
+        if trace is None:
+            return super().executemany(query, vars_list)
+
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(trace, query, started, self.rowcount, _find_caller())
+
+
+def _record(trace, query, started, rows, caller):
+    """追加一条SQL记录"""
+    trace["queries"].append(
+        {
+            "sql": normalize_sql(query),
+            "caller": caller,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "rows": rows,
+        }
+    )
+
+
+def start_trace():
+    """
+    开始追踪当前上下文中执行的SQL
+    :return: 用于 end_trace 的令牌
+    """
+    return _current_trace.set({"started": time.perf_counter(), "queries": []})
+
+
+def end_trace(token):
+    """
+    结束追踪
+    :param token: start_trace 的返回值
+    :return: 追踪记录
+    """
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    return trace
+
+
+def summarize_trace(trace):
+    """
+    汇总追踪记录：总耗时、按调用函数和按SQL结构分组的统计，以及疑似N+1的重复查询
+    :param trace: 追踪记录
+    :return: 汇总字典
+    """
+    queries = trace["queries"]
+    total_ms = (time.perf_counter() - trace["started"]) * 1000
+
+    by_caller = {}
+    by_shape = {}
+    for query in queries:
+        caller = by_caller.setdefault(
+            query["caller"], {"count": 0, "duration_ms": 0.0, "rows": 0}
+        )
+        caller["count"] += 1
+        caller["duration_ms"] += query["duration_ms"]
+        caller["rows"] += max(query["rows"], 0)
+
+        shape = by_shape.setdefault(
+            (query["sql"], query["caller"]),
+            {
+                "sql": query["sql"],
+                "caller": query["caller"],
+                "count": 0,
+                "duration_ms": 0.0,
+                "rows": 0,
+            },
+        )
+        shape["count"] += 1
+        shape["duration_ms"] += query["duration_ms"]
+        shape["rows"] += max(query["rows"], 0)
+
+    # 同一请求中由同一函数重复执行相同结构的查询，通常可以合并为一次分组查询
+    n_plus_one = [
+        shape
+        for shape in by_shape.values()
+        if shape["count"] >= TRACING_CONFIG["n_plus_one_threshold"]
+        and shape["caller"] not in TRACING_CONFIG["n_plus_one_ignore"]
+    ]
+
+    return {
+        "total_ms": round(total_ms, 3),
+        "db_ms": round(sum(query["duration_ms"] for query in queries), 3),
+        "query_count": len(queries),
+        "rows": sum(max(query["rows"], 0) for query in queries),
+        "by_caller": {
+            name: dict(stats, duration_ms=round(stats["duration_ms"], 3))
+            for name, stats in sorted(
+                by_caller.items(), key=lambda item: -item[1]["duration_ms"]
+            )
+        },
+        "queries": [
+            dict(query, duration_ms=round(query["duration_ms"], 3)) for query in queries
+        ],
+        "n_plus_one": [
+            dict(shape, duration_ms=round(shape["duration_ms"], 3))
+            for shape in n_plus_one
+        ],
+    }
+
+
+def build_server_timing(summary):
+    """
+    生成Server-Timing响应头
+    :param summary: summarize_trace 的返回值
+    :return: 如 'total;dur=12.3, db;dur=8.1;desc="7 queries", db-get_camera_stats;dur=5.2'
+    """
+    metrics = [
+        f"total;dur={summary['total_ms']:.1f}",
+        f"db;dur={summary['db_ms']:.1f};desc=\"{summary['query_count']} queries\"",
+    ]
+    callers = list(summary["by_caller"].items())[: TRACING_CONFIG["timing_callers"]]
+    for name, stats in callers:
+        # 指标名只能使用token字符，取函数名部分
+        metric = re.sub(r"[^A-Za-z0-9_\-]", "_", name.rsplit(".", 1)[-1])
+        metrics.append(
+            f"db-{metric};dur={stats['duration_ms']:.1f};desc=\"{stats['count']}x\""
+        )
+    if summary["n_plus_one"]:
+        metrics.append(f"n-plus-one;desc=\"{len(summary['n_plus_one'])} shapes\"")
+    return ", ".join(metrics)
+
+
+def init_tracing(app):
+    """
+    为Flask应用注册按请求汇总SQL的钩子：
+    响应头 Server-Timing；请求头 X-SQL-Trace: 1 时在JSON响应中附加 _sql_trace 调试信息
+    （仅调试模式或管理员可用）；发现疑似N+1查询时写警告日志
+    :param app: Flask应用
+    """
+    from flask import g, request, session
+
+    if not TRACING_CONFIG["enabled"]:
+        return
+
+    @app.before_request
+    def _start_sql_trace():
+        g.sql_trace_token = start_trace()
+
+    @app.teardown_request
+    def _discard_sql_trace(exc):
+        # 请求异常中断时after_request不会执行，在此结束追踪
+        token = g.pop("sql_trace_token", None)
+        if token is not None:
+            end_trace(token)
+
+    @app.after_request
+    def _finish_sql_trace(response):
+        token = g.pop("sql_trace_token", None)
+        if token is None:
+            return response
+        summary = summarize_trace(end_trace(token))
+
+        response.headers["Server-Timing"] = build_server_timing(summary)
+
+        for shape in summary["n_plus_one"]:
+            app.logger.warning(
+                "Possible N+1 in %s %s: %s executed %d times by %s",
+                request.method,
+                request.path,
+                shape["sql"][:120],
+                shape["count"],
+                shape["caller"],
+            )
+
+        wants_debug = request.headers.get("X-SQL-Trace") == "1"
+        allowed = app.debug or session.get("role") == "admin"
+        if wants_debug and allowed and response.is_json:
+            payload = response.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload["_sql_trace"] = summary
+                response.set_data(json.dumps(payload, default=str))
+        return response
@@ -0,0 +1,307 @@
+from datetime import timedelta
+
+from common import (
+    TIME_RANGE_SQL,
+    build_camera_stats,
+    get_gender_counts_from_rows,
+    parse_timestamp,
+    to_time_range,
+)
+
+# 区域定义：members为(摄像头, 方向)，方向1表示摄像头的进入/离开即区域的进入/离开，
+# 方向-1表示相反（如A6离开即进入冷库）；
+# require_all为True时只统计所有成员摄像头都有数据的时段；
+# cap为另一个区域的键，区域进入人数不超过该区域（防止数据错误）
+ZONES = {
+    "cold_storage": {
+        "name": "Cold Storage",
+        "members": [("A7", 1), ("A6", -1)],
+        "require_all": True,
+    },
+    "second_floor": {
+        "name": "2nd Floor",
+        "members": [("A1", 1), ("A2", 1), ("A3", 1), ("A6", 1)],
+    },
+    "canteen": {
+        "name": "Canteen Area",
+        "members": [("A4", 1), ("A5", 1)],
+        "cap": "second_floor",
+    },
+    "A8": {"name": "A8", "members": [("A8", 1)]},
+}
+
+_EMPTY_GENDER = {"male": 0, "female": 0, "unknown": 0}
+
+# 热力图的行（ISO星期，1为周一）
+HEATMAP_WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def resolve_zones(names):
+    """
+    按名称取区域定义，不在ZONES中的名称视为单个摄像头
+    :param names: 区域键或摄像头名称列表
+    :return: {名称: 区域定义}
+    """
+    return {
+        name: ZONES.get(name) or {"name": f"Camera {name}", "members": [(name, 1)]}
+        for name in names
+    }
+
+
+def zone_cameras(zones):
+    """
+    区域涉及的全部摄像头
+    :param zones: {名称: 区域定义}
+    :return: 摄像头列表（排序）
+    """
+    return sorted({cam for zone in zones.values() for cam, _ in zone["members"]})
+
+
+def _member_counts(row, sign):
+    """
+    成员摄像头计入区域的(进入人数, 离开人数)
+    :param row: (total_people, total_in, total_out, male, female, minor, unknown_gender)
+    :param sign: 方向
+    """
+    return (row[1], row[2]) if sign > 0 else (row[2], row[1])
+
+
+def compute_zone_totals(camera_rows, zones):
+    """
+    由各摄像头的汇总行计算各区域的进出人数、整数性别分布和儿童人数，
+    所有区域成员的性别分布一次批量计算
+    :param camera_rows: {摄像头: 汇总行}，缺少的摄像头按零值处理
+    :param zones: {名称: 区域定义}
+    :return: {名称: {"in", "out", "gender": {"male", "female", "unknown"}, "minor"}}
+    """
+    empty_row = (0,) * 7
+    members = [
+        (name, camera_rows.get(cam, empty_row), sign)
+        for name, zone in zones.items()
+        for cam, sign in zone["members"]
+    ]
+    counts = get_gender_counts_from_rows(
+        [_member_counts(row, sign)[0] for _, row, sign in members],
+        [row for _, row, _ in members],
+    )
+
+    totals = {
+        name: {"in": 0, "out": 0, "gender": dict(_EMPTY_GENDER), "minor": 0}
+        for name in zones
+    }
+    for i, (name, row, sign) in enumerate(members):
+        value_in, value_out = _member_counts(row, sign)
+        zone = totals[name]
+        zone["in"] += value_in
+        zone["out"] += value_out
+        if value_in > 0:
+            for key in _EMPTY_GENDER:
+                zone["gender"][key] += int(counts[key][i])
+            # 儿童人数按成员摄像头的儿童占比（保留一位小数）计算，向下取整
+            minor_percent = float(build_camera_stats(row, None, None)["minor_percent"])
+            zone["minor"] += int(value_in * minor_percent / 100)
+    return totals
+
+
+def apply_caps(totals, zones):
+    """
+    进入人数不小于0，且不超过cap指定的区域；进入人数为0的区域性别分布为0
+    :param totals: compute_zone_totals 的返回值（原地修改）
+    :param zones: {名称: 区域定义}
+    :return: totals
+    """
+    for zone in totals.values():
+        zone["in"] = max(zone["in"], 0)
+    for name, zone in zones.items():
+        cap = zone.get("cap")
+        if cap in totals:
+            totals[name]["in"] = min(totals[name]["in"], totals[cap]["in"])
+    for zone in totals.values():
+        if zone["in"] == 0:
+            zone["gender"] = dict(_EMPTY_GENDER)
+    return totals
+
+
+def format_period(start_time, end_time, count):
+    """
+    格式化时段字符串（与SQL中TO_CHAR的格式一致）
+    :return: 如 "2025/08/19 10:00:00~10:59:59, 25 pax"
+    """
+    return (
+        f"{start_time.strftime('%Y/%m/%d %H:%M:%S')}~"
+        f"{end_time.strftime('%H:%M:%S')}, {int(count)} pax"
+    )
+
+
+def peak_and_low_periods(period_counts):
+    """
+    取人数最多和最少的时段（人数相同时取较早的时段）
+    :param period_counts: [((start_time, end_time), count), ...]，按开始时间排序
+    :return: (高峰时段, 低峰时段)，无数据时为 "N/A"
+    """
+    if not period_counts:
+        return "N/A", "N/A"
+
+    (peak_start, peak_end), peak_count = max(period_counts, key=lambda item: item[1])
+    (low_start, low_end), low_count = min(period_counts, key=lambda item: item[1])
+    return (
+        format_period(peak_start, peak_end, peak_count),
+        format_period(low_start, low_end, low_count),
+    )
+
+
+def compute_zone_periods(slots, zones):
+    """
+    由各摄像头的时段数据一次遍历计算各区域的高峰/低峰时段（同一时段区域进入人数之和）
+    :param slots: 时段数据（含camera_name、start_time、end_time、in_count、out_count），按开始时间排序
+    :param zones: {名称: 区域定义}
+    :return: {名称: (高峰时段, 低峰时段)}
+    """
+    # 摄像头 -> [(区域, 方向)]
+    memberships = {}
+    for name, zone in zones.items():
+        for cam, sign in zone["members"]:
+            memberships.setdefault(cam, []).append((name, sign))
+
+    # 区域 -> {时段: [进入人数, 有数据的成员摄像头]}
+    zone_slots = {name: {} for name in zones}
+    for slot in slots:
+        for name, sign in memberships.get(slot.camera_name, ()):
+            entry = zone_slots[name].setdefault(
+                (slot.start_time, slot.end_time), [0, set()]
+            )
+            entry[0] += slot.in_count if sign > 0 else slot.out_count
+            entry[1].add(slot.camera_name)
+
+    periods = {}
+    for name, zone in zones.items():
+        required = len({cam for cam, _ in zone["members"]})
+        periods[name] = peak_and_low_periods(
+            [
+                (period, count)
+                for period, (count, cameras) in zone_slots[name].items()
+                if not zone.get("require_all") or len(cameras) == required
+            ]
+        )
+    return periods
+
+
+def get_zone_periods(conn, date_start, date_end, zones):
+    """
+    单次扫描按时段条件聚合，查询时间范围内各区域的高峰/低峰时段
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :param zones: {名称: 区域定义}
+    :return: {名称: (高峰时段, 低峰时段)}
+    """
+    # 启用每小时人数的内存存储时直接由内存计算（hourly_store依赖本模块，在此延迟导入）
+    from hourly_store import get_zone_periods as get_stored_zone_periods
+
+    stored = get_stored_zone_periods(date_start, date_end, zones)
+    if stored is not None:
+        return stored
+
+    columns = []
+    params = []
+    for zone in zones.values():
+        cases = []
+        for cam, sign in zone["members"]:
+            cases.append(
+                "WHEN camera_name = %s THEN "
+                + ("in_count" if sign > 0 else "out_count")
+            )
+            params.append(cam)
+        columns.append(f"SUM(CASE {' '.join(cases)} END)")
+        columns.append(
+            "COUNT(DISTINCT camera_name) FILTER (WHERE camera_name = ANY(%s))"
+        )
+        params.append([cam for cam, _ in zone["members"]])
+
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            f"""
+            SELECT start_time, end_time, {", ".join(columns)}
+            FROM video_analysis
+            WHERE camera_name = ANY(%s) AND {TIME_RANGE_SQL}
+            GROUP BY start_time, end_time
+            ORDER BY start_time, end_time
+            """,
+            (*params, zone_cameras(zones), *to_time_range(date_start, date_end)),
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    periods = {}
+    for i, (name, zone) in enumerate(zones.items()):
+        required = len({cam for cam, _ in zone["members"]})
+        periods[name] = peak_and_low_periods(
+            [
+                ((row[0], row[1]), row[2 + 2 * i])
+                for row in rows
+                if row[2 + 2 * i] is not None
+                and (not zone.get("require_all") or row[3 + 2 * i] == required)
+            ]
+        )
+    return periods
+
+
+def get_zone_heatmap(conn, date_start, date_end, zone):
+    """
+    按星期×小时统计区域每小时平均进入人数（读取小时汇总表，一次分组查询）
+    只统计时间范围内完整覆盖的小时，没有数据的小时不计入平均值
+    :param conn: 数据库连接
+    :param date_start: 开始日期
+    :param date_end: 结束日期
+    :param zone: 区域定义
+    :return: 7×24的二维列表，行为周一至周日，列为0-23时，无数据的格子为None
+    """
+    start = parse_timestamp(date_start)
+    end = parse_timestamp(date_end)
+    if start is None or end is None:
+        raise ValueError("Invalid date range")
+
+    # 完整覆盖的小时区间 [hour_lo, hour_hi)
+    hour_lo = start.replace(minute=0, second=0, microsecond=0)
+    if hour_lo < start:
+        hour_lo += timedelta(hours=1)
+    hour_hi = (end + timedelta(seconds=1)).replace(minute=0, second=0, microsecond=0)
+
+    in_cameras = [cam for cam, sign in zone["members"] if sign > 0]
+    out_cameras = [cam for cam, sign in zone["members"] if sign < 0]
+
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            SELECT
+                EXTRACT(ISODOW FROM bucket)::int AS weekday,
+                EXTRACT(HOUR FROM bucket)::int AS hour,
+                AVG(zone_in) AS avg_in
+            FROM (
+                SELECT
+                    bucket,
+                    SUM(
+                        CASE WHEN camera_name = ANY(%s) THEN in_count ELSE 0 END
+                        + CASE WHEN camera_name = ANY(%s) THEN out_count ELSE 0 END
+                    ) AS zone_in
+                FROM video_analysis_hourly
+                WHERE camera_name = ANY(%s) AND bucket >= %s AND bucket < %s
+                GROUP BY bucket
+            ) AS hourly
+            GROUP BY 1, 2
+            """,
+            (in_cameras, out_cameras, zone_cameras({"zone": zone}), hour_lo, hour_hi),
+        )
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    matrix = [[None] * 24 for _ in HEATMAP_WEEKDAYS]
+    for weekday, hour, avg_in in rows:
+        matrix[weekday - 1][hour] = round(float(avg_in), 1)
+    return matrix
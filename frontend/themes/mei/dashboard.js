@@ -168,6 +168,9 @@ document.addEventListener('DOMContentLoaded', function () {
             });
     }
 
+    // 已获取的仪表板数据：请求参数 -> {etag, data}，用于ETag条件请求（POST请求浏览器不会自动缓存）
+    const dashboardResponses = {};
+
     // 获取仪表板数据
     function fetchDashboardData(params) {
         // 显示所有部分的加载状态
@@ -175,19 +178,36 @@ document.addEventListener('DOMContentLoaded', function () {
             showLoading(`part${i}`);
         }
 
+        const body = JSON.stringify(params);
+        const headers = {
+            'Content-Type': 'application/json'
+        };
+        const cached = dashboardResponses[body];
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+
         return fetch('/api/dashboard', {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(params)
+            headers: headers,
+            body: body
         })
             .then(response => {
+                // 数据未变化，使用上次的结果
+                if (response.status === 304 && cached) {
+                    return cached.data;
+                }
                 if (!response.ok) {
                     // 网络响应异常
                     throw new Error('Network response exception!');
                 }
-                return response.json();
+                const etag = response.headers.get('ETag');
+                return response.json().then(data => {
+                    if (etag) {
+                        dashboardResponses[body] = { etag: etag, data: data };
+                    }
+                    return data;
+                });
             })
             .catch(error => {
                 // 获取仪表板数据时出错
@@ -196,6 +216,30 @@ document.addEventListener('DOMContentLoaded', function () {
             });
     }
 
+    // 实时更新：订阅当前查询条件的服务器推送（导入新数据后只推送有变化的部分）
+    let liveSource = null;
+
+    function openLiveUpdates(params) {
+        if (liveSource) {
+            liveSource.close();
+            liveSource = null;
+        }
+        if (!window.EventSource) return;
+
+        const query = new URLSearchParams({
+            date_start: params.date_start,
+            date_end: params.date_end,
+            ref_date_start: params.ref_date_start,
+            ref_date_end: params.ref_date_end,
+        });
+        liveSource = new EventSource(`/api/live?${query}`);
+        liveSource.addEventListener('dashboard', function (event) {
+            // 变化的部分合并到当前结果后重新显示
+            const changes = JSON.parse(event.data);
+            displayResults(Object.assign({}, window.dashboardData, changes));
+        });
+    }
+
     // 显示结果
     function displayResults(data) {
 
@@ -618,6 +662,7 @@ document.addEventListener('DOMContentLoaded', function () {
         fetchDashboardData(params)
             .then(data => {
                 displayResults(data);
+                openLiveUpdates(params);
             })
             .catch(error => {
                 // 获取仪表板数据时出错
@@ -1118,24 +1163,12 @@ document.addEventListener('DOMContentLoaded', function () {
     var btn = document.getElementById('downloadPdfBtn');
     if (btn) {
         btn.onclick = function () {
-            var element = document.body;
-            // 获取今天日期
-            var today = new Date();
-            var yyyy = today.getFullYear();
-            var mm = String(today.getMonth() + 1).padStart(2, '0');
-            var dd = String(today.getDate()).padStart(2, '0');
-            var filename = `dashboard_${yyyy}${mm}${dd}.pdf`;
-
-            var opt = {
-                margin: 0,
-                filename: filename,
-                image: { type: 'jpeg', quality: 1 },
-                html2canvas: { scale: 2 },
-                // jsPDF: { unit: 'mm', format: 'a3', orientation: 'landscape' }
-                // 自定义宽高（单位mm）：format: [420, 297]
-                jsPDF: { unit: 'mm', format: [380, 500], orientation: 'landscape' }
-            };
-            html2pdf().set(opt).from(element).save();
+            // 由服务器生成所选日期范围的PDF报告（相同日期范围和数据的报告直接下载已生成的文件）
+            var query = new URLSearchParams({
+                date_start: startDateInput.value,
+                date_end: endDateInput.value
+            });
+            window.location.href = '/api/report/pdf?' + query.toString();
         }
     }
 
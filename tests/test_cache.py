@@ -0,0 +1,85 @@
+"""
+查询结果缓存（cache.py）：过期时间、LRU淘汰、整体失效，以及失效前开始的查询不能写入旧结果。
+不需要数据库。
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import cache  # noqa: E402
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        cache.invalidate_cache()
+        self.config = mock.patch.dict(cache.CACHE_CONFIG, {"max_entries": 3})
+        self.config.start()
+
+    def tearDown(self):
+        self.config.stop()
+        cache.invalidate_cache()
+
+    def test_hit_and_miss(self):
+        self.assertEqual(cache.cache_get("a")[:2], (False, None))
+        cache.cache_set("a", 1)
+        self.assertEqual(cache.cache_get("a")[:2], (True, 1))
+
+    def test_ttl_expires(self):
+        with mock.patch.object(cache.time, "monotonic", return_value=100.0):
+            cache.cache_set("live", 1, ttl=60)
+            cache.cache_set("history", 2)
+        with mock.patch.object(cache.time, "monotonic", return_value=159.0):
+            self.assertEqual(cache.cache_get("live")[:2], (True, 1))
+        with mock.patch.object(cache.time, "monotonic", return_value=161.0):
+            self.assertEqual(cache.cache_get("live")[:2], (False, None))
+            # ttl=None 的历史结果不过期
+            self.assertEqual(cache.cache_get("history")[:2], (True, 2))
+
+    def test_lru_eviction(self):
+        for key in ("a", "b", "c"):
+            cache.cache_set(key, key)
+        # 访问 a 后，最久未使用的是 b
+        cache.cache_get("a")
+        cache.cache_set("d", "d")
+        self.assertFalse(cache.cache_get("b")[0])
+        for key in ("a", "c", "d"):
+            self.assertTrue(cache.cache_get(key)[0])
+
+    def test_invalidate_clears_all(self):
+        cache.cache_set("a", 1)
+        cache.cache_set("b", 2)
+        cache.invalidate_cache()
+        self.assertFalse(cache.cache_get("a")[0])
+        self.assertFalse(cache.cache_get("b")[0])
+
+    def test_write_after_invalidate_is_dropped(self):
+        hit, _, generation = cache.cache_get("a")
+        self.assertFalse(hit)
+        # 查询执行期间导入了新数据
+        cache.invalidate_cache()
+        self.assertFalse(cache.cache_set("a", "stale", None, generation))
+        self.assertFalse(cache.cache_get("a")[0])
+
+        _, _, generation = cache.cache_get("a")
+        self.assertTrue(cache.cache_set("a", "fresh", None, generation))
+        self.assertEqual(cache.cache_get("a")[:2], (True, "fresh"))
+
+    def test_write_after_version_change_is_dropped(self):
+        with mock.patch.object(cache, "_data_version", ("v1",)), mock.patch.object(
+            cache, "_data_version_checked_at", 0.0
+        ), mock.patch.object(cache, "db_connection") as db_connection, mock.patch.object(
+            cache, "get_data_version", return_value=("v2",)
+        ):
+            db_connection.return_value.__enter__.return_value = None
+            _, _, generation = cache.cache_get("a")
+            self.assertEqual(cache.sync_data_version(), ("v2",))
+            self.assertFalse(cache.cache_set("a", "stale", None, generation))
+        self.assertFalse(cache.cache_get("a")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
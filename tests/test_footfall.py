@@ -0,0 +1,109 @@
+"""
+/api/footfall-distribution的时间分组（app.get_footfall_buckets / get_bucket_end）
+与原先每个分组一条查询时的日期条件覆盖相同的日期区间。
+不需要数据库。
+"""
+
+import os
+import sys
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app import get_bucket_end, get_footfall_buckets  # noqa: E402
+
+
+def month_range(year, month):
+    """EXTRACT(YEAR) = year AND EXTRACT(MONTH) = month 覆盖的 [开始, 结束)"""
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, 1), end
+
+
+def quarter_range(year, quarter):
+    """EXTRACT(YEAR) = year AND EXTRACT(QUARTER) = quarter 覆盖的 [开始, 结束)"""
+    start = date(year, (quarter - 1) * 3 + 1, 1)
+    return start, month_range(year, (quarter - 1) * 3 + 3)[1]
+
+
+def baseline_ranges(today):
+    """原先各序列每条查询的日期条件，转换为 [开始, 结束) 区间"""
+    one_day = timedelta(days=1)
+
+    def week(i):
+        # start_time::date BETWEEN week_start AND week_start + 6
+        week_start = today - timedelta(days=today.weekday() + 7 * i)
+        return week_start, week_start + timedelta(days=7)
+
+    def month(i):
+        month_date = today.replace(day=1) - timedelta(days=30 * i)
+        return month_range(month_date.year, month_date.month)
+
+    def quarter(i):
+        q_year = today.year - ((today.month - 1) // 3 < i)
+        q_num = ((today.month - 1) // 3 - i) % 4 + 1
+        return quarter_range(q_year, q_num)
+
+    last_week_start = today - timedelta(days=today.weekday() + 7)
+    return {
+        "weekly_current": [
+            (today - timedelta(days=i), today - timedelta(days=i) + one_day)
+            for i in range(6, -1, -1)
+        ],
+        "weekly_historical": [
+            (last_week_start + timedelta(days=i), last_week_start + timedelta(days=i + 1))
+            for i in range(7)
+        ],
+        "monthly_current": [week(i) for i in range(3, -1, -1)],
+        "monthly_historical": [week(i) for i in range(4, 0, -1)],
+        "quarterly_current": [month(i) for i in range(2, -1, -1)],
+        "quarterly_historical": [month(i) for i in range(3, 0, -1)],
+        "yearly_current": [quarter(i) for i in range(3, -1, -1)],
+        "yearly_historical": [quarter(i) for i in range(4, 0, -1)],
+    }
+
+
+def bucket_ranges(today):
+    return {
+        name: [(start, get_bucket_end(granularity, start)) for start in starts]
+        for name, (granularity, starts) in get_footfall_buckets(today).items()
+    }
+
+
+class FootfallBucketsTest(unittest.TestCase):
+    def test_bucket_end(self):
+        self.assertEqual(get_bucket_end("day", date(2024, 2, 28)), date(2024, 2, 29))
+        self.assertEqual(get_bucket_end("week", date(2024, 12, 30)), date(2025, 1, 6))
+        self.assertEqual(get_bucket_end("month", date(2024, 12, 1)), date(2025, 1, 1))
+        self.assertEqual(get_bucket_end("quarter", date(2024, 10, 1)), date(2025, 1, 1))
+        self.assertEqual(get_bucket_end("quarter", date(2025, 1, 1)), date(2025, 4, 1))
+
+    def test_example_day(self):
+        buckets = get_footfall_buckets(date(2025, 8, 19))
+        self.assertEqual(
+            buckets["weekly_historical"],
+            ("day", [date(2025, 8, 11) + timedelta(days=i) for i in range(7)]),
+        )
+        self.assertEqual(
+            buckets["quarterly_current"],
+            ("month", [date(2025, 6, 1), date(2025, 7, 1), date(2025, 8, 1)]),
+        )
+        self.assertEqual(
+            buckets["yearly_historical"],
+            (
+                "quarter",
+                [date(2024, 7, 1), date(2024, 10, 1), date(2025, 1, 1), date(2025, 4, 1)],
+            ),
+        )
+
+    def test_matches_baseline_every_day(self):
+        # 覆盖月末、跨年和闰年2月
+        today = date(2023, 1, 1)
+        while today <= date(2025, 12, 31):
+            with self.subTest(today=today):
+                self.assertEqual(bucket_ranges(today), baseline_ranges(today))
+            today += timedelta(days=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
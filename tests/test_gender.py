@@ -0,0 +1,79 @@
+"""
+批量性别分配（common.get_gender_counts_from_rows）与原先逐个摄像头计算
+（build_camera_stats得到保留一位小数的百分比字符串，再由get_gender_count按int()取整分配）的结果一致。
+不需要数据库。
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import (  # noqa: E402
+    build_camera_stats,
+    get_gender_count,
+    get_gender_counts_from_rows,
+)
+
+
+def baseline_gender(total, row):
+    """原先的逐个计算：经过百分比字符串"""
+    stats = build_camera_stats(row, None, None)
+    return get_gender_count(
+        total,
+        stats["male_percent"],
+        stats["female_percent"],
+        stats["unknown_percent"],
+    )
+
+
+def make_row(people, male, female, minor, unknown):
+    return (people, 0, 0, male, female, minor, unknown)
+
+
+class GenderCountsFromRowsTest(unittest.TestCase):
+    def assert_matches_baseline(self, totals, rows):
+        counts = get_gender_counts_from_rows(totals, rows)
+        for i, (total, row) in enumerate(zip(totals, rows)):
+            expected = baseline_gender(total, row)
+            actual = {key: int(counts[key][i]) for key in expected}
+            self.assertEqual(actual, expected, f"total={total}, row={row}")
+
+    def test_no_people(self):
+        self.assert_matches_baseline([0, 5], [make_row(0, 0, 0, 0, 0)] * 2)
+
+    def test_percentages_on_rounding_boundaries(self):
+        # 1/8 = 12.5%、1/16 = 6.25%、3/40 = 7.5% 等保留一位小数时正好落在 .x5 上
+        rows = [
+            make_row(8, 1, 6, 0, 1),
+            make_row(16, 1, 14, 2, 1),
+            make_row(40, 3, 33, 5, 4),
+            make_row(3, 1, 1, 0, 1),
+            make_row(7, 2, 2, 1, 3),
+        ]
+        totals = [97, 13, 1001, 10, 99]
+        self.assert_matches_baseline(totals, rows)
+
+    def test_remainder_distribution(self):
+        # 百分比之和不足100%时剩余人数按小数部分从大到小分配
+        rows = [make_row(3, 1, 1, 0, 0), make_row(6, 1, 1, 1, 1)]
+        self.assert_matches_baseline([10, 25], rows)
+
+    def test_random_rows(self):
+        rng = random.Random(20250801)
+        totals = []
+        rows = []
+        for _ in range(500):
+            people = rng.choice([0, 1, 2, 3, 7, 40, rng.randint(1, 100000)])
+            male = rng.randint(0, people)
+            female = rng.randint(0, people - male)
+            unknown = people - male - female
+            rows.append(make_row(people, male, female, rng.randint(0, people), unknown))
+            totals.append(rng.randint(0, 5000))
+        self.assert_matches_baseline(totals, rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+按摄像头分组的时间范围统计（get_range_camera_sums / get_range_camera_periods）
+在读取原始表时必须走 (camera_name, start_time) 覆盖索引的Index Only Scan。
+测试在独立的数据库中建表并生成两个月的数据（库名可通过环境变量TEST_DBNAME指定），
+无法连接PostgreSQL时跳过。
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from config import DATABASE_CONFIG  # noqa: E402
+from generate_db import bulk_load_video_analysis, setup_database  # noqa: E402
+from migrate_db import (  # noqa: E402
+    _find_plan_nodes,
+    explain_range_queries,
+    find_uncovered_scans,
+)
+
+TEST_DB_CONFIG = dict(
+    DATABASE_CONFIG, dbname=os.environ.get("TEST_DBNAME", "dashboard_test")
+)
+
+
+def _execute_admin(query):
+    """在默认数据库上以自动提交方式执行建库/删库语句"""
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(query)
+    finally:
+        conn.close()
+
+
+class RangeQueryIndexUsageTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        dbname = sql.Identifier(TEST_DB_CONFIG["dbname"])
+        try:
+            _execute_admin(sql.SQL("DROP DATABASE IF EXISTS {}").format(dbname))
+        except psycopg2.OperationalError as e:
+            raise unittest.SkipTest(f"无法连接PostgreSQL: {e}")
+        _execute_admin(sql.SQL("CREATE DATABASE {}").format(dbname))
+
+        setup_database(TEST_DB_CONFIG)
+        bulk_load_video_analysis(
+            datetime(2025, 7, 1), datetime(2025, 8, 31), db_config=TEST_DB_CONFIG
+        )
+
+        cls.conn = psycopg2.connect(**TEST_DB_CONFIG)
+        cls.conn.autocommit = True
+        with cls.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM video_analysis")
+            if cur.fetchone()[0] == 0:
+                raise RuntimeError("测试数据生成失败")
+            # Index Only Scan依赖可见性映射
+            cur.execute("VACUUM ANALYZE video_analysis")
+            cur.execute("VACUUM ANALYZE video_analysis_hourly")
+            cur.execute("VACUUM ANALYZE video_analysis_daily")
+        cls.conn.autocommit = False
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        _execute_admin(
+            sql.SQL("DROP DATABASE IF EXISTS {}").format(
+                sql.Identifier(TEST_DB_CONFIG["dbname"])
+            )
+        )
+
+    def assert_index_only(self, date_start, date_end):
+        plans = explain_range_queries(self.conn, date_start, date_end)
+        # 汇总行和高峰/低峰时段各一条查询
+        self.assertEqual(len(plans), 2)
+        for plan in plans:
+            scans = [
+                node
+                for node in _find_plan_nodes(plan[0]["Plan"])
+                if node.get("Relation Name", "").startswith("video_analysis_y")
+            ]
+            self.assertTrue(scans, "查询没有读取原始表")
+        self.assertEqual(find_uncovered_scans(self.conn, plans), [])
+
+    def test_sub_hour_edges(self):
+        # 首尾不足一小时的部分读取原始表，中间读取小时/日汇总表
+        self.assert_index_only("2025-08-29 10:30:00", "2025-08-31 12:14:59")
+
+    def test_within_one_hour(self):
+        self.assert_index_only("2025-08-19 10:30:00", "2025-08-19 10:44:59")
+
+    def test_across_partitions(self):
+        self.assert_index_only("2025-07-15 10:30:00", "2025-08-15 12:14:59")
+
+
+if __name__ == "__main__":
+    unittest.main()
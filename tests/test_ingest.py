@@ -0,0 +1,98 @@
+"""
+导入数据校验（ingest.validate_ingest_rows）：字段类型与范围、时段不跨整点、批次内不重复。
+不需要数据库。
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from ingest import INGEST_COLUMNS, INGEST_COUNT_FIELDS, validate_ingest_rows  # noqa: E402
+
+
+def make_row(**overrides):
+    row = {
+        "video_name": "A1_20250801_0800.mp4",
+        "camera_name": "A1",
+        "start_time": "2025-08-01 08:00:00",
+        "end_time": "2025-08-01 08:59:59",
+    }
+    row.update({field: 1 for field in INGEST_COUNT_FIELDS})
+    row.update(overrides)
+    return row
+
+
+class ValidateIngestRowsTest(unittest.TestCase):
+    def assert_rejected(self, rows, message, run_id=1):
+        with self.assertRaises(ValueError) as ctx:
+            validate_ingest_rows(run_id, rows)
+        self.assertIn(message, str(ctx.exception))
+
+    def test_valid_row(self):
+        (value,) = validate_ingest_rows(7, [make_row()])
+        row = dict(zip(INGEST_COLUMNS, value))
+        self.assertEqual(row["run_id"], 7)
+        self.assertEqual(row["start_time"], datetime(2025, 8, 1, 8))
+        self.assertEqual(row["end_time"], datetime(2025, 8, 1, 8, 59, 59))
+        self.assertEqual(row["detection_method"], "horizontal_a")
+        self.assertEqual(row["line_position"], 0.5)
+
+    def test_rejects_slot_crossing_the_hour(self):
+        self.assert_rejected(
+            [make_row(end_time="2025-08-01 09:00:00")],
+            "rows[0].end_time: must be within the hour",
+        )
+
+    def test_rejects_end_before_start(self):
+        self.assert_rejected(
+            [make_row(start_time="2025-08-01 08:30:00", end_time="2025-08-01 08:10:00")],
+            "rows[0].end_time",
+        )
+
+    def test_rejects_duplicate_keys(self):
+        rows = [
+            make_row(),
+            make_row(video_name="other.mp4"),
+        ]
+        self.assert_rejected(rows, "rows[1]: duplicate camera_name and start_time")
+
+    def test_rejects_duplicate_keys_written_differently(self):
+        rows = [
+            make_row(),
+            make_row(start_time="2025-08-01T08:00:00.400"),
+        ]
+        self.assert_rejected(rows, "(same as rows[0])")
+
+    def test_rejects_bool_counts(self):
+        self.assert_rejected(
+            [make_row(in_count=True)], "rows[0].in_count: must be a non-negative"
+        )
+
+    def test_rejects_negative_counts(self):
+        self.assert_rejected(
+            [make_row(out_count=-1)], "rows[0].out_count: must be a non-negative"
+        )
+
+    def test_rejects_bool_run_id(self):
+        self.assert_rejected([make_row()], "run_id", run_id=True)
+
+    def test_rejects_timezone_aware_timestamps(self):
+        self.assert_rejected(
+            [make_row(start_time="2025-08-01 08:00:00+08:00")],
+            "rows[0].start_time: must be a local time",
+        )
+        # 带时区与不带时区的值混用时不能在比较时抛出TypeError
+        self.assert_rejected(
+            [make_row(end_time="2025-08-01 08:59:59+00:00")],
+            "rows[0].end_time: must be a local time",
+        )
+
+    def test_rejects_empty_batch(self):
+        self.assert_rejected([], "rows must be a non-empty list")
+
+
+if __name__ == "__main__":
+    unittest.main()
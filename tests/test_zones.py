@@ -0,0 +1,158 @@
+"""
+区域计算（zones.compute_zone_totals / apply_caps）与原先/api/dashboard中按区域手写的计算
+（冷库A7进+A6出、二楼A1/A2/A3/A6、餐厅A4/A5且不超过二楼）结果一致。
+不需要数据库。
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import build_camera_stats, get_gender_count  # noqa: E402
+from zones import ZONES, apply_caps, compute_zone_totals  # noqa: E402
+
+EMPTY_ROW = (0,) * 7
+EMPTY_GENDER = {"male": 0, "female": 0, "unknown": 0}
+
+
+def camera_stats(camera_rows, cam):
+    """原先get_camera_stats的返回值（无数据的摄像头各项为0）"""
+    return build_camera_stats(camera_rows.get(cam, EMPTY_ROW), None, None)
+
+
+def member_gender(stats, total):
+    return get_gender_count(
+        total, stats["male_percent"], stats["female_percent"], stats["unknown_percent"]
+    )
+
+
+def sum_genders(genders):
+    return {key: sum(gender[key] for gender in genders) for key in EMPTY_GENDER}
+
+
+def baseline_zones(camera_rows):
+    """原先手写的区域计算"""
+    stats = {
+        cam: camera_stats(camera_rows, cam)
+        for cam in ("A1", "A2", "A3", "A4", "A5", "A6", "A7", "A8")
+    }
+    result = {}
+
+    # Cold Storage：A7进入 + A6离开
+    cold_in = max(stats["A7"]["total_in"] + stats["A6"]["total_out"], 0)
+    cold_out = stats["A7"]["total_out"] + stats["A6"]["total_in"]
+    cold_gender = (
+        dict(EMPTY_GENDER)
+        if cold_in == 0
+        else sum_genders(
+            [
+                member_gender(stats["A7"], stats["A7"]["total_in"]),
+                member_gender(stats["A6"], stats["A6"]["total_out"]),
+            ]
+        )
+    )
+    result["cold_storage"] = (cold_in, cold_out, cold_gender)
+
+    # 2nd Floor：A1 + A2 + A3 + A6
+    floor_cams = ("A1", "A2", "A3", "A6")
+    floor_in = max(sum(stats[cam]["total_in"] for cam in floor_cams), 0)
+    floor_out = sum(stats[cam]["total_out"] for cam in floor_cams)
+    floor_gender = (
+        dict(EMPTY_GENDER)
+        if floor_in == 0
+        else sum_genders(
+            [member_gender(stats[cam], stats[cam]["total_in"]) for cam in floor_cams]
+        )
+    )
+    result["second_floor"] = (floor_in, floor_out, floor_gender)
+
+    # Canteen：A4 + A5，进入人数不超过2nd Floor
+    canteen_in = min(max(stats["A4"]["total_in"] + stats["A5"]["total_in"], 0), floor_in)
+    canteen_out = stats["A4"]["total_out"] + stats["A5"]["total_out"]
+    canteen_gender = (
+        dict(EMPTY_GENDER)
+        if canteen_in == 0
+        else sum_genders(
+            [member_gender(stats[cam], stats[cam]["total_in"]) for cam in ("A4", "A5")]
+        )
+    )
+    result["canteen"] = (canteen_in, canteen_out, canteen_gender)
+
+    # A8
+    a8_in = max(stats["A8"]["total_in"], 0)
+    a8_gender = (
+        dict(EMPTY_GENDER) if a8_in == 0 else member_gender(stats["A8"], a8_in)
+    )
+    result["A8"] = (a8_in, stats["A8"]["total_out"], a8_gender)
+    return result
+
+
+def random_row(rng):
+    people = rng.randint(0, 5000)
+    male = rng.randint(0, people)
+    female = rng.randint(0, people - male)
+    return (
+        people,
+        rng.randint(0, 3000),
+        rng.randint(0, 3000),
+        male,
+        female,
+        rng.randint(0, people),
+        people - male - female,
+    )
+
+
+class ZoneTotalsTest(unittest.TestCase):
+    def assert_matches_baseline(self, camera_rows):
+        totals = apply_caps(compute_zone_totals(camera_rows, ZONES), ZONES)
+        expected = baseline_zones(camera_rows)
+        for name, (value_in, value_out, gender) in expected.items():
+            with self.subTest(zone=name, rows=camera_rows):
+                self.assertEqual(totals[name]["in"], value_in)
+                self.assertEqual(totals[name]["out"], value_out)
+                self.assertEqual(totals[name]["gender"], gender)
+
+    def test_no_data(self):
+        self.assert_matches_baseline({})
+
+    def test_cold_storage_uses_a6_out_as_in(self):
+        rows = {
+            "A7": (100, 40, 10, 50, 30, 5, 20),
+            "A6": (60, 7, 25, 30, 20, 2, 10),
+        }
+        totals = apply_caps(compute_zone_totals(rows, ZONES), ZONES)
+        self.assertEqual(totals["cold_storage"]["in"], 40 + 25)
+        self.assertEqual(totals["cold_storage"]["out"], 10 + 7)
+        self.assert_matches_baseline(rows)
+
+    def test_canteen_capped_by_second_floor(self):
+        rows = {
+            "A1": (10, 3, 1, 5, 5, 0, 0),
+            "A4": (200, 80, 70, 100, 90, 10, 10),
+            "A5": (100, 40, 30, 50, 40, 5, 10),
+        }
+        totals = apply_caps(compute_zone_totals(rows, ZONES), ZONES)
+        self.assertEqual(totals["second_floor"]["in"], 3)
+        self.assertEqual(totals["canteen"]["in"], 3)
+        self.assert_matches_baseline(rows)
+
+    def test_canteen_capped_to_zero_has_no_gender(self):
+        rows = {"A4": (200, 80, 70, 100, 90, 10, 10)}
+        totals = apply_caps(compute_zone_totals(rows, ZONES), ZONES)
+        self.assertEqual(totals["canteen"]["in"], 0)
+        self.assertEqual(totals["canteen"]["gender"], EMPTY_GENDER)
+        self.assert_matches_baseline(rows)
+
+    def test_random_rows(self):
+        rng = random.Random(20250819)
+        cameras = ["A1", "A2", "A3", "A4", "A5", "A6", "A7", "A8"]
+        for _ in range(200):
+            present = rng.sample(cameras, rng.randint(0, len(cameras)))
+            self.assert_matches_baseline({cam: random_row(rng) for cam in present})
+
+
+if __name__ == "__main__":
+    unittest.main()